@@ -45,5 +45,8 @@ TRAN_CONFIG = {
     )
 }
 
+# 反翻译完成的标记目录(result_dir下), 与Realprover的PipelineMainService约定一致
+READY_DIR = "ready"
+
 SALT = "ai-for-math"
 EXPIRE_TIME = 5 * 60
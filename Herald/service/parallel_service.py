@@ -4,6 +4,7 @@ import multiprocessing as mp
 
 from service.handler import TranHandler, BackHandler
 from util import CommonUtil
+import conf.config
 
 
 class ParallelService(object):
@@ -177,6 +178,19 @@ class ParallelService(object):
 
     def _save_back_trans_data(self, item):
         CommonUtil.write_to_json_file(self._gen_file_path(item, 'back'), dict(self.shared_dict[item['unique_key']]))
+        self._mark_ready(item)
+
+    def _mark_ready(self, item):
+        """
+        back_trans.json写完后, 在 ready/ 目录放一个以unique_key命名的标记, Realprover的pipeline据此立即领取该条数据.
+        先写隐藏的临时文件再rename, 标记出现时back_trans.json已完整写出
+        """
+        ready_dir = f"{self.result_dir}/{conf.config.READY_DIR}"
+        os.makedirs(ready_dir, exist_ok=True)
+        tmp_path = f"{ready_dir}/.{item['unique_key']}.tmp"
+        with open(tmp_path, 'w') as fp:
+            fp.write(item['unique_key'])
+        os.rename(tmp_path, f"{ready_dir}/{item['unique_key']}")
 
     def _gen_file_path(self, item, type_name='trans'):
         return f"{self.result_dir}/{item['unique_key']}/translate.json" if type_name == "trans" \
@@ -34,6 +34,38 @@ MAX_NODES = 64
 MAX_CALLS = 512
 
 MAX_RETRIES = 1
+# BestFirstSearch 每次从frontier取出top-K个节点, 用一次vLLM调用一起生成
+EXPANSION_BATCH_SIZE = 1
+# 每个GPU进程内并发执行的搜索数, 大于1时各搜索的生成请求合并为共享的vLLM批次
+CONCURRENT_SEARCHES = 1
+BATCH_MAX_WAIT = 0.05  # 收到第一个生成请求后等待其他搜索请求的最长时间(秒)
+BATCH_MAX_PROMPTS = 256
+# 每个搜索使用的Lean进程数, 大于1时每批为各进程分摊地取节点, 节点在得到它的进程中扩展, 各进程并行执行
+LEAN_WORKERS = 1
+# 每个GPU的搜索进程数(仅vllm后端); 大于1时每个GPU由一个生成进程独占, 多个CPU搜索进程共享它并由它合并批次
+SEARCH_WORKERS = 1
+# 置换表: 缓存 (state, tactic) -> 执行结果, 在同一题目的多次重试之间(可选跨题目)复用
+USE_TRANSPOSITION_TABLE = False
+TRANSPOSITION_SHARED = False  # 为True时不同题目共享缓存(仅当state的打印结果足以区分上下文时安全)
+TRANSPOSITION_CAPACITY = 200000  # 内存中LRU保留的条目数
+TRANSPOSITION_PATH = None  # sqlite文件路径, 为None时只使用内存
+# 重试时从上一次尝试的搜索树继续(仅BestFirstSearch), 而不是从根节点重新开始
+WARM_START_RETRIES = False
+WARM_START_MAX_FRONTIER = 256  # 从上一次尝试继承的frontier节点数上限
+# batch_run期间增量统计写入 result_dir/summary.json 的间隔(秒)
+STATS_FLUSH_INTERVAL = 30.0
+# 结果的保存格式: 'json' 每次尝试一个JSON文件; 'compact' 字符串去重+压缩后分片写入 result_dir/store
+RESULT_FORMAT = 'json'
+RESULT_STORE_SHARDS = 8
+# 批量运行的任务调度: 每次尝试一个任务; 'attempt' 先跑完所有题目的第k次尝试, 'problem' 按题目顺序
+TASK_PRIORITY = 'attempt'
+CANCEL_CHECK_INTERVAL = 1.0  # 搜索中检查该题目是否已被其他尝试证明的最小间隔(秒)
+# 每道题目的预算(续跑和重试时累计之前各次尝试的用量), 例如 {"max_seconds": 600, "max_tokens": 2000000, "max_lean_seconds": 300}; 为None时只受节点/深度/调用次数限制
+# max_seconds同时是单次扩展的截止时间: Lean响应与生成调用最多等到墙钟预算耗尽, Lean超时时该进程被结束(进程内vLLM生成无法中断)
+SEARCH_BUDGET = None
+# Herald反翻译完成的标记目录(result_dir下), 与Herald的conf.config.READY_DIR一致; pipeline检查该目录的间隔(秒)
+READY_DIR = "ready"
+READY_POLL_INTERVAL = 0.5
 USE_BEAM_SEARCH = False
 USE_MCTS_SEARCH = False
 BEAM_WIDTH = 3
@@ -54,10 +86,25 @@ PROVER_MODEL_PARAMS = {
     "logprobs": 1
 }
 
+# 透传给vllm.LLM的引擎参数, 例如 {"enable_prefix_caching": True}
+VLLM_ENGINE_ARGS = {}
+# 本地模型的生成后端: {"type": "vllm"} 为进程内vLLM;
+# {"type": "openai", "base_url": "http://host:8000/v1", "model": ...} 为OpenAI兼容的远程服务, 多个搜索进程可共享
+GENERATION_BACKEND = {"type": "vllm"}
+# 分轮自适应采样, 例如 {"rounds": 4, "distinct_target": 16, "novelty_threshold": 0.1}; 为None时每个节点一次采样NUM_SAMPLES个
+ADAPTIVE_SAMPLING = None
+
 API_CONFIG = {
     "lean_search": 'address to leansearch-ps'
 }
 NUM_QUERYS = 10
+# LeanSearch检索结果缓存, 同一state在重试和不同题目之间重复查询时直接命中
+RETRIEVAL_CACHE_CAPACITY = 100000
+RETRIEVAL_CACHE_PATH = None  # sqlite文件路径, 为None时只使用内存
+# 节点加入frontier时在后台线程中预取检索结果, 节点被扩展时通常已经在缓存中
+RETRIEVAL_PREFETCH = True
+PREFETCH_WORKERS = 4
+PREFETCH_MAX_INFLIGHT = 64  # 同时在途的预取请求上限, 超出时跳过预取
 
 
 CLAUDE_CONFIG = {
@@ -65,6 +112,12 @@ CLAUDE_CONFIG = {
     'api_key': 'your api key',
 }
 
+CLAUDE_MODEL = "claude-3-5-sonnet-latest"
+CLAUDE_MAX_CONCURRENCY = 16  # 同时在途的请求数, 也是连接池大小
+CLAUDE_RATE_LIMIT = 8.0  # 每秒请求数
+CLAUDE_MAX_RETRIES = 5
+CLAUDE_BACKOFF = 1.0  # 首次重试的等待时间(秒), 之后指数增长
+
 OTHER_MODELS = ["gemini", "claude"]
 
 # 此为需要过滤的不合法tactic列表
@@ -77,6 +130,21 @@ analyzer_path = Path(base_path, "../jixia/.lake/build/bin/jixia")
 interactive_path = Path(base_path, "../interactive")
 build_path = Path(base_path, "../interactive/.lake/build")
 
+# 每个搜索进程常驻的interactive进程数, 以及单个进程最多处理的文件数(超过后重启, 防止内存持续增长)
+INTERACTIVE_POOL_SIZE = 1
+INTERACTIVE_MAX_USES = 256
+# 一次扩展的 runTactic/getState 以流水线方式发送时, 同时在途的最大请求数; 设为1即逐条请求
+INTERACTIVE_PIPELINE_WINDOW = 16
+# 使用asyncio版本的interactive, 使Lean执行与下一次扩展的tactic生成重叠 (仅BestFirstSearch)
+USE_ASYNC_INTERACTIVE = False
+
+# verify_proof 使用常驻的 lake exe repl 进程池: header只import一次, 之后复用repl的env
+USE_REPL_POOL = True
+REPL_POOL_SIZE = 1
+REPL_MAX_USES = 128  # 每个repl进程最多执行的命令数, 超过后重启以释放保存的env
+REPL_IMPORT_TIMEOUT = 600
+REPL_SNAPSHOT_DIR = None  # 设置后将import后的env通过pickleTo保存到该目录, 冷启动时直接unpickle
+
 
 
 # 接口验权参数
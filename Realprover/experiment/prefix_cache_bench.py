@@ -0,0 +1,87 @@
+"""
+估算vLLM automatic prefix caching能节省的prefill token数.
+
+读取运行结果目录中记录的prompt (collect_results[*].calls), 按vLLM的方式把每个prompt切成固定大小的block,
+一个block只有在它和它之前的全部token都与之前某个prompt相同时才能命中缓存,
+用于判断是否值得在 [model.engine_args] 中开启 enable_prefix_caching.
+
+用法: python -m experiment.prefix_cache_bench <result_dir> [--tokenizer /path/to/model] [--block-size 16] [--scope attempt|run]
+未指定tokenizer时按单词/符号近似切分token.
+"""
+import argparse
+import hashlib
+import re
+
+from manager.manage import ProofParseManage
+
+TOKEN_PATTERN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+def load_tokenizer(path: str | None):
+    if path is None:
+        return lambda text: TOKEN_PATTERN.findall(text)
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    return lambda text: tokenizer.encode(text, add_special_tokens=False)
+
+
+def iter_attempts(result_dir: str):
+    """
+    每个结果(一道题的一次尝试)产出其中全部prompt
+    """
+    for problem_id, attempt, data in ProofParseManage.iter_results(result_dir):
+        prompts = []
+        for result in data.get("collect_results", []):
+            for call in result.get("calls", []):
+                prompts.append(call[3])
+        yield f"{problem_id}_{attempt}", prompts
+
+
+def count_cached(tokens: list, block_size: int, seen: set) -> int:
+    """
+    返回该prompt可复用缓存的token数, 并把它的block加入seen
+    """
+    cached = 0
+    prefix_hash = b""
+    hit = True
+    for start in range(0, len(tokens) - block_size + 1, block_size):
+        block = tokens[start:start + block_size]
+        prefix_hash = hashlib.blake2b(prefix_hash + repr(block).encode("utf-8"), digest_size=16).digest()
+        if hit and prefix_hash in seen:
+            cached += block_size
+        else:
+            hit = False
+            seen.add(prefix_hash)
+    return cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate prefill tokens saved by prefix caching")
+    parser.add_argument("result_dir")
+    parser.add_argument("--tokenizer", default=None, help="HF tokenizer path, usually the prover model path")
+    parser.add_argument("--block-size", type=int, default=16)
+    parser.add_argument("--scope", choices=["attempt", "run"], default="attempt",
+                        help="cache lifetime: reset per result file, or shared by the whole run")
+    args = parser.parse_args()
+
+    tokenize = load_tokenizer(args.tokenizer)
+    seen = set()
+    total_tokens = 0
+    cached_tokens = 0
+    num_prompts = 0
+    for _, prompts in iter_attempts(args.result_dir):
+        if args.scope == "attempt":
+            seen = set()
+        for prompt in prompts:
+            tokens = tokenize(prompt)
+            total_tokens += len(tokens)
+            cached_tokens += count_cached(tokens, args.block_size, seen)
+            num_prompts += 1
+    print(f"prompts = {num_prompts}")
+    print(f"prefill tokens = {total_tokens}")
+    print(f"cached tokens = {cached_tokens}")
+    print(f"saved = {cached_tokens / max(total_tokens, 1):.2%}")
+
+
+if __name__ == '__main__':
+    main()
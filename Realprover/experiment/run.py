@@ -28,8 +28,13 @@ def main(config_path: str):
     profiler.start("run_batch")
     # 默认使用可见的全部gpu, 也可以自己配置
     #gpus = 1
-    gpus = torch.cuda.device_count()
-    assert gpus >= 1
+    backend = config['model'].get('backend', {"type": "vllm"})
+    if backend.get('type', 'vllm') == 'vllm':
+        gpus = torch.cuda.device_count()
+        assert gpus >= 1
+    else:
+        # 远程生成服务不占用本机GPU, 按配置启动相应数量的搜索进程
+        gpus = backend.get('workers', 1)
     print(f"gpus = {gpus}")
     gpus_list = list(range(gpus))
 
@@ -54,7 +59,23 @@ def main(config_path: str):
                                     abandon_if_contain=config['search']['abandon_if_contain'],
                                     is_incontext=config['model'].get('is_incontext', False),
                                     template=config['model'].get('template', 'deepseek'),
-                                    use_retrieval = config['model'].get('use_retrieval', True)
+                                    use_retrieval = config['model'].get('use_retrieval', True),
+                                    use_async_interactive=config['search'].get('use_async_interactive', False),
+                                    expansion_batch_size=config['search'].get('expansion_batch_size', 1),
+                                    concurrent_searches=config['search'].get('concurrent_searches', 1),
+                                    use_transposition_table=config['search'].get('use_transposition_table', False),
+                                    transposition_shared=config['search'].get('transposition_shared', False),
+                                    transposition_path=config['search'].get('transposition_path'),
+                                    warm_start_retries=config['search'].get('warm_start_retries', False),
+                                    warm_start_max_frontier=config['search'].get('warm_start_max_frontier', 256),
+                                    engine_args=config['model'].get('engine_args', {}),
+                                    adaptive_sampling=config['search'].get('adaptive_sampling'),
+                                    backend=backend,
+                                    lean_workers=config['search'].get('lean_workers', 1),
+                                    result_format=config['data'].get('result_format', 'json'),
+                                    task_priority=config['search'].get('task_priority', 'attempt'),
+                                    search_budget=config['search'].get('budget'),
+                                    search_workers=config['search'].get('search_workers', 1)
                                     )
     main_service.batch_run()
     print(main_service.info)
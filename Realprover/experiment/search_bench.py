@@ -0,0 +1,129 @@
+"""
+不需要GPU和Lean的搜索算法微基准: 使用 manager.thirdparty.mock 中的假生成器和假Lean环境,
+报告各搜索算法的 nodes/sec、insert(去重+入堆)与get(出堆)的耗时占比、每次扩展执行的tactic数(包括重放路径), 以及每个节点的内存.
+--lean-workers 大于1时 best_first 使用多个假Lean进程并行执行tactic.
+
+用法: python -m experiment.search_bench [--algorithm best_first beam mcts] [--max-nodes 1024] [--branching 8] ...
+"""
+import argparse
+import time
+import tracemalloc
+
+import conf.config
+from manager.struct import Node
+from manager.search import BestFirstSearch, BeamSearch, MCTSSearch
+from manager.thirdparty.mock import MockStateSpace, MockInteractive, MockTacticGenerator
+
+
+def build_search(algorithm: str, args):
+    if algorithm == "best_first":
+        return BestFirstSearch(num_samples=args.num_samples, max_nodes=args.max_nodes, max_depth=args.max_depth,
+                               use_retrieval=False, expansion_batch_size=args.expansion_batch_size)
+    if algorithm == "beam":
+        return BeamSearch(num_samples=args.num_samples, max_nodes=args.max_nodes, max_depth=args.max_depth)
+    if algorithm == "mcts":
+        return MCTSSearch(num_samples=args.num_samples, max_nodes=args.max_nodes, max_depth=args.max_depth,
+                          max_calls=args.max_calls)
+    raise NotImplementedError(algorithm)
+
+
+def timed(stats: dict, name: str, func):
+    """
+    包装实例方法, 把耗时累加到stats[name]
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats[name] += time.perf_counter() - start
+    return wrapper
+
+
+def prepare(algorithm: str, args, seed: int):
+    space = MockStateSpace(branching=args.branching, duplicate_rate=args.duplicate_rate,
+                           failure_rate=args.failure_rate, pool_size=args.pool_size, seed=seed)
+    interactive = MockInteractive(space, lean_latency=args.lean_latency)
+    helpers = [MockInteractive(space, lean_latency=args.lean_latency) for _ in range(args.lean_workers - 1)]
+    generator = MockTacticGenerator(space, gen_latency=args.gen_latency, max_calls=args.max_calls, seed=seed)
+    search = build_search(algorithm, args)
+    interactive.open_file(None, [None])  # type: ignore
+    decl = interactive.get_next_problem()
+    generator.reset_calls(decl)
+    for helper in helpers:
+        helper.open_file(None, [None])  # type: ignore
+        helper.get_next_problem()
+    return search, generator, interactive, helpers
+
+
+def run_search(algorithm: str, search, generator, interactive, helpers):
+    if helpers and algorithm == "best_first":
+        search.attach_helpers(helpers)
+    search.insert(Node(0, 0, "", interactive.get_state(0)))
+    search.search_proof(generator, interactive)
+    if helpers and algorithm == "best_first":
+        search.detach_helpers()
+
+
+def run_once(algorithm: str, args, seed: int) -> dict:
+    """
+    计时与内存分两次运行同一个搜索: tracemalloc会拖慢每次分配, 不能开着它计时
+    """
+    timed_search, generator, interactive, helpers = prepare(algorithm, args, seed)
+    stats = {"insert": 0.0, "get": 0.0}
+    timed_search.insert = timed(stats, "insert", timed_search.insert)
+    if hasattr(timed_search, "get"):
+        timed_search.get = timed(stats, "get", timed_search.get)
+    start = time.perf_counter()
+    run_search(algorithm, timed_search, generator, interactive, helpers)
+    elapsed = time.perf_counter() - start
+    nodes = len(timed_search.nodes)
+    lean = sum(i.tactic_calls for i in [interactive, *helpers])
+    calls = len(generator.calls)
+
+    memory_search, generator, interactive, helpers = prepare(algorithm, args, seed)
+    tracemalloc.start()
+    run_search(algorithm, memory_search, generator, interactive, helpers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(nodes=nodes, calls=calls, seconds=elapsed, lean_per_expansion=lean / max(calls, 1),
+                insert=stats["insert"], get=stats["get"], bytes_per_node=peak / max(len(memory_search.nodes), 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPU-free search microbenchmark on a synthetic state space")
+    parser.add_argument("--algorithm", nargs="+", default=["best_first", "beam", "mcts"],
+                        choices=["best_first", "beam", "mcts"])
+    parser.add_argument("--max-nodes", type=int, default=1024)
+    parser.add_argument("--max-depth", type=int, default=128)
+    parser.add_argument("--max-calls", type=int, default=1024)
+    parser.add_argument("--num-samples", type=int, default=64)
+    parser.add_argument("--expansion-batch-size", type=int, default=1)
+    parser.add_argument("--lean-workers", type=int, default=1, help="Lean processes per search (best_first only)")
+    parser.add_argument("--branching", type=int, default=16)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--pool-size", type=int, default=64)
+    parser.add_argument("--lean-latency", type=float, default=0.0, help="seconds per run_tactic")
+    parser.add_argument("--gen-latency", type=float, default=0.0, help="seconds per generation call")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    conf.config.RETRIEVAL_PREFETCH = False
+
+    print(f"{'algorithm':<12}{'nodes':>8}{'calls':>8}{'nodes/s':>12}{'insert%':>10}{'get%':>8}{'lean/exp':>10}{'B/node':>10}")
+    for algorithm in args.algorithm:
+        runs = [run_once(algorithm, args, seed) for seed in range(args.repeat)]
+        nodes = sum(r["nodes"] for r in runs)
+        seconds = sum(r["seconds"] for r in runs)
+        print(f"{algorithm:<12}"
+              f"{nodes / len(runs):>8.0f}"
+              f"{sum(r['calls'] for r in runs) / len(runs):>8.0f}"
+              f"{nodes / max(seconds, 1e-9):>12.1f}"
+              f"{100 * sum(r['insert'] for r in runs) / max(seconds, 1e-9):>10.1f}"
+              f"{100 * sum(r['get'] for r in runs) / max(seconds, 1e-9):>8.1f}"
+              f"{sum(r['lean_per_expansion'] for r in runs) / len(runs):>10.1f}"
+              f"{sum(r['bytes_per_node'] for r in runs) / len(runs):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,6 @@
 from .prompt_manage import PromptManage
 from .model_manage import ModelManage
 from .proof_parse_manage import ProofParseManage
+from .run_manifest import RunManifest
+from .run_stats import RunStats
+from .result_store import ResultStore
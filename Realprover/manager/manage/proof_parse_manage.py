@@ -6,6 +6,9 @@ import networkx as nx
 from conf import config
 
 from manager.struct import Goal
+from manager.manage.run_manifest import RunManifest
+from manager.manage.run_stats import RunStats
+from manager.manage.result_store import ResultStore
 import os
 
 class ProofParseManage(object):
@@ -179,70 +182,86 @@ class ProofParseManage(object):
         with open(Path("kto_data") / (result_dir.name + ".json"), 'w') as fp:
             json.dump(kto_data, fp, ensure_ascii=False, indent=2)
    
+    @staticmethod
+    def iter_results(result_dir: str):
+        """
+        依次产出 (题目id, 尝试编号, 结果), 兼容 compact 存储(store/)和每次尝试一个JSON文件(generated/)两种格式,
+        每次只在内存中保留一个结果
+        """
+        if ResultStore.exists(result_dir):
+            yield from ResultStore(result_dir).iter_attempts()
+            return
+        generated_dir = Path(result_dir, 'generated')
+        for problem_dir in sorted(generated_dir.iterdir()):
+            if not problem_dir.is_dir():
+                continue
+            for file in sorted(problem_dir.glob('*.json')):
+                try:
+                    attempt = int(file.stem.rsplit('_', 1)[1])
+                except (ValueError, IndexError):
+                    continue
+                with file.open() as fp:
+                    yield problem_dir.name, attempt, json.load(fp)
+
     @staticmethod
     def get_stats(result_dir: str, info: dict = {}):
-        results = dict(total=0, success=0, accuracy=0.0)
-        generated_dir = os.path.join(result_dir, 'generated')
-        for dir_path in os.listdir(generated_dir):
-            success_flag = False
-            full_path = os.path.join(generated_dir,dir_path)
-            for root, dir, files in os.walk(full_path):
-                for file in files:
-                    if '.json' in file and os.path.samefile(full_path,root):
-                        file_path = os.path.join(root, file)
-                        with open(file_path,'r') as f:
-                            data = json.load(f)
-                            for problem in data['collect_results']:
-                                if problem["success"]:
-                                    results['success'] += 1 
-                                    success_flag = True
-                                    break
-                if success_flag:
-                    break
-            results['total'] += 1
-        results['accuracy'] = results["success"] / results['total']
+        summary = RunStats.load(result_dir)
+        if summary is not None:
+            # batch_run期间增量维护的汇总, 读取一个小文件即可
+            results = summary
+        elif os.path.exists(os.path.join(result_dir, RunManifest.FILE_NAME)):
+            # 有运行清单时直接统计, 不再解析全部结果文件
+            results = RunManifest(result_dir).stats()
+        else:
+            results = ProofParseManage.scan_stats(result_dir)
         results.update(info)
         with open(Path(result_dir, 'result.txt'), 'w', encoding='utf-8') as fp:
             for k, v in results.items():
                 fp.write(f'{k}: {v}\n')
         pp(results)
+
+    @staticmethod
+    def scan_stats(result_dir: str) -> dict:
+        results = dict(total=0, success=0, accuracy=0.0)
+        solved = {}
+        for problem_id, _, data in ProofParseManage.iter_results(result_dir):
+            success_flag = any(problem["success"] for problem in data['collect_results'])
+            solved[problem_id] = solved.get(problem_id, False) or success_flag
+        results['total'] = len(solved)
+        results['success'] = sum(solved.values())
+        results['accuracy'] = results["success"] / results['total']
+        return results
     
     @staticmethod
     def visualize_all_proof_trees(result_dir: str, keep_false: bool = True):
         output_dir = Path(result_dir, 'figs')
         output_dir.mkdir(exist_ok=True)
-        for file in Path(result_dir, 'generated').iterdir():
-            with file.open() as fp:
-                data = json.load(fp)
+        for problem_id, attempt, data in ProofParseManage.iter_results(result_dir):
             if not data['collect_results']:
                 continue
             if (not keep_false) and (not data['collect_results'][-1]['success']):
                 continue
             for p in data['collect_results']:
                 G, path = ProofParseManage.get_proof_tree(p)
-                output_path = output_dir / file.name.replace('.json', '.png')
+                output_path = output_dir / f"{problem_id}_{attempt}.png"
                 ProofParseManage.visualize_proof_tree(G, path, output_path)
 
     @staticmethod
     def get_all_correct_proofs(result_dir: str) -> None:
         output_dir = Path(result_dir, 'proofs')
         output_dir.mkdir(exist_ok=True)
-        for file in Path(result_dir, 'generated').iterdir():
-            with file.open() as fp:
-                data = json.load(fp)
+        for problem_id, attempt, data in ProofParseManage.iter_results(result_dir):
             if not data['collect_results'] or not data['collect_results'][-1]['success']:
                 continue
             proof = ProofParseManage.get_correct_proof(data)
-            with open(Path(output_dir, file.name.replace('.json', '.lean')), 'w') as fp:
+            with open(Path(output_dir, f"{problem_id}_{attempt}.lean"), 'w') as fp:
                 fp.write(proof)
 
     @staticmethod
     def get_demo_data(result_dir: str) -> None:
         output_dir = Path(result_dir, 'demos')
         output_dir.mkdir(exist_ok=True)
-        for file in Path(result_dir, 'generated').iterdir():
-            with file.open() as fp:
-                data = json.load(fp)
+        for problem_id, attempt, data in ProofParseManage.iter_results(result_dir):
             if 'formal_proof' not in data.keys():
                 continue
             data['_formal_proof'] = data.pop('formal_proof')   
@@ -259,28 +278,18 @@ class ProofParseManage(object):
                 n['short_informal_tactic'] = ''
                 n['informal_state'] = [''] * len(n['state'])
                 n['in_right_path'] = n['id'] in path
-            with open(output_dir / file.name, 'w') as fp:
+            with open(output_dir / f"{problem_id}_{attempt}.json", 'w') as fp:
                 json.dump(data, fp, ensure_ascii=False, indent=4)
                 
     
     @staticmethod
     def get_length_distribution(result_dir: str):
         from collections import Counter
-        len_list = []
-        generated_dir = Path(result_dir, "generated")
-        for dir_path in os.listdir(generated_dir):
-            success_flag = False
-            full_path = os.path.join(generated_dir,dir_path)
-            for root, dir, files in os.walk(full_path):
-                for file in files:
-                    if '.json' in file and os.path.samefile(full_path,root):
-                        file_path = os.path.join(root, file)
-                        with open(file_path,'r') as f:
-                            data = json.load(f)
-                        if data['collect_results'][-1]['success']:
-                            G, path = ProofParseManage.get_proof_tree(data['collect_results'][-1])
-                            len_list.append(len(path)-1)
-        counter = Counter(len_list)
+        summary = RunStats.load(result_dir)
+        if summary is not None:
+            counter = Counter({int(k): v for k, v in summary['proof_length'].items()})
+        else:
+            counter = ProofParseManage.scan_length_distribution(result_dir)
 
         numbers = list(counter.keys())
         frequencies = list(counter.values())
@@ -293,3 +302,12 @@ class ProofParseManage(object):
         plt.title('Proof Length Distribution')
         plt.savefig(output, dpi=300, bbox_inches='tight')
 
+    @staticmethod
+    def scan_length_distribution(result_dir: str):
+        from collections import Counter
+        len_list = []
+        for _, _, data in ProofParseManage.iter_results(result_dir):
+            if data['collect_results'] and data['collect_results'][-1]['success']:
+                G, path = ProofParseManage.get_proof_tree(data['collect_results'][-1])
+                len_list.append(len(path)-1)
+        return Counter(len_list)
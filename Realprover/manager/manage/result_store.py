@@ -0,0 +1,189 @@
+import fcntl
+import json
+import os
+import threading
+import zlib
+from typing import Iterator
+
+import conf.config
+from util import LruCache
+
+
+class ResultStore(object):
+    """
+    紧凑的搜索结果存储, 替代每次尝试一个未压缩JSON文件(generated/{id}/{id}_{attempt}.json).
+    - 字符串表: 节点的goal、tactic、调用中的state和prompt段落(按空行切分, 检索到的定理会在很多prompt中重复)
+      按题目去重, 记录中只保存整数编号; 同一题目的多次重试共用一张表, 每次尝试只写出新增的字符串
+    - 压缩: 每次尝试写成一帧 zlib 压缩的JSON
+    - 分片: 按题目id分到 store/shard_XX.bin 中的少数几个文件, store/index.jsonl 记录每帧的位置
+    多个进程可以同时写入, 同一题目的不同尝试也可能由不同进程同时写入: 写一帧时持有该分片的文件锁,
+    先从索引读入其他进程新写的帧, 本地缓存的字符串表过期时重新加载, 再编号并追加帧和索引.
+    读取时只解压所需题目的帧, 解码后的格式与原JSON结果文件相同.
+    """
+
+    DIR_NAME = "store"
+    INDEX_FILE = "index.jsonl"
+
+    def __init__(self, result_dir: str, num_shards: int = conf.config.RESULT_STORE_SHARDS):
+        self.dir = os.path.join(result_dir, self.DIR_NAME)
+        os.makedirs(self.dir, exist_ok=True)
+        self.num_shards = num_shards
+        self.lock = threading.Lock()
+        # 写入端: 最近处理的题目的字符串表 {string: id}
+        self.tables = LruCache(capacity=64)
+        self.index: dict[str, list[dict]] | None = None
+        self.index_offset = 0  # 已读入的索引文件长度
+
+    @staticmethod
+    def exists(result_dir: str) -> bool:
+        return os.path.exists(os.path.join(result_dir, ResultStore.DIR_NAME, ResultStore.INDEX_FILE))
+
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.dir, f"shard_{shard:02d}.bin")
+
+    def lock_path(self, shard: int) -> str:
+        return os.path.join(self.dir, f"shard_{shard:02d}.lock")
+
+    def _append(self, path: str, data: bytes) -> int:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            # O_APPEND下写入后的位置即本帧的末尾, 并发追加时同样成立
+            return os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+        finally:
+            os.close(fd)
+
+    # ---------- 写入 ----------
+
+    def write(self, problem_id, attempt: int, data: dict):
+        problem_id = str(problem_id)
+        shard = zlib.crc32(problem_id.encode("utf-8")) % self.num_shards
+        with self.lock, open(self.lock_path(shard), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = self._refresh_index().get(problem_id, [])
+            table = self.tables.get(problem_id)
+            if entries and (table is None or len(table) != entries[-1].get("size")):
+                # 续跑, 或其他进程写过这道题目的尝试: 从已有的帧重新加载字符串表, 新字符串接着编号
+                table = None
+            if table is None:
+                table = {s: i for i, s in enumerate(self._load_strings(problem_id))}
+                self.tables.put(problem_id, table)
+            base = len(table)
+
+            def intern(s: str) -> int:
+                if s not in table:
+                    table[s] = len(table)
+                return table[s]
+
+            encoded = self.encode(data, intern)
+            strings = list(table)[base:]
+            frame = zlib.compress(json.dumps(dict(base=base, strings=strings, data=encoded),
+                                             ensure_ascii=False).encode("utf-8"))
+            offset = self._append(self.shard_path(shard), frame)
+            # size: 写入本帧后字符串表的大小, 用于判断其他进程缓存的表是否过期
+            entry = dict(id=problem_id, attempt=attempt, shard=shard, offset=offset, length=len(frame), size=len(table))
+            self._append(os.path.join(self.dir, self.INDEX_FILE),
+                         (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._refresh_index()
+
+    @staticmethod
+    def encode(data: dict, intern) -> dict:
+        encoded = dict(data)
+        collect_results = []
+        for res in data["collect_results"]:
+            res = dict(res)
+            res["nodes"] = [[node["id"], node["parent"], node["depth"], intern(node["tactic"]),
+                             [intern(goal) for goal in node["state"]]] for node in res["nodes"]]
+            res["calls"] = [[intern(state_str), [intern(t) for t in tactics], logprobs,
+                             [intern(p) for p in prompt.split("\n\n")], saved]
+                            for state_str, tactics, logprobs, prompt, saved in res["calls"]]
+            collect_results.append(res)
+        encoded["collect_results"] = collect_results
+        return encoded
+
+    # ---------- 读取 ----------
+
+    def _load_index(self) -> dict[str, list[dict]]:
+        if self.index is None:
+            self._refresh_index()
+        return self.index  # type: ignore
+
+    def _refresh_index(self) -> dict[str, list[dict]]:
+        """
+        读入索引文件中上次之后新增的完整行
+        """
+        if self.index is None:
+            self.index = {}
+        path = os.path.join(self.dir, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return self.index
+        with open(path, "rb") as fp:
+            fp.seek(self.index_offset)
+            data = fp.read()
+        # 进程被中断时最后一行可能不完整, 留到下次再读
+        end = data.rfind(b"\n") + 1
+        self.index_offset += end
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self.index.setdefault(entry["id"], []).append(entry)
+        return self.index
+
+    def _read_frame(self, entry: dict) -> dict:
+        with open(self.shard_path(entry["shard"]), "rb") as fp:
+            fp.seek(entry["offset"])
+            return json.loads(zlib.decompress(fp.read(entry["length"])))
+
+    def _load_strings(self, problem_id: str) -> list[str]:
+        strings: list[str] = []
+        for entry in self._load_index().get(problem_id, []):
+            frame = self._read_frame(entry)
+            del strings[frame["base"]:]
+            strings.extend(frame["strings"])
+        return strings
+
+    def problems(self) -> list[str]:
+        return list(self._load_index())
+
+    def attempts(self, problem_id) -> list[int]:
+        return [entry["attempt"] for entry in self._load_index().get(str(problem_id), [])]
+
+    def iter_problem(self, problem_id) -> Iterator[tuple[int, dict]]:
+        """
+        按写入顺序依次解码一道题目的所有尝试, 只读取该题目的帧
+        """
+        strings: list[str] = []
+        for entry in self._load_index().get(str(problem_id), []):
+            frame = self._read_frame(entry)
+            del strings[frame["base"]:]
+            strings.extend(frame["strings"])
+            yield entry["attempt"], self.decode(frame["data"], strings)
+
+    def load(self, problem_id, attempt: int) -> dict | None:
+        for idx, data in self.iter_problem(problem_id):
+            if idx == attempt:
+                return data
+        return None
+
+    def iter_attempts(self) -> Iterator[tuple[str, int, dict]]:
+        for problem_id in self.problems():
+            for attempt, data in self.iter_problem(problem_id):
+                yield problem_id, attempt, data
+
+    @staticmethod
+    def decode(encoded: dict, strings: list[str]) -> dict:
+        data = dict(encoded)
+        collect_results = []
+        for res in encoded["collect_results"]:
+            res = dict(res)
+            res["nodes"] = [dict(id=sid, parent=parent, depth=depth, tactic=strings[tactic],
+                                 state=[strings[goal] for goal in state])
+                            for sid, parent, depth, tactic, state in res["nodes"]]
+            res["calls"] = [[strings[state_str], [strings[t] for t in tactics], logprobs,
+                             "\n\n".join(strings[p] for p in prompt), saved]
+                            for state_str, tactics, logprobs, prompt, saved in res["calls"]]
+            collect_results.append(res)
+        data["collect_results"] = collect_results
+        return data
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class ProblemEntry:
+    attempts: int = 0  # 已记录的尝试数(决定下一次尝试的编号)
+    counted: int = 0  # 计入max_retries的尝试数: 正常结束且生成过tactic
+    success: bool = False
+    calls: int = 0
+    seconds: float = 0.0
+    tokens: int = 0
+    lean_seconds: float = 0.0
+
+
+class RunManifest:
+    """
+    运行清单: result_dir/manifest.jsonl, 每次尝试结束时追加一行记录
+    (id, attempt, status, success, calls, nodes, seconds, tokens, lean_seconds), 启动时读入内存索引.
+    跳过/续跑判断、每道题目的预算用量和最终统计都只读清单, 不再遍历并解析 generated/ 下的全部结果文件.
+    多个进程可以同时追加同一个文件: 每条记录以一次write写入O_APPEND文件, refresh读入其他进程新追加的记录.
+    """
+
+    FILE_NAME = "manifest.jsonl"
+
+    def __init__(self, result_dir: str):
+        self.path = os.path.join(result_dir, self.FILE_NAME)
+        self.lock = threading.RLock()
+        self.index: dict[str, ProblemEntry] = {}
+        self.offset = 0  # 已读入的清单文件长度
+        if not os.path.exists(self.path) and os.path.isdir(os.path.join(result_dir, "generated")):
+            self._backfill(os.path.join(result_dir, "generated"))
+        self.load()
+
+    def load(self):
+        with self.lock:
+            self.index = {}
+            self.offset = 0
+            self.refresh()
+
+    def refresh(self):
+        """
+        读入上次之后新追加的完整记录, 包括其他进程写入的
+        """
+        with self.lock:
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, "rb") as fp:
+                fp.seek(self.offset)
+                data = fp.read()
+            # 进程被中断(或另一进程正在写入)时最后一行可能不完整, 留到下次再读
+            end = data.rfind(b"\n") + 1
+            self.offset += end
+            for line in data[:end].splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._update(record)
+
+    def _update(self, record: dict):
+        entry = self.index.setdefault(str(record["id"]), ProblemEntry())
+        entry.attempts = max(entry.attempts, record["attempt"] + 1)
+        if record["status"] == "ok" and record.get("calls", 0) > 0:
+            entry.counted += 1
+        entry.success = entry.success or bool(record.get("success"))
+        entry.calls += record.get("calls", 0)
+        entry.seconds += record.get("seconds", 0.0)
+        entry.tokens += record.get("tokens", 0)
+        entry.lean_seconds += record.get("lean_seconds", 0.0)
+
+    def record(self, problem_id, attempt: int, status: str, success: bool = False,
+               calls: int = 0, nodes: int = 0, seconds: float = 0.0, proof_length: int | None = None,
+               tokens: int = 0, lean_seconds: float = 0.0) -> dict:
+        """
+        status: 'ok' 正常结束并写出结果文件; 'search_error' / 'error' 尝试中途出错;
+                'cancelled' 题目已被其他尝试证明而提前停止
+        proof_length: 成功时证明路径上的tactic数
+        tokens / lean_seconds: 本次尝试生成的token数和Lean CPU时间, 与seconds一起计入该题目的预算用量
+        返回写入的记录, 供RunStats增量统计
+        """
+        record = dict(id=str(problem_id), attempt=attempt, status=status, success=success,
+                      calls=calls, nodes=nodes, seconds=round(seconds, 3), tokens=tokens,
+                      lean_seconds=round(lean_seconds, 3), time=time.time())
+        if proof_length is not None:
+            record["proof_length"] = proof_length
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+            self.refresh()
+        return record
+
+    def should_skip(self, problem_id, max_retries: int) -> bool:
+        entry = self.index.get(str(problem_id))
+        return entry is not None and (entry.success or entry.counted >= max_retries)
+
+    def remaining_retries(self, problem_id, max_retries: int) -> int:
+        entry = self.index.get(str(problem_id))
+        return max_retries - (entry.counted if entry else 0)
+
+    def next_attempt(self, problem_id) -> int:
+        entry = self.index.get(str(problem_id))
+        return entry.attempts if entry else 0
+
+    def usage(self, problem_id) -> dict:
+        """
+        该题目所有已记录尝试的预算用量合计, 见 SearchBudget
+        """
+        entry = self.index.get(str(problem_id)) or ProblemEntry()
+        return dict(seconds=entry.seconds, tokens=entry.tokens, lean_seconds=entry.lean_seconds)
+
+    def stats(self) -> dict:
+        total = len(self.index)
+        success = sum(1 for entry in self.index.values() if entry.success)
+        return dict(total=total, success=success, accuracy=success / total if total else 0.0)
+
+    def _backfill(self, generated_dir: str):
+        """
+        旧版本的运行目录没有清单时, 扫描一次结果文件生成清单
+        """
+        for problem_id in sorted(os.listdir(generated_dir)):
+            problem_dir = os.path.join(generated_dir, problem_id)
+            if not os.path.isdir(problem_dir):
+                continue
+            for file in sorted(os.listdir(problem_dir)):
+                if not file.endswith(".json"):
+                    continue
+                try:
+                    attempt = int(file[:-len(".json")].rsplit("_", 1)[1])
+                    with open(os.path.join(problem_dir, file), "r") as f:
+                        data = json.load(f)
+                except (ValueError, IndexError, json.JSONDecodeError):
+                    continue
+                results = data.get("collect_results", [])
+                proof_length = None
+                if results and results[-1]["success"]:
+                    from manager.manage.proof_parse_manage import ProofParseManage
+                    _, path = ProofParseManage.get_proof_tree(results[-1])
+                    proof_length = len(path) - 1
+                self.record(problem_id, attempt, "ok",
+                            success=any(res["success"] for res in results),
+                            proof_length=proof_length,
+                            calls=sum(len(res["calls"]) for res in results),
+                            nodes=sum(len(res["nodes"]) for res in results))
@@ -0,0 +1,112 @@
+import json
+import os
+import queue
+import time
+from collections import Counter
+
+import conf.config
+from manager.manage.run_manifest import RunManifest
+
+
+class RunStats:
+    """
+    批量运行中的增量统计: 每次尝试结束时由worker把清单记录放入队列, 主进程中的汇总线程据此更新
+    已解决/已尝试题数(total为已尝试的题数, 与RunManifest.stats一致)、证明长度分布、调用次数和用时, 并定期把汇总写入 result_dir/summary.json.
+    续跑时先从运行清单恢复已有的统计.
+    """
+
+    FILE_NAME = "summary.json"
+
+    def __init__(self, result_dir: str, total_problems: int = 0,
+                 flush_interval: float = conf.config.STATS_FLUSH_INTERVAL):
+        self.path = os.path.join(result_dir, self.FILE_NAME)
+        self.total_problems = total_problems
+        self.flush_interval = flush_interval
+        self.solved: set[str] = set()
+        self.attempted: set[str] = set()
+        self.attempts = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.calls = 0
+        self.seconds = 0.0
+        self.problem_seconds: Counter = Counter()
+        self.proof_lengths: Counter = Counter()
+        self.last_flush = 0.0
+        manifest_path = os.path.join(result_dir, RunManifest.FILE_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        self.update(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+
+    def update(self, record: dict):
+        problem_id = str(record["id"])
+        self.attempted.add(problem_id)
+        self.attempts += 1
+        if record["status"] == "cancelled":
+            self.cancelled += 1
+        elif record["status"] != "ok":
+            self.errors += 1
+        self.calls += record.get("calls", 0)
+        self.seconds += record.get("seconds", 0.0)
+        self.problem_seconds[problem_id] += record.get("seconds", 0.0)
+        if record.get("success") and problem_id not in self.solved:
+            self.solved.add(problem_id)
+            if record.get("proof_length") is not None:
+                self.proof_lengths[record["proof_length"]] += 1
+
+    def summary(self) -> dict:
+        attempted = len(self.attempted)
+        return dict(
+            problems=self.total_problems,
+            total=attempted,
+            success=len(self.solved),
+            accuracy=len(self.solved) / attempted if attempted else 0.0,
+            attempts=self.attempts,
+            errors=self.errors,
+            cancelled=self.cancelled,
+            calls=self.calls,
+            calls_per_attempt=self.calls / self.attempts if self.attempts else 0.0,
+            seconds=round(self.seconds, 3),
+            seconds_per_problem=self.seconds / attempted if attempted else 0.0,
+            seconds_per_solved=(sum(self.problem_seconds[p] for p in self.solved) / len(self.solved)
+                                if self.solved else 0.0),
+            proof_length={str(k): v for k, v in sorted(self.proof_lengths.items())},
+            updated=time.time(),
+        )
+
+    def flush(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(self.summary(), fp, ensure_ascii=False, indent=2)
+        # 原子替换, 随时读取都能得到完整的文件
+        os.replace(tmp_path, self.path)
+        self.last_flush = time.monotonic()
+
+    def consume(self, records):
+        """
+        在汇总线程中运行, 从队列读取记录直到收到None, 期间每flush_interval秒写一次汇总
+        """
+        self.flush()
+        while True:
+            try:
+                record = records.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush()
+                continue
+            if record is None:
+                break
+            self.update(record)
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+        self.flush()
+
+    @staticmethod
+    def load(result_dir: str) -> dict | None:
+        path = os.path.join(result_dir, RunStats.FILE_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as fp:
+            return json.load(fp)
@@ -1,3 +1,5 @@
 from .beam_search import BeamSearch
 from .best_first import BestFirstSearch
 from .mcts_search import MCTSSearch
+from .transposition import TranspositionTable, TacticOutcome
+from .budget import SearchBudget
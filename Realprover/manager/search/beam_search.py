@@ -1,13 +1,14 @@
 from collections import Counter
 from heapdict import heapdict
-from manager.struct import Node, state_repr_dedup
-from manager.thirdparty import Interactive, TacticGenerator
+from manager.struct import Node, state_repr
+from manager.thirdparty import Interactive, TacticGenerator, LeanSearch
 import conf.config
 from manager.search.exception import SearchError
+from manager.search.control import SearchControl
 # import logging
 
 
-class BeamSearch:
+class BeamSearch(SearchControl):
     def __init__(self,
                 beam_width: int = conf.config.BEAM_WIDTH,
                 num_samples: int = conf.config.NUM_SAMPLES,
@@ -16,6 +17,7 @@ class BeamSearch:
                 abandon_if_contain: list[str] = conf.config.ABANDON_IF_CONTAIN
                 ):
         self.found = False
+        self.init_control()
         self.nodes = {}
         self.score = heapdict()
         self.depth = 0
@@ -30,15 +32,17 @@ class BeamSearch:
         if not node.state:
             self.found = True
 
-        deduped_state_str = state_repr_dedup(node.state)
-        if deduped_state_str not in self.nodes:
-            self.nodes[deduped_state_str] = node
-            self.score[deduped_state_str] = -node.score
+        key = node.fingerprint
+        if key not in self.nodes:
+            self.nodes[key] = node
+            self.score[key] = -node.score
+            if node.state and conf.config.RETRIEVAL_PREFETCH:
+                LeanSearch.prefetch(state_repr(node.state))
             self.depth = max(self.depth, node.depth)
             # print(f'{len(self.nodes)} Explored.')
         else:
             try:
-                self.score[deduped_state_str] -= node.score 
+                self.score[key] -= node.score 
             except KeyError:
                 pass
 
@@ -51,7 +55,7 @@ class BeamSearch:
         return beam
 
     def going(self) -> bool:
-        return not self.found and len(self.nodes) < self.max_nodes and self.depth < self.max_depth
+        return not self.found and len(self.nodes) < self.max_nodes and self.depth < self.max_depth and not self.stopped()
 
     def tactic_filter(self, tactic: str) -> bool:
         for forbidden_tactic in self.abandon_if_contain:
@@ -70,28 +74,31 @@ class BeamSearch:
                 break
             for node in beam:
                 tactics, scores = generator.from_state(node.state, self.num_samples)
+                candidates = []
                 for (tactic, num_reps), _ in zip(Counter(tactics).items(), scores):
                     if not self.tactic_filter(tactic):
                         continue
                     self.tactic_sid_record.append({"tactic":tactic, "sid":node.sid})
-                    try:
-                        sid = interactive.run_tactic(node.sid, tactic)
-                    except RuntimeError:
-                        pass
-                    except Exception as e:
-                        #目前仅在run_tactic加入记录error-logging功能， 因为根据以往经验在get_state/giveup 加入try block可能会导致broken pipe error
-                        #如果确定问题所在可以手动添加
-                        raise SearchError("An error occurred at run_tactic", 
-                                    error_data = self.tactic_sid_record,
-                                    error_type = e)
-                    else:
-                        state = interactive.get_state(sid)
-                        new_node = Node(sid, node.sid, tactic, state, node.depth + 1, num_reps, node)
-                        self.insert(new_node)
-                        if not state:
-                            interactive.commit(sid)
-                            self.found = True
-                            return
+                    candidates.append((tactic, num_reps))
+                try:
+                    sids = interactive.run_tactics(node.sid, [tactic for tactic, _ in candidates])
+                except Exception as e:
+                    #目前仅在run_tactic加入记录error-logging功能， 因为根据以往经验在get_state/giveup 加入try block可能会导致broken pipe error
+                    #如果确定问题所在可以手动添加
+                    raise SearchError("An error occurred at run_tactic", 
+                                error_data = self.tactic_sid_record,
+                                error_type = e)
+                succeeded = [(c, sid) for c, sid in zip(candidates, sids) if not isinstance(sid, RuntimeError)]
+                states = interactive.get_states([sid for _, sid in succeeded])
+                for ((tactic, num_reps), sid), state in zip(succeeded, states):
+                    if isinstance(state, RuntimeError):
+                        raise state
+                    new_node = Node(sid, node.sid, tactic, state, node.depth + 1, num_reps, node)
+                    self.insert(new_node)
+                    if not state:
+                        interactive.commit(sid)
+                        self.found = True
+                        return
         if not self.found:
             sid = interactive.give_up(0)
             interactive.commit(sid)
@@ -1,16 +1,22 @@
+import asyncio
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from heapdict import heapdict
-from manager.struct import Node, state_repr_dedup
-from manager.thirdparty import Interactive, TacticGenerator
+from manager.struct import Node, state_repr, state_exact_fingerprint
+from manager.thirdparty import Interactive, AsyncInteractive, TacticGenerator, LeanSearch
 from manager.thirdparty.verifier import verify_proof
 import conf.config
 from manager.search.exception import SearchError
+from manager.search.control import SearchControl
+from manager.search.transposition import TranspositionTable, TacticOutcome
 import traceback
+import os
 
 def hard_stop_criterion(node: Node, window_size=5) -> bool:
-    return all('have' in n.tactic for n in node.current_path[:-window_size-1:-1])
+    # 等价于路径上最后window_size个tactic都包含have
+    return node.have_streak >= window_size
 
-class BestFirstSearch:
+class BestFirstSearch(SearchControl):
     def __init__(
         self,
         num_samples: int = conf.config.NUM_SAMPLES,
@@ -20,9 +26,13 @@ class BestFirstSearch:
         is_incontext: bool = conf.config.IS_INCONTEXT,
         template: str = 'deepseek',
         use_retrieval: bool = conf.config.USE_RETRIEVAL,
-        alpha: float = 0.5
+        alpha: float = 0.5,
+        expansion_batch_size: int = conf.config.EXPANSION_BATCH_SIZE,
+        transposition_table: TranspositionTable = None,
+        transposition_scope: str = ''
     ):
         self.found = False
+        self.init_control()
         self.nodes = {}
         self.score = heapdict()
         self.depth = 0
@@ -35,36 +45,102 @@ class BestFirstSearch:
         self.template = template
         self.use_retrieval = use_retrieval
         self.alpha = alpha
+        self.expansion_batch_size = max(expansion_batch_size, 1)  # 每次从frontier取出并一起生成的节点数
+        self.transposition_table = transposition_table
+        self.transposition_scope = transposition_scope
+        self.placeholder_sid = 0  # 置换表命中/热启动恢复、尚未在Lean中物化的节点使用负数sid
+        self.inherited_nodes = 0  # 热启动时从上一次尝试继承的节点数, 不计入本次的max_nodes
+        self.helpers = []  # 并行执行tactic的其他Interactive, 见attach_helpers
+        self.helper_sids = []
+        self.executor = None
 
-    def insert(self, node: Node, formal_statement: str=None):
+    def verify(self, node: Node, formal_statement: str=None) -> bool:
+        """
+        用REPL检查以node结束的完整证明
+        """
+        try:
+            print(f"lake repl check!!!",flush=True)
+            full_proof = self.get_incontext(node, formal_statement)
+            return verify_proof(full_proof,
+                                os.path.join(conf.config.LEAN_ENV_PATH, 'lake'),
+                                conf.config.LEAN_TEST_PATH)
+        except Exception as e:
+            print(traceback.format_exc())
+            return False
+
+    def insert(self, node: Node, formal_statement: str=None, verified: bool | None = None):
+        """
+        verified: 调用方已完成的REPL检查结果(异步搜索在线程中检查), 为None时在此检查
+        """
         if not node.state:
-            try:
-                print(f"lake repl check!!!",flush=True)
-                full_proof = self.get_incontext(node, formal_statement)
-                repl_res = verify_proof(full_proof)
-            except Exception as e:
-                print(traceback.format_exc())
-                self.found = False
-            else:
-                self.found = repl_res
+            self.found = self.verify(node, formal_statement) if verified is None else verified
             if not self.found:
                 return
             # self.found = True
-        deduped_state_str = state_repr_dedup(node.state)
-        if deduped_state_str not in self.nodes:
-            self.nodes[deduped_state_str] = node
+        key = node.fingerprint
+        if key not in self.nodes:
+            self.nodes[key] = node
+            if node.state and self.use_retrieval and conf.config.RETRIEVAL_PREFETCH:
+                LeanSearch.prefetch(state_repr(node.state))
             if node.depth >0:
-                self.score[deduped_state_str] = -node.score/((node.depth)**self.alpha)
+                self.score[key] = -node.score/((node.depth)**self.alpha)
             else:
-                self.score[deduped_state_str] = 0.0
+                self.score[key] = 0.0
             self.depth = max(self.depth, node.depth)
 
+    def discard_proof(self, node: Node):
+        """
+        找到的证明无法在主进程中物化(重放tactic失败)时撤销: 删除证明节点并继续搜索,
+        搜索结束时按未找到证明处理, Interactive仍会give_up并退出tactic模式
+        """
+        self.found = False
+        if self.nodes.get(node.fingerprint) is node:
+            del self.nodes[node.fingerprint]
+            self.score.pop(node.fingerprint, None)
+
     def get(self) -> Node:
         k, _ = self.score.popitem()
         return self.nodes[k]
 
     def going(self) -> bool:
-        return not self.found and len(self.nodes) < self.max_nodes
+        return not self.found and len(self.nodes) - self.inherited_nodes < self.max_nodes and not self.stopped()
+
+    def warm_start(self, previous: "BestFirstSearch", max_frontier: int = conf.config.WARM_START_MAX_FRONTIER):
+        """
+        从上一次尝试的搜索树继续搜索, 需在插入根节点之后调用.
+        已扩展过的state记为已访问, 分数最高的max_frontier个frontier节点保留原分数重新加入frontier.
+        新的Interactive会话中没有这些节点的Lean状态, 节点以负数sid占位, 被扩展时沿路径重放tactic物化,
+        路径上已物化的前缀由各节点共享, 不会重复执行.
+        """
+        # heapdict中分数越小越优先
+        ranked = sorted(previous.score.items(), key=lambda item: item[1])
+        frontier = ranked[:max_frontier]
+        kept = {key for key, _ in frontier}
+        # 未保留的frontier节点不算已访问, 之后仍可被重新发现
+        dropped = {key for key, _ in ranked[max_frontier:]}
+        mapping = {}
+        for old in sorted(previous.nodes.values(), key=lambda n: n.depth):
+            key = old.fingerprint
+            if key in dropped:
+                continue
+            if old.parent is None:
+                if key in self.nodes:
+                    mapping[key] = self.nodes[key]
+                    if key in self.score and key not in kept:
+                        del self.score[key]
+                continue
+            parent = mapping.get(old.parent.fingerprint)
+            if parent is None:
+                continue
+            self.placeholder_sid -= 1
+            node = Node(self.placeholder_sid, parent.sid, old.tactic, old.state, old.depth, old.score, parent)
+            mapping[key] = node
+            self.nodes.setdefault(key, node)
+            self.depth = max(self.depth, node.depth)
+        for key, priority in frontier:
+            if key in mapping:
+                self.score[key] = priority
+        self.inherited_nodes = len(self.nodes)
 
     def tactic_filter(self, tactic: str) -> bool:
         for forbidden_tactic in self.abandon_if_contain:
@@ -73,62 +149,376 @@ class BestFirstSearch:
         return True
     
     def get_incontext(self, node: Node, formal_statement: str):
-        path = []
-        current = node
-        while current:
-            path.append(current.tactic)
-            current = current.parent
-        path.reverse()
         res = formal_statement.replace("sorry", "").replace("by", "").strip() + " by\n"
-        res += "\n".join(path)
+        res += node.proof_prefix
         return res
     
+    def get_batch(self, generator: TacticGenerator) -> list[Node]:
+        """
+        从frontier中按分数取出至多expansion_batch_size个节点, 数量不超过generator剩余的调用次数
+        """
+        batch_size = self.expansion_batch_size
+        if self.helpers:
+            # 扩展在持有节点状态的进程中进行, 每批至少取进程数个节点, 各进程才有任务
+            batch_size = max(batch_size, len(self.helpers) + 1)
+        size = min(batch_size, generator.max_calls - len(generator.calls))
+        if self.helpers:
+            return self.get_spread(size)
+        nodes = []
+        while len(nodes) < size and len(self.score) > 0:
+            nodes.append(self.get())
+        return nodes
+
+    def get_spread(self, size: int, window: int = 4) -> list[Node]:
+        """
+        有helper时按进程分摊地取出size个节点: 在分数最高的window*size个frontier节点中按分数依次选取,
+        持有该节点的进程都已分到足够的节点时跳过它, 未选中的节点按原分数放回frontier
+        """
+        per_process = -(-size // (len(self.helpers) + 1))
+        load = Counter()
+        candidates = []
+        while len(candidates) < window * size and len(self.score) > 0:
+            candidates.append(self.score.popitem())
+        nodes = []
+        for key, priority in candidates:
+            node = self.nodes[key]
+            # 不在任何进程中的节点扩展前在主进程中物化
+            process = min(self.holders(node) or [0], key=lambda p: load[p])
+            if len(nodes) < size and load[process] < per_process:
+                load[process] += 1
+                nodes.append(node)
+            else:
+                self.score[key] = priority
+        return nodes
+
+    def generate(self, generator: TacticGenerator, nodes: list[Node]) -> list[tuple[list[str], list[float]]]:
+        if self.is_incontext:
+            incontext = [self.get_incontext(node, generator.formal_statement) for node in nodes]
+        else:
+            incontext = None
+        if len(nodes) == 1:
+            return [generator.from_state(nodes[0].state, self.num_samples, incontext[0] if incontext else None, self.template, self.use_retrieval)]
+        # 多个节点在一次vLLM调用中生成
+        return generator.from_state_batch([node.state for node in nodes], self.num_samples, incontext, self.template, self.use_retrieval)
+
+    def get_candidates(self, node: Node, tactics: list[str], logprobs: list[float]) -> list[tuple[str, float]]:
+        tactics_logprob = []
+        for tactic, logprob in zip(tactics,logprobs):
+            tactics_logprob.append((tactic,logprob))
+        candidates = []
+        for tactic_logprob, num_reps in Counter(tactics_logprob).items():
+            tactic,logprob = tactic_logprob
+            if not self.tactic_filter(tactic):
+                continue
+            self.tactic_sid_record.append({"tactic":tactic, "sid":node.sid})
+            candidates.append(tactic_logprob)
+        return candidates
+
+    def insert_results(self, node: Node, results: list[tuple[tuple[str, float], int, list]], formal_statement: str) -> Node | None:
+        """
+        将执行成功的tactic生成的新节点插入搜索树, 找到证明时返回对应的节点
+        """
+        for result in results:
+            new_node = self.child_node(node, result)
+            if new_node is None:
+                continue
+            self.insert(new_node,formal_statement)
+            if not new_node.state and self.found:
+                return new_node
+        return None
+
+    async def insert_results_async(self, node: Node, results: list[tuple[tuple[str, float], int, list]], formal_statement: str) -> Node | None:
+        """
+        与insert_results相同, 但找到证明时在线程中做REPL检查, 不阻塞事件循环上的其他Lean交互
+        """
+        loop = asyncio.get_running_loop()
+        for result in results:
+            new_node = self.child_node(node, result)
+            if new_node is None:
+                continue
+            verified = None
+            if not new_node.state:
+                verified = await loop.run_in_executor(None, self.verify, new_node, formal_statement)
+            self.insert(new_node, formal_statement, verified)
+            if not new_node.state and self.found:
+                return new_node
+        return None
+
+    @staticmethod
+    def child_node(node: Node, result: tuple[tuple[str, float], int, list]) -> Node | None:
+        (tactic, logprob), sid, state = result
+        if isinstance(state, RuntimeError):
+            raise state
+        # print(f"{tactic},logprob:{logprob}",flush=True)
+        # print(state,flush=True)
+        new_node = Node(sid, node.sid, tactic, state, node.depth + 1, logprob+node.score, node)
+        if hard_stop_criterion(new_node):
+            return None
+        return new_node
+
+    def lookup_cached(self, node: Node, candidates: list[tuple[str, float]]) -> tuple[dict, list[int]]:
+        """
+        在置换表中查询候选tactic, 返回 (命中的结果 {index: (sid, state)}, 需要在Lean中执行的index列表).
+        已知失败的tactic直接丢弃; 已知成功的tactic生成待物化的节点(sid为负数占位), 被扩展时才在Lean中执行.
+        """
+        if self.transposition_table is None:
+            return {}, list(range(len(candidates)))
+        cached = {}
+        misses = []
+        for index, (tactic, _) in enumerate(candidates):
+            outcome = self.transposition_table.get(self.transposition_scope, node.exact_fingerprint, tactic)
+            if outcome is None:
+                misses.append(index)
+            elif outcome.error is None:
+                self.placeholder_sid -= 1
+                cached[index] = (self.placeholder_sid, outcome.state)
+        return cached, misses
+
+    def merge_results(self, node: Node, candidates: list[tuple[str, float]], cached: dict, misses: list[int], outcomes: list[tuple]) -> list:
+        """
+        按候选顺序合并置换表命中与Lean执行的结果 (outcomes与misses一一对应), 同时把新的执行结果写入置换表
+        """
+        executed = {}
+        for index, (sid, state) in zip(misses, outcomes):
+            tactic = candidates[index][0]
+            if isinstance(sid, RuntimeError):
+                if self.transposition_table is not None:
+                    self.transposition_table.put(self.transposition_scope, node.exact_fingerprint, tactic,
+                                                 TacticOutcome(error=str(sid)))
+                continue
+            executed[index] = (sid, state)
+            if self.transposition_table is not None and not isinstance(state, RuntimeError):
+                self.transposition_table.put(self.transposition_scope, node.exact_fingerprint, tactic,
+                                             TacticOutcome(state=state))
+        results = []
+        for index, candidate in enumerate(candidates):
+            if index in executed:
+                results.append((candidate, *executed[index]))
+            elif index in cached:
+                results.append((candidate, *cached[index]))
+        return results
+
+    @staticmethod
+    def run_candidates(interactive: Interactive, sid: int, tactics: list[str]) -> list[tuple]:
+        """
+        在sid上以流水线方式执行全部tactic, 返回与tactics对应的 (sid或RuntimeError, state或None)
+        """
+        sids = interactive.run_tactics(sid, tactics)
+        # RuntimeError 表示tactic执行失败, 不再获取state
+        states = iter(interactive.get_states([s for s in sids if not isinstance(s, RuntimeError)]))
+        return [(s, None) if isinstance(s, RuntimeError) else (s, next(states)) for s in sids]
+
+    def attach_helpers(self, helpers: list[Interactive]):
+        """
+        helpers: 打开了同一道题的其他Interactive进程, 扩展时候选tactic在它们中并行执行
+        """
+        self.helpers = helpers
+        self.helper_sids = [{} for _ in helpers]
+        if helpers:
+            self.executor = ThreadPoolExecutor(max_workers=len(helpers), thread_name_prefix="lean-helper")
+
+    def detach_helpers(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.helpers = []
+        self.helper_sids = []
+
+    def holders(self, node: Node) -> list[int]:
+        """
+        已有node的Lean状态的进程: 0为主进程, k+1为第k个helper. 根节点在所有进程中的sid都是0
+        """
+        if node.parent is None:
+            return list(range(len(self.helpers) + 1))
+        processes = [0] if node.sid >= 0 else []
+        key = node.exact_fingerprint
+        processes += [k + 1 for k, sids in enumerate(self.helper_sids) if key in sids]
+        return processes
+
+    def sid_in(self, process: int, node: Node) -> int:
+        if process == 0 or node.parent is None:
+            return node.sid
+        return self.helper_sids[process - 1][node.exact_fingerprint]
+
+    def run_tasks(self, process: int, interactive: Interactive, jobs: list[tuple[Node, list[str]]], tasks: list[tuple]) -> list[list[tuple]]:
+        target = interactive if process == 0 else self.helpers[process - 1]
+        return [self.run_candidates(target, sid, jobs[j][1][positions]) for j, positions, sid in tasks]
+
+    def adopt(self, index: int, outcomes: list[tuple]) -> list[tuple]:
+        """
+        记录第index个helper中得到的state在该helper中的sid, 主进程中以负数sid占位
+        """
+        converted = []
+        for sid, state in outcomes:
+            if not isinstance(sid, RuntimeError):
+                if not isinstance(state, RuntimeError):
+                    self.helper_sids[index][state_exact_fingerprint(state)] = sid
+                self.placeholder_sid -= 1
+                sid = self.placeholder_sid
+            converted.append((sid, state))
+        return converted
+
+    def execute(self, jobs: list[tuple[Node, list[str]]], interactive: Interactive) -> list[list[tuple]]:
+        """
+        执行一批节点的候选tactic, 返回与jobs一一对应的outcomes.
+        节点只在已有其Lean状态的进程中执行, 不重放路径: 被多个进程持有的节点(如根节点)按间隔把tactic分给这些进程;
+        helper中得到的子节点记录其在该helper中的sid, 之后也在该helper中扩展. 各进程的任务同时执行
+        """
+        tasks = [[] for _ in range(len(self.helpers) + 1)]
+        outcomes: list[list] = [[None] * len(tactics) for _, tactics in jobs]
+        for j, (node, tactics) in enumerate(jobs):
+            holders = self.holders(node)
+            groups = min(len(holders), len(tactics))
+            for g in range(groups):
+                tasks[holders[g]].append((j, slice(g, None, groups), self.sid_in(holders[g], node)))
+        futures = {process: self.executor.submit(self.run_tasks, process, interactive, jobs, tasks[process])  # type: ignore
+                   for process in range(1, len(tasks)) if tasks[process]}
+        done = {0: self.run_tasks(0, interactive, jobs, tasks[0])}
+        for process, future in futures.items():
+            done[process] = future.result()
+        for process, results in done.items():
+            for (j, positions, _), result in zip(tasks[process], results):
+                outcomes[j][positions] = result if process == 0 else self.adopt(process - 1, result)
+        return outcomes
+
+    def materialize(self, node: Node, interactive: Interactive) -> bool:
+        """
+        置换表命中或热启动恢复的节点没有对应的Lean状态, 使用前先物化父节点, 再在父节点上重新执行tactic
+        """
+        if node.sid >= 0:
+            return True
+        if not self.materialize(node.parent, interactive):  # type: ignore
+            return False
+        try:
+            node.sid = interactive.run_tactic(node.parent.sid, node.tactic)  # type: ignore
+        except RuntimeError:
+            return False
+        return True
+
+    async def materialize_async(self, node: Node, interactive: AsyncInteractive) -> bool:
+        if node.sid >= 0:
+            return True
+        if not await self.materialize_async(node.parent, interactive):  # type: ignore
+            return False
+        try:
+            node.sid = await interactive.run_tactic(node.parent.sid, node.tactic)  # type: ignore
+        except RuntimeError:
+            return False
+        return True
+
+    def expand(self, node: Node, tactics: list[str], logprobs: list[float], generator: TacticGenerator, interactive: Interactive):
+        self.expand_batch([node], [(tactics, logprobs)], generator, interactive)
+
+    def expand_batch(self, nodes: list[Node], outputs: list[tuple[list[str], list[float]]], generator: TacticGenerator, interactive: Interactive):
+        """
+        扩展一批节点: 各节点的候选tactic在持有其状态的进程中同时执行, 再按顺序插入结果.
+        只有不在任何进程中的节点(置换表命中或热启动恢复)才在主进程中重放路径物化
+        """
+        jobs = []
+        for node, (tactics, logprobs) in zip(nodes, outputs):
+            if not self.holders(node) and not self.materialize(node, interactive):
+                continue
+            candidates = self.get_candidates(node, tactics, logprobs)
+            cached, misses = self.lookup_cached(node, candidates)
+            jobs.append((node, candidates, cached, misses))
+        try:
+            # 同一节点的全部tactic以流水线方式发送, 避免逐条请求的往返等待
+            outcomes = self.execute([(node, [candidates[index][0] for index in misses])
+                                     for node, candidates, _, misses in jobs], interactive)
+        except Exception as e:
+            #目前仅在run_tactic加入记录error-logging功能， 因为根据以往经验在get_state/giveup 加入try block可能会导致broken pipe error
+            #如果确定问题所在可以手动添加
+            raise SearchError("An error occurred at run_tactic", 
+                            error_data = self.tactic_sid_record,
+                            error_type = e)
+        for (node, candidates, cached, misses), node_outcomes in zip(jobs, outcomes):
+            if not self.going():
+                break
+            results = self.merge_results(node, candidates, cached, misses, node_outcomes)
+            proof_node = self.insert_results(node, results, generator.formal_statement)
+            if proof_node is None:
+                continue
+            # 证明只能在主进程中提交, helper中得到的证明在此沿路径重放一次
+            if self.materialize(proof_node, interactive):
+                interactive.commit(proof_node.sid)
+                return
+            self.discard_proof(proof_node)
+
+    async def expand_async(self, node: Node, tactics: list[str], logprobs: list[float], generator: TacticGenerator, interactive: AsyncInteractive):
+        if not await self.materialize_async(node, interactive):
+            return
+        candidates = self.get_candidates(node, tactics, logprobs)
+        cached, misses = self.lookup_cached(node, candidates)
+        try:
+            sids = await interactive.run_tactics(node.sid, [candidates[index][0] for index in misses])
+        except Exception as e:
+            raise SearchError("An error occurred at run_tactic", 
+                            error_data = self.tactic_sid_record,
+                            error_type = e)
+        states = iter(await interactive.get_states([sid for sid in sids if not isinstance(sid, RuntimeError)]))
+        outcomes = [(sid, None) if isinstance(sid, RuntimeError) else (sid, next(states)) for sid in sids]
+        results = self.merge_results(node, candidates, cached, misses, outcomes)
+        proof_node = await self.insert_results_async(node, results, generator.formal_statement)
+        if proof_node is None:
+            return
+        if await self.materialize_async(proof_node, interactive):
+            await interactive.commit(proof_node.sid)
+        else:
+            self.discard_proof(proof_node)
+
     def search_proof(self, generator: TacticGenerator, interactive: Interactive):
         while self.going() and generator.has_quota():
-            try:
-                node = self.get()
-            except IndexError:
+            nodes = self.get_batch(generator)
+            if not nodes:
                 break
-            if self.is_incontext:
-                incontext = self.get_incontext(node, generator.formal_statement)
-            else:
-                incontext = None
-            tactics, logprobs = generator.from_state(node.state, self.num_samples, incontext, self.template, self.use_retrieval)
-            tactics_logprob = []
-            for tactic, logprob in zip(tactics,logprobs):
-                tactics_logprob.append((tactic,logprob))
-            for tactic_logprob, num_reps in Counter(tactics_logprob).items():
-                tactic,logprob = tactic_logprob
-                if not self.tactic_filter(tactic):
-                    continue
-                self.tactic_sid_record.append({"tactic":tactic, "sid":node.sid})
-                try:
-                    sid = interactive.run_tactic(node.sid, tactic)     
-                except RuntimeError as e:
-                    # error_info = traceback.format_exc()
-                    # print(error_info,flush=True)
-                    pass
-                except Exception as e:
-                    #目前仅在run_tactic加入记录error-logging功能， 因为根据以往经验在get_state/giveup 加入try block可能会导致broken pipe error
-                    #如果确定问题所在可以手动添加
-                    raise SearchError("An error occurred at run_tactic", 
-                                    error_data = self.tactic_sid_record,
-                                    error_type = e)
-                else:
-                    state = interactive.get_state(sid)
-                    # print(f"{tactic},logprob:{logprob}",flush=True)
-                    # print(state,flush=True)
-                    new_node = Node(sid, node.sid, tactic, state, node.depth + 1, logprob+node.score, node)
-                    if hard_stop_criterion(new_node):
-                        continue
-                    self.insert(new_node,generator.formal_statement)
-                    if not state and self.found:
-                        interactive.commit(sid)
-                        break
+            outputs = self.generate(generator, nodes)
+            if self.helpers:
+                # 不同节点可能在不同进程中, 一起扩展才能让各进程同时执行
+                self.expand_batch(nodes, outputs, generator, interactive)
+                continue
+            for node, (tactics, logprobs) in zip(nodes, outputs):
+                if not self.going():
+                    break
+                self.expand(node, tactics, logprobs, generator, interactive)
         if not self.found:
             sid = interactive.give_up(0)
             interactive.commit(sid)
 
+    async def search_proof_async(self, generator: TacticGenerator, interactive: AsyncInteractive):
+        """
+        与search_proof相同的最优先搜索, 但Lean执行第k批节点的tactic时, 第k+1批节点的生成已经在线程中进行.
+        第k+1批节点在第k批节点的子节点插入之前选出(向前看一步), 因此扩展顺序与search_proof可能略有不同.
+        """
+        loop = asyncio.get_running_loop()
+        pending = None
+        while True:
+            if pending is None:
+                if not (self.going() and generator.has_quota()):
+                    break
+                nodes = self.get_batch(generator)
+                if not nodes:
+                    break
+                pending = (nodes, loop.run_in_executor(None, self.generate, generator, nodes))
+            nodes, future = pending
+            outputs = await future
+            pending = None
+            if self.going() and generator.has_quota():
+                next_nodes = self.get_batch(generator)
+                if next_nodes:
+                    pending = (next_nodes, loop.run_in_executor(None, self.generate, generator, next_nodes))
+            for node, (tactics, logprobs) in zip(nodes, outputs):
+                if not self.going():
+                    break
+                await self.expand_async(node, tactics, logprobs, generator, interactive)
+            if self.found:
+                break
+        if pending is not None:
+            # 已提交的生成无法取消, 等待其结束以免与下一次搜索同时使用generator
+            await pending[1]
+        if not self.found:
+            sid = await interactive.give_up(0)
+            await interactive.commit(sid)
+
     @property
     def info(self):
         return dict(
@@ -136,4 +526,7 @@ class BestFirstSearch:
             beam_width=None, 
             num_samples=self.num_samples, 
             max_nodes=self.max_nodes,
-            max_depth=self.max_depth)
+            max_depth=self.max_depth,
+            expansion_batch_size=self.expansion_batch_size,
+            use_transposition_table=self.transposition_table is not None,
+            lean_workers=len(self.helpers) + 1)
@@ -0,0 +1,128 @@
+import time
+
+from util import ProcessUtil
+
+
+class SearchBudget:
+    """
+    每道题目的统一预算, 与 max_nodes/max_depth/max_calls 一起在各搜索算法的 going() 中检查:
+    - seconds: 墙钟时间
+    - tokens: 本地模型生成的token数 (generator.tokens)
+    - lean_seconds: Lean进程(含子进程)使用的CPU时间. 读取 /proc; 不可用时以 墙钟时间 - 生成时间 近似
+    为None的项不限制. used 为该题目之前各次尝试已用掉的量(来自运行清单), 与本次搜索的用量合计后与上限比较;
+    任一项耗尽后搜索正常结束, cause记录最先耗尽的一项, 写入结果的stop_cause.
+    墙钟预算同时作为单次扩展的截止时间(见deadline), 一次慢的tactic或生成调用不会超出预算.
+    """
+
+    CAUSES = ("seconds", "tokens", "lean_seconds")
+
+    def __init__(self,
+                 max_seconds: float | None = None,
+                 max_tokens: int | None = None,
+                 max_lean_seconds: float | None = None,
+                 used: dict | None = None):
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.max_lean_seconds = max_lean_seconds
+        self.used = used or {}
+        self.cause: str | None = None
+        self.generator = None
+        self.pids: list[int] = []
+        self.start_time = 0.0
+        self.start_tokens = 0
+        self.start_gen_seconds = 0.0
+        self.start_cpu: float | None = None
+        self.final: dict | None = None
+
+    @property
+    def limited(self) -> bool:
+        return self.max_seconds is not None or self.max_tokens is not None or self.max_lean_seconds is not None
+
+    def start(self, generator, interactives: list):
+        """
+        在搜索开始前调用; interactives 为本次搜索使用的全部Lean进程(主进程与helper)
+        """
+        self.generator = generator
+        self.pids = [i.proc.pid for i in interactives if getattr(i, "proc", None) is not None]
+        self.start_time = time.monotonic()
+        self.start_tokens = getattr(generator, "tokens", 0)
+        self.start_gen_seconds = getattr(generator, "gen_seconds", 0.0)
+        self.start_cpu = self._cpu() if self.max_lean_seconds is not None else None
+
+    def _cpu(self) -> float | None:
+        if not self.pids:
+            return None
+        total = 0.0
+        for pid in self.pids:
+            seconds = ProcessUtil.cpu_seconds(pid)
+            if seconds is None:
+                return None
+            total += seconds
+        return total
+
+    def stop(self):
+        """
+        搜索结束时调用, 固定本次的用量: 之后Lean进程会交给其他搜索使用
+        """
+        if self.generator is not None and self.final is None:
+            self.final = self.spent()
+
+    def spent(self) -> dict:
+        """
+        本次搜索的用量, 不含used; start之前均为0
+        """
+        if self.final is not None:
+            return self.final
+        if self.generator is None:
+            return {cause: 0 for cause in self.CAUSES}
+        seconds = time.monotonic() - self.start_time
+        cpu = self._cpu() if self.start_cpu is not None else None
+        if cpu is not None:
+            lean_seconds = cpu - self.start_cpu  # type: ignore
+        else:
+            lean_seconds = seconds - (getattr(self.generator, "gen_seconds", 0.0) - self.start_gen_seconds)
+        return dict(seconds=seconds,
+                    tokens=getattr(self.generator, "tokens", 0) - self.start_tokens,
+                    lean_seconds=lean_seconds)
+
+    def seconds(self) -> float:
+        return self.used.get("seconds", 0.0) + (time.monotonic() - self.start_time if self.generator is not None else 0.0)
+
+    def tokens(self) -> int:
+        return self.used.get("tokens", 0) + (getattr(self.generator, "tokens", 0) - self.start_tokens
+                                             if self.generator is not None else 0)
+
+    def lean_seconds(self) -> float:
+        return self.used.get("lean_seconds", 0.0) + self.spent()["lean_seconds"]
+
+    def deadline(self) -> float | None:
+        """
+        墙钟预算耗尽的时刻(time.monotonic), 用作生成调用与Lean读取响应的截止时间; 不限制墙钟时间时为None
+        """
+        if self.max_seconds is None or self.generator is None:
+            return None
+        return time.monotonic() + self.max_seconds - self.seconds()
+
+    def expire(self):
+        """
+        扩展因超过deadline而中断时调用, 记为墙钟预算耗尽
+        """
+        if self.cause is None:
+            self.cause = "seconds"
+
+    def exhausted(self) -> bool:
+        if self.cause is None and self.limited:
+            if self.max_seconds is not None and self.seconds() >= self.max_seconds:
+                self.cause = "seconds"
+            elif self.max_tokens is not None and self.tokens() >= self.max_tokens:
+                self.cause = "tokens"
+            elif self.max_lean_seconds is not None and self.lean_seconds() >= self.max_lean_seconds:
+                self.cause = "lean_seconds"
+        return self.cause is not None
+
+    def stop_cause(self) -> dict:
+        return {cause: self.cause == cause for cause in self.CAUSES}
+
+    @property
+    def info(self):
+        return dict(max_seconds=self.max_seconds, max_tokens=self.max_tokens, max_lean_seconds=self.max_lean_seconds)
@@ -0,0 +1,27 @@
+from typing import Callable
+
+from manager.search.budget import SearchBudget
+
+
+class SearchControl:
+    """
+    各搜索算法共用的外部停止条件, 在 going() 中通过 stopped() 检查:
+    - cancel: 可选的无参回调, 返回True时停止搜索(同一题目的另一次尝试已找到证明)
+    - budget: 可选的SearchBudget, 任一预算耗尽时停止
+    """
+
+    def init_control(self):
+        self.cancel: Callable[[], bool] | None = None
+        self.cancelled = False
+        self.budget: SearchBudget | None = None
+
+    def is_cancelled(self) -> bool:
+        if not self.cancelled and self.cancel is not None and self.cancel():
+            self.cancelled = True
+        return self.cancelled
+
+    def out_of_budget(self) -> bool:
+        return self.budget is not None and self.budget.exhausted()
+
+    def stopped(self) -> bool:
+        return self.is_cancelled() or self.out_of_budget()
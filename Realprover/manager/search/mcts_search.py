@@ -2,10 +2,11 @@ from collections import Counter
 import math
 from typing import Optional, Dict, Tuple
 
-from manager.struct import Node, Goal, state_repr_dedup
-from manager.thirdparty import Interactive, TacticGenerator
+from manager.struct import Node, Goal, state_fingerprint, state_repr
+from manager.thirdparty import Interactive, TacticGenerator, LeanSearch
 import conf.config
 from manager.search.exception import SearchError
+from manager.search.control import SearchControl
 EPSILON = 1e-3
 
 class MCTSNode(Node):
@@ -22,7 +23,7 @@ class MCTSNode(Node):
         self.value = 0.0  # 价值估计
         self.children: Dict[str, "MCTSNode"] = {} # str是字符串化的tacitc
 
-class MCTSSearch:
+class MCTSSearch(SearchControl):
     def __init__(
         self,
         num_samples: int = conf.config.NUM_SAMPLES,
@@ -37,9 +38,10 @@ class MCTSSearch:
         abandon_if_contain: list[str] = conf.config.ABANDON_IF_CONTAIN
     ):
         self.found = False
-        self.nodes: Dict[str, MCTSNode] = {}  # 由于是继承式字段扩增，所以外面当作Node类的调用不会出问题
+        self.init_control()
+        self.nodes: Dict[int, MCTSNode] = {}  # 由于是继承式字段扩增，所以外面当作Node类的调用不会出问题
         self.root: MCTSNode = None
-        self.score = dict() #(deduped_state_str, score), 用于UCB的计算，当作基础值。注意并非heapdict，所以都是正值，跟beamsearch不同
+        self.score = dict() #(state fingerprint, score), 用于UCB的计算，当作基础值。注意并非heapdict，所以都是正值，跟beamsearch不同
         self.depth = 0
         self.max_nodes = max_nodes
         self.max_depth = max_depth
@@ -75,11 +77,13 @@ class MCTSSearch:
             # self.interactive.commit(node.sid)
             self.found = True
             self.success_sid = node.sid
-        deduped_state_str = state_repr_dedup(node.state)
-        if deduped_state_str not in self.nodes:
-            self.nodes[deduped_state_str] = node
+        key = node.fingerprint
+        if key not in self.nodes:
+            self.nodes[key] = node
             self.depth = max(self.depth, node.depth)
-            self.score[deduped_state_str] = 0
+            self.score[key] = 0
+            if node.state and conf.config.RETRIEVAL_PREFETCH:
+                LeanSearch.prefetch(state_repr(node.state))
 
     def _delete_node(self, mcts_node: MCTSNode):
         if mcts_node.sid == 0:  # 根节点不删除
@@ -92,8 +96,8 @@ class MCTSSearch:
         # 删除当前节点
         parent = mcts_node.parent
         del parent.children[mcts_node.tactic]
-        del self.nodes[state_repr_dedup(mcts_node.state)]
-        del self.score[state_repr_dedup(mcts_node.state)]
+        del self.nodes[mcts_node.fingerprint]
+        del self.score[mcts_node.fingerprint]
         
         # 清理引用关系
         mcts_node.parent = None
@@ -114,40 +118,45 @@ class MCTSSearch:
             return True
         tactics, scores = generator.from_state(mcts_node.state, self.num_samples)
         self.call_cnt += 1
-        has_valid_tactics = False
+        candidates = []
         for (tactic, num_reps), _ in zip(Counter(tactics).items(), scores):
             if not self.tactic_filter(tactic):
                 continue
             self.tactic_sid_record.append({"tactic":tactic, "sid":mcts_node.sid})
-            try:
-                sid = interactive.run_tactic(mcts_node.sid, tactic)
-            except RuntimeError:
-                pass
-            except Exception as e:
-                #根据以往经验在get_state/giveup 加入try block可能会导致broken pipe error
-                #如果确定问题所在可以手动添加
-                raise SearchError("An error occurred at run_tactic", 
+            candidates.append((tactic, num_reps))
+        try:
+            sids = interactive.run_tactics(mcts_node.sid, [tactic for tactic, _ in candidates])
+        except Exception as e:
+            #根据以往经验在get_state/giveup 加入try block可能会导致broken pipe error
+            #如果确定问题所在可以手动添加
+            raise SearchError("An error occurred at run_tactic", 
+                error_data = self.tactic_sid_record,
+                error_type = e)
+        succeeded = [(c, sid) for c, sid in zip(candidates, sids) if not isinstance(sid, RuntimeError)]
+        has_valid_tactics = bool(succeeded)
+        try:
+            #这里据国雄消息可能还有bug， debug后去掉try block
+            states = interactive.get_states([sid for _, sid in succeeded])
+        except Exception as e:
+            raise SearchError("An error occurred at get_state", 
+                error_data = self.tactic_sid_record,
+                error_type = e)
+        for ((tactic, num_reps), sid), state in zip(succeeded, states):
+            if isinstance(state, RuntimeError):
+                raise SearchError("An error occurred at get_state", 
                     error_data = self.tactic_sid_record,
-                    error_type = e)
-            else:
-                has_valid_tactics = True
-                try:
-                    #这里据国雄消息可能还有bug， debug后去掉try block
-                    state = interactive.get_state(sid)
-                except Exception as e:
-                    raise SearchError("An error occurred at get_state", 
-                        error_data = self.tactic_sid_record,
-                        error_type = e)
-                if state_repr_dedup(state) not in self.nodes:
-                    new_node = MCTSNode(sid, mcts_node.sid, tactic, state, 
-                              mcts_node.depth + 1, 1, mcts_node)
-                    mcts_node.children[tactic] = new_node
-                    self.insert(new_node)
-                    if not state:
-                        interactive.commit(sid)
-                        self.found = True
-                        return True
-                self.score[state_repr_dedup(state)] += num_reps
+                    error_type = state)
+            key = state_fingerprint(state)
+            if key not in self.nodes:
+                new_node = MCTSNode(sid, mcts_node.sid, tactic, state, 
+                          mcts_node.depth + 1, 1, mcts_node)
+                mcts_node.children[tactic] = new_node
+                self.insert(new_node)
+                if not state:
+                    interactive.commit(sid)
+                    self.found = True
+                    return True
+            self.score[key] += num_reps
         if not has_valid_tactics:
             self._delete_node(mcts_node)
             return False
@@ -172,10 +181,11 @@ class MCTSSearch:
         
         for child in mcts_node.children.values():
             # UCB公式: Q + c_puct * sqrt(N) / (1 + n)
-            exploit = self.c_score * self.score[state_repr_dedup(child.state)] + child.value / (child.visits + EPSILON) # 防止除0
+            child_score = self.score[child.fingerprint]
+            exploit = self.c_score * child_score + child.value / (child.visits + EPSILON) # 防止除0
             explore = self.c_puct * math.sqrt(total_visits) / (1 + child.visits)
             value = exploit + explore
-            temp_scores.append((self.score[state_repr_dedup(child.state)],child.value / (child.visits + EPSILON),explore,child.tactic))
+            temp_scores.append((child_score,child.value / (child.visits + EPSILON),explore,child.tactic))
             if value > best_value:
                 best_value = value
                 best_child = child
@@ -237,7 +247,7 @@ class MCTSSearch:
         # TODO: 使用价值网络评估终态
         if not current_node.state:
             return 1.0
-        return self.score[state_repr_dedup(mcts_node.state)]
+        return self.score[mcts_node.fingerprint]
 
     def _backpropagate(self, mcts_node: MCTSNode, value: float):
         """反向传播阶段：更新节点统计信息
@@ -250,11 +260,12 @@ class MCTSSearch:
             current.visits += 1
             current.value += value
             # 获取父节点
-            parent_state = state_repr_dedup(current.parent.state) if current.parent else None #TODO: 把parent在继承类中复写为MCTSNode
-            current = self.nodes.get(parent_state) if parent_state else None
+            parent_key = current.parent.fingerprint if current.parent else None #TODO: 把parent在继承类中复写为MCTSNode
+            current = self.nodes.get(parent_key) if parent_key is not None else None
 
     def going(self) -> bool:
-        return not self.found and len(self.nodes) < self.max_nodes and self.depth < self.max_depth and self.call_cnt < self.max_calls
+        return (not self.found and len(self.nodes) < self.max_nodes and self.depth < self.max_depth
+                and self.call_cnt < self.max_calls and not self.stopped())
 
     def search_proof(self, generator: TacticGenerator, interactive: Interactive):
         """执行MCTS搜索
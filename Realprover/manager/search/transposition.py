@@ -0,0 +1,51 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from manager.struct import Goal
+from util import LruCache
+import conf.config
+
+
+@dataclass
+class TacticOutcome:
+    state: Optional[list[Goal]] = None  # 执行成功时的新state
+    error: Optional[str] = None  # 执行失败时的错误信息
+
+
+class TranspositionTable:
+    """
+    缓存 (state的精确指纹, 规范化的tactic) -> 执行结果, 命中时跳过 run_tactic/get_state.
+    使用保留假设名和重复假设的 state_exact_fingerprint, 而不是合并节点用的去重指纹:
+    去重后相同的两个state对同一tactic的结果可能不同(例如 `exact h2` 依赖假设名).
+    内存中按LRU淘汰, 可选sqlite磁盘层使结果在进程/运行之间保留.
+    scope用来隔离不同题目(同样打印结果的state在不同题目中未必等价), 跨题目共享时传入相同的scope即可.
+    """
+
+    def __init__(self,
+                 capacity: int = conf.config.TRANSPOSITION_CAPACITY,
+                 path: Optional[str] = conf.config.TRANSPOSITION_PATH):
+        self.cache = LruCache(capacity, path, table="outcome")
+
+    @staticmethod
+    def normalize_tactic(tactic: str) -> str:
+        # 缩进在Lean中有意义, 只去掉首尾空白和行尾空白
+        return "\n".join(line.rstrip() for line in tactic.strip().splitlines())
+
+    @staticmethod
+    def make_key(scope: str, fingerprint: int, tactic: str) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(scope.encode("utf-8"))
+        h.update(fingerprint.to_bytes(16, "big"))
+        h.update(TranspositionTable.normalize_tactic(tactic).encode("utf-8"))
+        return h.digest()
+
+    def get(self, scope: str, fingerprint: int, tactic: str) -> Optional[TacticOutcome]:
+        return self.cache.get(self.make_key(scope, fingerprint, tactic))
+
+    def put(self, scope: str, fingerprint: int, tactic: str, outcome: TacticOutcome):
+        self.cache.put(self.make_key(scope, fingerprint, tactic), outcome)
+
+    @property
+    def info(self):
+        return dict(transposition_hits=self.cache.hits, transposition_misses=self.cache.misses)
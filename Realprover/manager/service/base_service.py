@@ -1,13 +1,18 @@
 import os
 import copy
+import contextlib
 import platform
+import threading
 from pathlib import Path
+from typing import Callable
 
 import conf.config
-from manager.thirdparty import Interactive, TacticGenerator
+from manager.thirdparty import Interactive, AsyncInteractive, InteractivePool, TacticGenerator
 from manager.struct import Node
-from manager.search import BestFirstSearch, BeamSearch, MCTSSearch
+from manager.search import BestFirstSearch, BeamSearch, MCTSSearch, TranspositionTable, SearchBudget
+from manager.search.exception import SearchError
 from manager.manage import ProofParseManage
+from util import LoopThread
 
 
 class BaseService(object):
@@ -36,7 +41,20 @@ class BaseService(object):
                 abandon_if_contain: list[str] = conf.config.ABANDON_IF_CONTAIN,
                 is_incontext: bool = conf.config.IS_INCONTEXT,
                 template: str = 'deepseek',
-                use_retrieval: bool = conf.config.USE_RETRIEVAL
+                use_retrieval: bool = conf.config.USE_RETRIEVAL,
+                interactive_pool_size: int = conf.config.INTERACTIVE_POOL_SIZE,
+                use_async_interactive: bool = conf.config.USE_ASYNC_INTERACTIVE,
+                expansion_batch_size: int = conf.config.EXPANSION_BATCH_SIZE,
+                use_transposition_table: bool = conf.config.USE_TRANSPOSITION_TABLE,
+                transposition_shared: bool = conf.config.TRANSPOSITION_SHARED,
+                transposition_path: str = conf.config.TRANSPOSITION_PATH,
+                warm_start_retries: bool = conf.config.WARM_START_RETRIES,
+                warm_start_max_frontier: int = conf.config.WARM_START_MAX_FRONTIER,
+                engine_args: dict = conf.config.VLLM_ENGINE_ARGS,
+                adaptive_sampling: dict = conf.config.ADAPTIVE_SAMPLING,
+                backend: dict = conf.config.GENERATION_BACKEND,
+                lean_workers: int = conf.config.LEAN_WORKERS,
+                search_budget: dict = conf.config.SEARCH_BUDGET
                 ):
         """
 
@@ -64,61 +82,211 @@ class BaseService(object):
         self.is_incontext = is_incontext
         self.template = template
         self.use_retrieval = use_retrieval
+        # 每个搜索同时使用的Interactive进程数, 大于1时一次扩展的候选tactic分到多个进程并行执行(仅同步BestFirstSearch)
+        self.lean_workers = max(lean_workers, 1) if not use_beam_search and not use_mcts_search else 1
+        self.interactive_pool_size = max(interactive_pool_size, self.lean_workers)
+        self.interactive_pool = None  # 在实际执行的(子)进程中懒加载, Popen对象不能跨进程共享
+        # 异步模式仅用于BestFirstSearch: Lean执行与下一次扩展的tactic生成重叠进行
+        self.use_async_interactive = use_async_interactive and not use_beam_search and not use_mcts_search
+        if self.use_async_interactive:
+            self.lean_workers = 1
+        self.loop_thread = None
+        self.expansion_batch_size = expansion_batch_size
+        # 置换表目前只接入BestFirstSearch, 同样在实际执行的进程中懒加载
+        self.use_transposition_table = use_transposition_table and not use_beam_search and not use_mcts_search
+        self.transposition_shared = transposition_shared
+        self.transposition_path = transposition_path
+        self.transposition_table = None
+        self.warm_start_retries = warm_start_retries and not use_beam_search and not use_mcts_search
+        self.warm_start_max_frontier = warm_start_max_frontier
+        self.engine_args = engine_args
+        self.adaptive_sampling = adaptive_sampling
+        self.backend = backend
+        # 每道题目的墙钟时间/生成token/Lean CPU时间预算(多次尝试合计), 见 SearchBudget
+        self.search_budget = search_budget
 
     def process_one(self, 
                     source: str, 
-                    generator: TacticGenerator) -> list[tuple[str, BestFirstSearch, list]]:
-        os.environ["PATH"] += ":" + str(self.lean_env)
-        interactive = Interactive(self.root, Path("Header.lean"))
-        
-        
-        test_file = self.root / f"TestOne_{platform.node()}_{os.getpid()}.lean"  # 添加节点id和进程Id，防止多进程操作同一个文件引起的error
+                    generator: TacticGenerator,
+                    previous: list[tuple[str, BestFirstSearch, list]] = None,
+                    cancel: Callable[[], bool] = None,
+                    budget_used: dict = None) -> list[tuple[str, BestFirstSearch, list]]:
+        """
+        previous: 同一题目上一次尝试的process_one结果, 开启warm_start_retries时从其搜索树继续
+        cancel: 搜索过程中定期调用, 返回True时提前结束本次尝试(如该题目已被其他尝试证明)
+        budget_used: 该题目之前的尝试已用掉的预算, 见 SearchBudget
+        """
+        self._init_interactive_pool()
+        self._init_transposition_table()
+        with self.interactive_pool.session() as interactive:  # type: ignore
+            if self.use_async_interactive:
+                return self.loop_thread.run(self._process_with_async(source, generator, interactive, previous, cancel, budget_used))  # type: ignore
+            with contextlib.ExitStack() as stack:
+                helpers = [stack.enter_context(self.interactive_pool.session())  # type: ignore
+                           for _ in range(self.lean_workers - 1)]
+                return self._process_with(source, generator, interactive, previous, helpers, cancel, budget_used)
+
+    def _warm_start(self, search, decl: str, previous: list[tuple[str, BestFirstSearch, list]] = None):
+        if not self.warm_start_retries or not previous:
+            return
+        for prev_decl, prev_search, _ in previous:
+            if prev_decl == decl:
+                search.warm_start(prev_search, self.warm_start_max_frontier)
+                break
+
+    def _build_search(self, source: str = ''):
+        if self.use_beam_search:
+            search = BeamSearch(max_nodes=self.max_nodes,
+                                max_depth=self.max_depth,
+                                beam_width=self.beam_width,
+                                num_samples=self.num_samples,
+                                abandon_if_contain = self.abandon_if_contain)
+        elif self.use_mcts_search:
+            search = MCTSSearch(max_nodes=self.max_nodes,
+                                max_depth=self.max_depth,
+                                num_samples=self.num_samples,
+                                simulation_depth=self.simulation_depth,
+                                c_puct=self.c_puct,
+                                c_score=self.c_score,
+                                c_expansion_fail_penalty=self.c_expansion_fail_penalty,
+                                max_root_expansion=self.max_root_expansion,
+                                max_calls=self.max_calls,
+                                abandon_if_contain = self.abandon_if_contain)
+        else:
+            search = BestFirstSearch(max_nodes=self.max_nodes,
+                                    max_depth=self.max_depth,
+                                    num_samples=self.num_samples,
+                                    abandon_if_contain = self.abandon_if_contain,
+                                    is_incontext=self.is_incontext,
+                                    template=self.template,
+                                    use_retrieval=self.use_retrieval,
+                                    expansion_batch_size=self.expansion_batch_size,
+                                    transposition_table=self.transposition_table,
+                                    transposition_scope='' if self.transposition_shared else source)
+        return search
+
+    def _build_budget(self, generator: TacticGenerator, interactives: list, used: dict = None) -> SearchBudget | None:
+        if not self.search_budget:
+            return None
+        budget = SearchBudget(**self.search_budget, used=used)
+        budget.start(generator, interactives)
+        return budget
+
+    @staticmethod
+    def _set_deadline(budget: SearchBudget | None, generator: TacticGenerator, interactives: list):
+        """
+        把墙钟预算耗尽的时刻设为生成调用与Lean读取响应的截止时间; budget为None时清除
+        """
+        deadline = budget.deadline() if budget is not None else None
+        for target in [generator, *interactives]:
+            target.deadline = deadline
+
+    @staticmethod
+    def _deadline_exceeded(search, error: Exception) -> bool:
+        """
+        扩展超过截止时间时Lean读取抛出TimeoutError(超时的进程已被结束), 搜索按墙钟预算耗尽结束
+        """
+        if isinstance(error, SearchError):
+            error = error.error_type
+        if not isinstance(error, TimeoutError) or search.budget is None:
+            return False
+        search.budget.expire()
+        return True
+
+    def _process_with(self, source: str, generator: TacticGenerator, interactive: Interactive, previous: list = None, helpers: list[Interactive] = None, cancel: Callable[[], bool] = None, budget_used: dict = None) -> list[tuple[str, BestFirstSearch, list]]:
+        """
+        helpers: 与interactive打开同一文件的其他Interactive, 与主进程逐题同步, 供搜索并行执行tactic
+        """
+        helpers = helpers or []
+        test_file = self.root / f"TestOne_{platform.node()}_{os.getpid()}_{threading.get_ident()}.lean"  # 添加节点id、进程Id和线程Id，防止多进程/多线程操作同一个文件引起的error
         with test_file.open("w") as fp:
             fp.write(source)
         interactive.open_file(test_file, [None])
+        for helper in helpers:
+            helper.open_file(test_file, [None])
         
         results = []
         while True:
             generator.reset_calls(source)
             decl = interactive.get_next_problem()
+            for helper in helpers:
+                helper.get_next_problem()
             if decl is None:
                 break
-            if self.use_beam_search:
-                search = BeamSearch(max_nodes=self.max_nodes,
-                                    max_depth=self.max_depth,
-                                    beam_width=self.beam_width,
-                                    num_samples=self.num_samples,
-                                    abandon_if_contain = self.abandon_if_contain)
-            elif self.use_mcts_search:
-                search = MCTSSearch(max_nodes=self.max_nodes,
-                                    max_depth=self.max_depth,
-                                    num_samples=self.num_samples,
-                                    simulation_depth=self.simulation_depth,
-                                    c_puct=self.c_puct,
-                                    c_score=self.c_score,
-                                    c_expansion_fail_penalty=self.c_expansion_fail_penalty,
-                                    max_root_expansion=self.max_root_expansion,
-                                    max_calls=self.max_calls,
-                                    abandon_if_contain = self.abandon_if_contain)
-            else:
-                search = BestFirstSearch(max_nodes=self.max_nodes,
-                                        max_depth=self.max_depth,
-                                        num_samples=self.num_samples,
-                                        abandon_if_contain = self.abandon_if_contain,
-                                        is_incontext=self.is_incontext,
-                                        template=self.template,
-                                        use_retrieval=self.use_retrieval)
+            search = self._build_search(source)
+            search.cancel = cancel
+            search.budget = self._build_budget(generator, [interactive, *helpers], budget_used)
+            if helpers:
+                search.attach_helpers(helpers)
             if self.info == {}:
                 self.info.update(generator.info)
                 self.info.update(search.info)
                 
             state = interactive.get_state(0)
             search.insert(Node(0, 0, "", state)) # type: ignore
-            search.search_proof(generator, interactive)
+            self._warm_start(search, decl, previous)
+            self._set_deadline(search.budget, generator, [interactive, *helpers])
+            try:
+                search.search_proof(generator, interactive)
+            except Exception as e:
+                if not self._deadline_exceeded(search, e):
+                    raise
+            finally:
+                self._set_deadline(None, generator, [interactive, *helpers])
+                if search.budget is not None:
+                    search.budget.stop()
+                if helpers:
+                    search.detach_helpers()
+            for process in [interactive, *helpers]:
+                # helper只用于执行tactic, 放弃后退出tactic模式以便进入下一题; 主进程超时中断时同样处理
+                if process.is_alive() and process.tactic_mode:
+                    process.commit(process.give_up(0))
             results.append((decl, search, copy.copy(generator)))
+            if not all(process.is_alive() for process in [interactive, *helpers]):
+                # 超时的进程已被结束, 同一文件中剩下的题目无法继续
+                break
         
         test_file.unlink()
         return results
+
+    async def _process_with_async(self, source: str, generator: TacticGenerator, interactive: AsyncInteractive, previous: list = None, cancel: Callable[[], bool] = None, budget_used: dict = None) -> list[tuple[str, BestFirstSearch, list]]:
+        test_file = self.root / f"TestOne_{platform.node()}_{os.getpid()}_{threading.get_ident()}.lean"
+        with test_file.open("w") as fp:
+            fp.write(source)
+        await interactive.open_file(test_file, [None])
+
+        results = []
+        while True:
+            generator.reset_calls(source)
+            decl = await interactive.get_next_problem()
+            if decl is None:
+                break
+            search = self._build_search(source)
+            search.cancel = cancel
+            search.budget = self._build_budget(generator, [interactive], budget_used)
+            if self.info == {}:
+                self.info.update(generator.info)
+                self.info.update(search.info)
+
+            state = await interactive.get_state(0)
+            search.insert(Node(0, 0, "", state)) # type: ignore
+            self._warm_start(search, decl, previous)
+            self._set_deadline(search.budget, generator, [interactive])
+            try:
+                await search.search_proof_async(generator, interactive)  # type: ignore
+            except Exception as e:
+                if not self._deadline_exceeded(search, e):
+                    raise
+            finally:
+                self._set_deadline(None, generator, [interactive])
+                if search.budget is not None:
+                    search.budget.stop()
+            results.append((decl, search, copy.copy(generator)))
+            if not interactive.is_alive():
+                break
+
+        test_file.unlink()
+        return results
     
     @staticmethod
     def collect_info(decl: str, search, generator) -> dict:
@@ -126,7 +294,8 @@ class BaseService(object):
         """
         nodes = [{
             "id": node.sid,
-            "parent": node.parent_sid,
+            # 延迟物化的节点在扩展时才得到真实sid, 以父节点当前的sid为准
+            "parent": node.parent.sid if node.parent is not None else node.parent_sid,
             "depth": node.depth,
             "tactic": node.tactic,
             "state": [goal.pretty for goal in node.state],
@@ -135,11 +304,16 @@ class BaseService(object):
             "declaration": decl,
             "success": search.found,
             "calls": generator.calls,
+            # 自适应采样相对固定num_samples节省的采样数
+            "samples_saved": sum(call[4] for call in generator.calls),
+            "tokens": generator.tokens,
             "nodes": nodes,
             "stop_cause": {
-                "nodes": len(search.nodes) >= search.max_nodes,
+                "nodes": len(search.nodes) - getattr(search, "inherited_nodes", 0) >= search.max_nodes,
                 "depth": search.depth >= search.max_depth,
-                "calls": not generator.has_quota()
+                "calls": not generator.has_quota(),
+                "cancelled": search.cancelled,
+                **{cause: search.budget is not None and search.budget.cause == cause for cause in SearchBudget.CAUSES}
             }
         }
 
@@ -169,6 +343,23 @@ class BaseService(object):
         ret = self.parse_result(formal_statement, results)
         return ret
 
+    def _init_interactive_pool(self):
+        if self.interactive_pool is None:
+            factory = Interactive
+            if self.use_async_interactive:
+                # 所有AsyncInteractive都运行在同一个常驻事件循环上, 可被任意线程使用
+                self.loop_thread = LoopThread("async-interactive")
+                factory = lambda root, path: self.loop_thread.run(AsyncInteractive.create(root, path))  # type: ignore
+            self.interactive_pool = InteractivePool(
+                root=self.root,
+                size=self.interactive_pool_size,
+                lean_env=self.lean_env,
+                factory=factory)
+
+    def _init_transposition_table(self):
+        if self.use_transposition_table and self.transposition_table is None:
+            self.transposition_table = TranspositionTable(path=self.transposition_path)
+
     def _init_single_generator(self, gpu_id=0):
         if self.single_generator is None:
             self.single_generator = TacticGenerator(
@@ -176,4 +367,7 @@ class BaseService(object):
                 gpu_id=gpu_id, 
                 local_model_path=self.local_model_path,
                 sampling_params=self.sampling_params,
-                max_calls=self.max_calls)
\ No newline at end of file
+                max_calls=self.max_calls,
+                engine_args=self.engine_args,
+                adaptive_sampling=self.adaptive_sampling,
+                backend=self.backend)
\ No newline at end of file
@@ -1,39 +1,30 @@
 import os
 from pathlib import Path
 import multiprocessing as mp
+from multiprocessing.managers import SyncManager
+import queue
 import traceback
-from manager.thirdparty import TacticGenerator
+import threading
+import time
+from typing import Callable
+from manager.thirdparty import TacticGenerator, GenerationBatcher, BatchedTacticGenerator, EngineServer, EngineClient
 from manager.service import BaseService
+from manager.manage import RunManifest, RunStats, ProofParseManage, ResultStore
 from util import CommonUtil, profiler
 import conf.config
+from manager.search import SearchBudget
 from manager.search.exception import SearchError, error_logging
 import logging
 from manager.thirdparty.verifier import verify_proof
-import json
-
-def search_check(path, max_retries):
-    cnt = 0
-    for root, dir, files in os.walk(path):
-        for file in files:
-            connect_error = False
-            if '.json' in file and os.path.samefile(path,root):
-                file_path = os.path.join(root, file)
-                with open(file_path,'r') as f:
-                    try:
-                        file_json = json.load(f)
-                        for res in file_json["collect_results"]:
-                            if res['success']:
-                                return True
-                            if len(res['calls'])==0:
-                                connect_error=True
-                    except:
-                        return False
-                if not connect_error:
-                    cnt += 1
-    if cnt == max_retries:
-        return True
-    else:
-        return False
+
+class TaskManager(SyncManager):
+    """
+    额外注册跨进程共享的优先队列
+    """
+
+
+TaskManager.register("PriorityQueue", queue.PriorityQueue)
+
 
 class BatchMainService(BaseService):
     """
@@ -65,7 +56,23 @@ class BatchMainService(BaseService):
                 abandon_if_contain: list[str] = conf.config.ABANDON_IF_CONTAIN,
                 is_incontext: bool = conf.config.IS_INCONTEXT,
                 template: str = 'deepseek',
-                use_retrieval: bool = conf.config.USE_RETRIEVAL
+                use_retrieval: bool = conf.config.USE_RETRIEVAL,
+                use_async_interactive: bool = conf.config.USE_ASYNC_INTERACTIVE,
+                expansion_batch_size: int = conf.config.EXPANSION_BATCH_SIZE,
+                concurrent_searches: int = conf.config.CONCURRENT_SEARCHES,
+                use_transposition_table: bool = conf.config.USE_TRANSPOSITION_TABLE,
+                transposition_shared: bool = conf.config.TRANSPOSITION_SHARED,
+                transposition_path: str = conf.config.TRANSPOSITION_PATH,
+                warm_start_retries: bool = conf.config.WARM_START_RETRIES,
+                warm_start_max_frontier: int = conf.config.WARM_START_MAX_FRONTIER,
+                engine_args: dict = conf.config.VLLM_ENGINE_ARGS,
+                adaptive_sampling: dict = conf.config.ADAPTIVE_SAMPLING,
+                backend: dict = conf.config.GENERATION_BACKEND,
+                lean_workers: int = conf.config.LEAN_WORKERS,
+                result_format: str = conf.config.RESULT_FORMAT,
+                task_priority: str = conf.config.TASK_PRIORITY,
+                search_budget: dict = conf.config.SEARCH_BUDGET,
+                search_workers: int = conf.config.SEARCH_WORKERS
                 ):
         """
 
@@ -91,14 +98,34 @@ class BatchMainService(BaseService):
                         abandon_if_contain = abandon_if_contain,
                         is_incontext = is_incontext,
                         template=template,
-                        use_retrieval=use_retrieval)
+                        use_retrieval=use_retrieval,
+                        use_async_interactive=use_async_interactive,
+                        expansion_batch_size=expansion_batch_size,
+                        use_transposition_table=use_transposition_table,
+                        transposition_shared=transposition_shared,
+                        transposition_path=transposition_path,
+                        warm_start_retries=warm_start_retries,
+                        warm_start_max_frontier=warm_start_max_frontier,
+                        engine_args=engine_args,
+                        adaptive_sampling=adaptive_sampling,
+                        backend=backend,
+                        lean_workers=lean_workers,
+                        search_budget=search_budget,
+                        interactive_pool_size=max(conf.config.INTERACTIVE_POOL_SIZE, concurrent_searches * max(lean_workers, 1)))
         self.source_file = source_file
         self.result_dir = result_dir
         self.max_retries = max_retries
+        self.concurrent_searches = max(concurrent_searches, 1)  # 每个GPU进程内并发的搜索数
         if not os.path.exists(self.result_dir+'/generated'):
             os.makedirs(self.result_dir+'/generated')
         if not os.path.exists(self.result_dir+'/error'):
             os.makedirs(self.result_dir+'/error')
+        self.manifest = RunManifest(self.result_dir)  # 每次尝试的记录, 用于跳过已完成的题目和续跑
+        self.result_format = result_format
+        self.task_priority = task_priority
+        # 每个GPU的搜索进程数; 大于1时该GPU由一个EngineServer进程独占, 搜索进程通过EngineClient提交生成请求
+        self.search_workers = max(search_workers, 1) if backend.get('type', 'vllm') == 'vllm' else 1
+        self.result_store = ResultStore(self.result_dir) if result_format == 'compact' else None
         logging.basicConfig(
             filename=f"{self.result_dir}/error.log",  # File where logs will be saved
             level=logging.ERROR,       # Log level
@@ -109,9 +136,13 @@ class BatchMainService(BaseService):
             gpus_list = [0]
         self.gpus_list = gpus_list
 
-        self.manager = mp.Manager()
+        self.manager = TaskManager()
+        self.manager.start()
         self.generator = self.manager.dict()
-        self.queue = mp.Queue()
+        self.queue = self.manager.PriorityQueue()  # 每次尝试一个任务, 见 _int_queue
+        self.attempt_end = {}  # 热启动时 题目下标 -> 最后一次尝试编号+1, 见 _int_queue
+        self.solved = self.manager.dict()  # 已证明的题目id, 用于取消同一题目的其他尝试
+        self.stats_queue = mp.Queue()  # 每次尝试的清单记录, 由主进程的RunStats线程汇总
 
         self.source_list = []
         
@@ -132,63 +163,199 @@ class BatchMainService(BaseService):
                 gpu_id=i, 
                 local_model_path=self.local_model_path,
                 sampling_params=self.sampling_params,
-                max_calls=self.max_calls)
+                max_calls=self.max_calls,
+                engine_args=self.engine_args,
+                adaptive_sampling=self.adaptive_sampling,
+                backend=self.backend)
 
     def _int_queue(self):
+        """
+        每次尝试是一个独立的任务 (优先级, 序号, 题目在source_list中的下标, 尝试编号), 放入共享的优先队列,
+        任何空闲的worker都可以取走任意题目的剩余尝试, 运行末尾不会只剩一个GPU在跑少数难题的全部重试.
+        task_priority='attempt' 时先跑完所有题目的第k次尝试再跑第k+1次; 'problem' 时按题目顺序.
+        续跑时接着已有的尝试编号, 只补足剩余的重试次数.
+        warm_start_retries 时第k+1次尝试要用到第k次的搜索结果, 每道题目只放入第一次尝试,
+        由取到它的worker在本次尝试结束后接着执行下一次, 同一题目的尝试不会在不同worker上并行.
+        """
+        seq = 0
         for item in self.source_list:
-            self.queue.put(item)
-        for _ in self.gpus_list:
-            self.queue.put(None)
+            if self.manifest.should_skip(item['id'], self.max_retries) or self._budget_exhausted(item['id']):
+                continue
+            start_idx = self.manifest.next_attempt(item['id'])
+            remaining = self.manifest.remaining_retries(item['id'], self.max_retries)
+            if self.warm_start_retries:
+                if remaining > 0:
+                    self.attempt_end[item['source_index']] = start_idx + remaining
+                    self.queue.put((0, seq, item['source_index'], start_idx))
+                    seq += 1
+                continue
+            for k in range(remaining):
+                priority = k if self.task_priority == 'attempt' else item['source_index']
+                self.queue.put((priority, seq, item['source_index'], start_idx + k))
+                seq += 1
+        for _ in range(len(self.gpus_list) * self.search_workers * self.concurrent_searches):
+            self.queue.put((float('inf'), seq, None, -1))
+            seq += 1
 
-    def _process_run(self, gpu_id: int):
+    def _process_run(self, gpu_id: int, engine: EngineClient = None):
         os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
         this_generator = self.generator[gpu_id]
+        if engine is not None:
+            # 模型由该GPU的EngineServer加载, 本进程只做搜索和Lean执行
+            this_generator.backend = engine
+        self._init_interactive_pool()
+        self.interactive_pool.warm_up()  # type: ignore
+        if self.concurrent_searches <= 1:
+            self._consume(this_generator)
+        else:
+            # 多个搜索线程并发处理不同题目, 生成请求由batcher合并为共享的vLLM批次
+            batcher = GenerationBatcher(this_generator)
+            threads = []
+            for _ in range(self.concurrent_searches):
+                thread = threading.Thread(target=self._consume_batched, args=(this_generator, batcher))
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+            print(f"gpu_{gpu_id} generation batches = {len(batcher.batch_sizes)}, "
+                  f"avg_prompts = {sum(batcher.batch_sizes) / max(len(batcher.batch_sizes), 1):.2f}")
+        print(self.info)
+
+    def _engine_run(self, gpu_id: int, requests, responses: list):
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
+        EngineServer(self.generator[gpu_id], requests, responses).run()
+
+    def _consume_batched(self, generator: TacticGenerator, batcher: GenerationBatcher):
+        search_generator = BatchedTacticGenerator.from_generator(generator, batcher)
+        batcher.register()
+        try:
+            self._consume(search_generator)
+        finally:
+            batcher.unregister()
+
+    def _consume(self, generator: TacticGenerator):
+        last = None  # (题目id, 结果): 本worker上一次完成的尝试, 下一个任务是同一题目时用于热启动
+        pending = None  # 热启动时本worker接着执行的同一题目的下一次尝试
         while True:
-            item = self.queue.get()
-            if item is None:  # 检测结束信号
-                break
+            if pending is not None:
+                source_index, idx = pending
+                pending = None
+            else:
+                _, _, source_index, idx = self.queue.get()
+                if source_index is None:  # 检测结束信号
+                    break
+            item = self.source_list[source_index]
+            if self.solved.get(item['id'], False):
+                # 其他尝试已证明该题目, 尚未开始的尝试直接丢弃
+                continue
+            if self._budget_exhausted(item['id']):
+                # 之前的尝试已用完该题目的预算, 剩余的尝试不再执行
+                print(f"budget_exhausted_index_{item['id']}", flush=True)
+                continue
             item_path = os.path.join(self.result_dir,'generated',f"{item['id']}")
-            if not os.path.exists(item_path):
+            if self.result_store is None and not os.path.exists(item_path):
                 os.makedirs(item_path)
-            if search_check(item_path, self.max_retries):
-                continue
-            for idx in range(self.max_retries):
-                try:
-                    print(f"processing {item['id']}")
-                    profiler.start(f"run_index_{item['id']}")
-                    results = self.process_one(source=item["formal_statement"], generator=this_generator)
-                    profiler.stop(f"run_index_{item['id']}")
-                except SearchError as e:
-                    error_log_path = f"{self.result_dir+'/error'}/{item['id']}.json"
-                    error_logging(error_log_path, item["id"], item["formal_statement"], e.error_data)
-                    # CommonUtil.write_to_json_file(error_log_path, e.error_data)
-                    logging.error([e.error_type,item['id'], "Searching Error"] ,exc_info=True)
-                except Exception as e:
-                    print(traceback.format_exc())
-                    print(f"Error occurred: {e}")
-                    print(f"run_error_index = {item['id']}")
-                    logging.error([e,item['id'], "Non-Searching Error"] ,exc_info=True)
+            previous = last[1] if last is not None and last[0] == item['id'] else None
+            start_time = time.time()
+            try:
+                print(f"processing {item['id']}")
+                profiler.start(f"run_index_{item['id']}")
+                results = self.process_one(source=item["formal_statement"], generator=generator, previous=previous,
+                                           cancel=self._cancel_check(item['id']),
+                                           budget_used=self.manifest.usage(item['id']) if self.search_budget else None)
+                profiler.stop(f"run_index_{item['id']}")
+            except SearchError as e:
+                error_log_path = f"{self.result_dir+'/error'}/{item['id']}.json"
+                error_logging(error_log_path, item["id"], item["formal_statement"], e.error_data)
+                # CommonUtil.write_to_json_file(error_log_path, e.error_data)
+                logging.error([e.error_type,item['id'], "Searching Error"] ,exc_info=True)
+                self.stats_queue.put(self.manifest.record(item['id'], idx, "search_error",
+                                                          seconds=time.time() - start_time))
+            except Exception as e:
+                print(traceback.format_exc())
+                print(f"Error occurred: {e}")
+                print(f"run_error_index = {item['id']}")
+                logging.error([e,item['id'], "Non-Searching Error"] ,exc_info=True)
+                self.stats_queue.put(self.manifest.record(item['id'], idx, "error",
+                                                          seconds=time.time() - start_time))
+            else:
+                if self.warm_start_retries:
+                    last = (item['id'], results)
+                if any(search.cancelled and not search.found for _, search, _ in results):
+                    # 被取消的尝试不保存结果, 也不计入重试次数
+                    self.stats_queue.put(self.manifest.record(
+                        item['id'], idx, "cancelled",
+                        calls=sum(len(gen.calls) for _, _, gen in results),
+                        nodes=sum(len(search.nodes) for _, search, _ in results),
+                        seconds=time.time() - start_time, **self._usage(results)))
+                    print(f"cancel_index_{item['id']}", flush=True)
+                    continue
+                save_data = self.parse_result(item["formal_statement"], results)
+                if 'formal_proof' in save_data:
+                    try:
+                        print(f"lake repl check:{item['id']}",flush=True)
+                        repl_res = verify_proof(save_data['formal_proof'],os.path.join(conf.config.LEAN_ENV_PATH,'lake'),conf.config.LEAN_TEST_PATH)
+                    except Exception as e:
+                        print(traceback.format_exc())
+                        save_data['collect_results'][0]['success'] = False
+                    else:
+                        save_data['collect_results'][0]['success'] = repl_res
+                if self.result_store is not None:
+                    self.result_store.write(item['id'], idx, save_data)
                 else:
-                    save_data = self.parse_result(item["formal_statement"], results)
-                    if 'formal_proof' in save_data:
-                        try:
-                            print(f"lake repl check:{item['id']}",flush=True)
-                            repl_res = verify_proof(save_data['formal_proof'],os.path.join(conf.config.LEAN_ENV_PATH,'lake'),conf.config.LEAN_TEST_PATH)
-                        except Exception as e:
-                            print(traceback.format_exc())
-                            save_data['collect_results'][0]['success'] = False
-                        else:
-                            save_data['collect_results'][0]['success'] = repl_res
                     result_file = os.path.join(item_path,f"{item['id']}_{idx}.json")
                     CommonUtil.write_to_json_file(result_file, save_data)
-                    print(f"finish_index_{item['id']}",flush=True)
-                    if save_data['collect_results'] and save_data['collect_results'][0]['success']:
-                        break
-                    else:
-                        continue
+                success = bool(save_data['collect_results'] and save_data['collect_results'][0]['success'])
+                proof_length = None
+                if success:
+                    # 通知正在运行的同题目尝试停止
+                    self.solved[item['id']] = True
+                    _, path = ProofParseManage.get_proof_tree(save_data['collect_results'][0])
+                    proof_length = len(path) - 1
+                self.stats_queue.put(self.manifest.record(
+                    item['id'], idx, "ok", success=success,
+                    calls=sum(len(res['calls']) for res in save_data['collect_results']),
+                    nodes=sum(len(res['nodes']) for res in save_data['collect_results']),
+                    seconds=time.time() - start_time, proof_length=proof_length, **self._usage(results)))
+                print(f"finish_index_{item['id']}",flush=True)
+            if self.warm_start_retries and idx + 1 < self.attempt_end[source_index]:
+                pending = (source_index, idx + 1)
             self.info.update(self.get_info())
-        print(self.info)
+
+    def _budget_exhausted(self, problem_id) -> bool:
+        """
+        该题目之前各次尝试(包括其他进程中的)的用量合计是否已达到search_budget
+        """
+        if not self.search_budget:
+            return False
+        self.manifest.refresh()
+        return SearchBudget(**self.search_budget, used=self.manifest.usage(problem_id)).exhausted()
+
+    @staticmethod
+    def _usage(results: list) -> dict:
+        """
+        本次尝试生成的token数和Lean CPU时间, 记入清单供后续尝试累计预算
+        """
+        return dict(tokens=sum(gen.tokens for _, _, gen in results),
+                    lean_seconds=sum(search.budget.spent()["lean_seconds"]
+                                     for _, search, _ in results if search.budget is not None))
+
+    def _cancel_check(self, problem_id) -> Callable[[], bool]:
+        """
+        返回供搜索调用的取消检查, 每CANCEL_CHECK_INTERVAL秒最多查询一次跨进程共享的solved字典
+        """
+        last_check = time.monotonic()
+
+        def cancel() -> bool:
+            nonlocal last_check
+            now = time.monotonic()
+            if now - last_check < conf.config.CANCEL_CHECK_INTERVAL:
+                return False
+            last_check = now
+            return self.solved.get(problem_id, False)
+        return cancel
     
+
     def batch_run(self):
         """
 
@@ -197,19 +364,45 @@ class BatchMainService(BaseService):
         self._init_source_list()
         self._int_generator()
         self._int_queue()
+        # 增量统计: 随结果写出更新 summary.json, 运行中途即可查看进度
+        run_stats = RunStats(self.result_dir, total_problems=len(self.source_list))
+        stats_thread = threading.Thread(target=run_stats.consume, args=(self.stats_queue,), daemon=True)
+        stats_thread.start()
+        engine_list = []
         for i in self.gpus_list:
-            # 创建trans进程
-            process = mp.Process(target=self._process_run, args=(i,))
-            process.start()
-            process_list.append(process)
+            if self.search_workers <= 1:
+                # 创建trans进程
+                process = mp.Process(target=self._process_run, args=(i,))
+                process.start()
+                process_list.append(process)
+                continue
+            requests = mp.Queue()
+            responses = [mp.Queue() for _ in range(self.search_workers)]
+            engine = mp.Process(target=self._engine_run, args=(i, requests, responses))
+            engine.start()
+            engine_list.append((engine, requests))
+            for k in range(self.search_workers):
+                process = mp.Process(target=self._process_run, args=(i, EngineClient(requests, responses[k], k)))
+                process.start()
+                process_list.append(process)
 
         for j in range(len(process_list)):
             process_list[j].join()
+        for engine, requests in engine_list:
+            requests.put(None)
+            engine.join()
+        self.stats_queue.put(None)
+        stats_thread.join()
         print("All data processed.")
     
     def get_info(self):
         return dict(
             max_retries=self.max_retries,
             source_file=self.source_file,
-            result_dir=self.result_dir
+            result_dir=self.result_dir,
+            concurrent_searches=self.concurrent_searches,
+            warm_start_retries=self.warm_start_retries,
+            result_format=self.result_format,
+            task_priority=self.task_priority,
+            search_workers=self.search_workers
         )
\ No newline at end of file
@@ -12,43 +12,72 @@ import conf.config
 from manager.thirdparty.verifier import verify_proof
 
 
+def claim_ready(ready_dir: str) -> list[str]:
+    """
+    领取Herald放在 ready/ 目录中的完成标记: rename到 ready/claimed/ 下,
+    rename是原子的, 多个prover同时运行时每个标记只会被其中一个领取
+    """
+    keys = []
+    for entry in os.scandir(ready_dir):
+        # 跳过 claimed/ 目录和Herald尚未rename的临时文件
+        if not entry.is_file() or entry.name.startswith('.'):
+            continue
+        try:
+            os.rename(entry.path, os.path.join(ready_dir, 'claimed', entry.name))
+        except FileNotFoundError:
+            # 已被其他prover领取
+            continue
+        keys.append(entry.name)
+    return keys
+
+
 def data_producer(queue, counter, total_count, result_dir, file_prefix, re_run, num_workers=2):
     """
-    轮训检测Herald生成的back_trans的数据，并添加到队列中
+    监听Herald反翻译完成后在 ready/ 目录放置的标记, 领取后立即加入队列; 每次只列出待处理的少量标记.
+    启动时全量扫描一次, 补上没有标记的数据(旧版本Herald的结果, 或prover重启前已领取但未完成的数据)
     """
+    ready_dir = f"{result_dir}/{conf.config.READY_DIR}"
+    os.makedirs(f"{ready_dir}/claimed", exist_ok=True)
     exist_keys = set()
 
-    while True:
-        print("run_data_producer")
-        for index in range(total_count):
-            unique_key = f"{file_prefix}{index}"
-            tran_path = f"{result_dir}/{unique_key}/back_trans.json"
-            prove_path = f"{result_dir}/{unique_key}/prove_info.json"
-            if CommonUtil.file_exist(tran_path):
-                if CommonUtil.file_exist(prove_path) and not re_run:
-                    # 结果文件已经存在 & 不需要重新跑时
-                    exist_keys.add(unique_key)
-                else:
-                    if unique_key not in exist_keys:
-                        json_data = CommonUtil.load_json(tran_path)
-                        json_data['prove_path'] = prove_path
-
-                        exist_keys.add(unique_key)
-                        queue.put(json_data)
-                        counter.value += 1
-
-        print(f"exist_keys_size = {len(exist_keys)}")
-        print(f"queue_size: {counter.value}")
-        if len(exist_keys) >= total_count:
-            print(f"producer_finished_count = {len(exist_keys)}")
-            for _i in range(num_workers):
-                # 完成时发送空消息给消费者
-                queue.put(None)
-            break
-
-        sys.stdout.flush()  # 保证该线程内的日志正常输出
-        # m每20s循环检测一次
-        time.sleep(20)
+    def add(unique_key):
+        if unique_key in exist_keys:
+            return
+        tran_path = f"{result_dir}/{unique_key}/back_trans.json"
+        prove_path = f"{result_dir}/{unique_key}/prove_info.json"
+        if not CommonUtil.file_exist(tran_path):
+            return
+        if CommonUtil.file_exist(prove_path) and not re_run:
+            # 结果文件已经存在 & 不需要重新跑时
+            exist_keys.add(unique_key)
+            return
+        try:
+            json_data = CommonUtil.load_json(tran_path)
+        except ValueError:
+            # 扫描时Herald可能正在写该文件, 写完后会收到它的标记
+            return
+        json_data['prove_path'] = prove_path
+
+        exist_keys.add(unique_key)
+        queue.put(json_data)
+        counter.value += 1
+
+    for unique_key in claim_ready(ready_dir):
+        add(unique_key)
+    for index in range(total_count):
+        add(f"{file_prefix}{index}")
+    print(f"backfill exist_keys_size = {len(exist_keys)}, queue_size: {counter.value}", flush=True)
+
+    while len(exist_keys) < total_count:
+        for unique_key in claim_ready(ready_dir):
+            add(unique_key)
+        time.sleep(conf.config.READY_POLL_INTERVAL)
+
+    print(f"producer_finished_count = {len(exist_keys)}")
+    for _i in range(num_workers):
+        # 完成时发送空消息给消费者
+        queue.put(None)
+    sys.stdout.flush()  # 保证该线程内的日志正常输出
 
 
 class PipelineMainService(BaseService):
@@ -57,7 +86,7 @@ class PipelineMainService(BaseService):
     单独处理原因: 特定的结构体, informal_statement, translate_list, back_trans_list
 
     整体思路:
-        定时器轮训检测Herald生成的每个文件的 "back_trans.json" 文件, 如何存在则添加到待队列中，全部添加完成后停止掉定时器
+        监听Herald写完 "back_trans.json" 后放在 ready/ 目录中的标记, 领取后添加到待队列中，全部添加完成后停止
         多进程从队列中获取待执行任务, 每条数据执行完成后保存结果文件到 "prove_info.json" 中
     """
 
@@ -137,6 +166,8 @@ class PipelineMainService(BaseService):
     def _process_run(self, gpu_id: int):
         os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
         this_generator = self.generator[gpu_id]
+        self._init_interactive_pool()
+        self.interactive_pool.warm_up()  # type: ignore
         while True:
             item = self.queue.get()
             if item is None:  # 检测结束信号
@@ -174,6 +205,10 @@ class PipelineMainService(BaseService):
             item['prove_detail_dict'] = prove_detail_dict
             item['result_list'] = result_list
             CommonUtil.write_to_json_file(item['prove_path'], item)
+            # 该条数据处理完成, 删除领取的标记; 未完成时重启后由全量扫描重新加入
+            claimed_path = f"{self.result_dir}/{conf.config.READY_DIR}/claimed/{item['unique_key']}"
+            if os.path.exists(claimed_path):
+                os.remove(claimed_path)
 
             # profiler.stop(f"run_time_{item['unique_key']}")
             print(f"run_time_finished_{item['unique_key']}")
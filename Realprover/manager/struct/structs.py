@@ -1,4 +1,5 @@
 import dataclasses
+import hashlib
 import types
 import typing
 from functools import cached_property
@@ -114,6 +115,18 @@ class Goal:
     def as_signature(self) -> str:
         return " ".join(v.as_param for v in self.context if v.value is None) + " : " + self.type
 
+    @cached_property
+    def dedup_pretty(self) -> str:
+        """Canonical form used for deduplication: prop hypotheses sorted and deduplicated by type."""
+        prop = [v for v in self.context if v.is_prop]
+        prop.sort(key=attrgetter("type"))
+        dedup_prop = []
+        for p in prop:
+            if not dedup_prop or dedup_prop[-1].type != p.type:
+                dedup_prop.append(p)
+        non_prop = [v for v in self.context if not v.is_prop]
+        return "\n".join(v.pretty for v in dedup_prop + non_prop) + "\n⊢ " + self.type
+
 def state_repr(state: Goal | list[Goal]) -> str:
     if not state:
         return "no goals"
@@ -130,20 +143,31 @@ def state_repr(state: Goal | list[Goal]) -> str:
 
 
 def state_repr_dedup(state: list[Goal]) -> str:
-    k = []
-    for goal in state:
-        prop = [v for v in goal.context if v.is_prop]
-        prop.sort(key=attrgetter("type"))
-        dedup_prop = []
-        for p in prop:
-            if not dedup_prop or dedup_prop[-1].type != p.type:
-                dedup_prop.append(p)
-        non_prop = [v for v in goal.context if not v.is_prop]
-        k.append("\n".join(v.pretty for v in dedup_prop + non_prop) + "\n⊢ " + goal.type)
-    k = "\n\n".join(k)
-    # print(k)
-    # import ipdb;ipdb.set_trace()
-    return k
+    return "\n\n".join(goal.dedup_pretty for goal in state)
+
+
+def state_fingerprint(state: list[Goal]) -> int:
+    """128-bit hash of `state_repr_dedup(state)`, computed without building the joined string.
+
+    Used as the key of search dicts and heaps in place of the full string.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for i, goal in enumerate(state):
+        if i:
+            h.update(b"\n\n")
+        h.update(goal.dedup_pretty.encode("utf-8"))
+    return int.from_bytes(h.digest(), "big")
+
+
+def state_exact_fingerprint(state: list[Goal]) -> int:
+    """128-bit hash of `state_repr(state)`, keeping hypothesis names and duplicate hypotheses.
+
+    Used where the state has to be identified exactly, e.g. the transposition table:
+    a tactic like `exact h2` depends on names that `state_fingerprint` drops.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(state_repr(state).encode("utf-8"))
+    return int.from_bytes(h.digest(), "big")
 
 @dataclass
 class ProofVariable:
@@ -201,6 +225,30 @@ class Node:
     depth: int = 0
     score: float = 0
     parent: Optional["Node"] = None
+
+    def __post_init__(self):
+        # 末尾连续包含have的tactic数, 创建节点时由父节点增量得到, 不必回溯整条路径
+        if 'have' in self.tactic:
+            self.have_streak = (self.parent.have_streak if self.parent else 0) + 1
+        else:
+            self.have_streak = 0
+
+    @cached_property
+    def fingerprint(self) -> int:
+        return state_fingerprint(self.state)
+
+    @cached_property
+    def exact_fingerprint(self) -> int:
+        return state_exact_fingerprint(self.state)
+
+    @property
+    def proof_prefix(self) -> str:
+        """Tactics from the root to this node joined by newlines.
+
+        Nodes keep only the parent pointer and their own tactic; the text is
+        joined on demand in O(depth), so nothing per-path is stored.
+        """
+        return "\n".join(node.tactic for node in self.current_path)
     
     @property
     def current_path(self):
@@ -1,6 +1,11 @@
 
 from .interactive import Interactive
+from .interactive_pool import InteractivePool
+from .async_interactive import AsyncInteractive
 from .lean_search import LeanSearch
 from .claude import Claude
+from .backend import GenerationBackend, VllmBackend, OpenAIBackend
 from .generator import TacticGenerator
+from .batch_generator import GenerationBatcher, BatchedTacticGenerator
+from .engine_server import EngineServer, EngineClient
 from .critic import Critic
@@ -0,0 +1,199 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+from pathlib import Path
+
+from manager.struct.structs import from_json, Goal, ProofGoal
+from manager.thirdparty.interactive import get_project_toolchain, build_interactive
+
+logger = logging.getLogger(__name__)
+
+# 单行state可能很大, asyncio默认的64KB行长度限制不够用
+STREAM_LIMIT = 2 ** 26
+# 其他线程调用close时等待进程回收的最长时间(秒)
+CLOSE_TIMEOUT = 10
+
+
+class AsyncInteractive:
+    """
+    基于asyncio子进程的Interactive, 方法与Interactive一致但均为协程.
+    所有请求都可以同时在途, 由后台的读协程按id把响应分发给对应的请求,
+    因此搜索可以在等待Lean的同时进行其他工作(例如生成下一个节点的tactic).
+    """
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self.id = 0
+        self.tactic_mode = False
+        self.files_opened = 0
+        # 扩展用的请求读取响应的截止时间(time.monotonic), 与Interactive.deadline相同
+        self.deadline: float | None = None
+        self.pending: dict[int, asyncio.Future] = {}
+        self.problems: asyncio.Queue = asyncio.Queue()
+        self.loop = asyncio.get_running_loop()
+        self.reader = self.loop.create_task(self._read_loop())
+        self.closing = None
+
+    @classmethod
+    async def create(cls, root: Path, path: Path) -> "AsyncInteractive":
+        toolchain = get_project_toolchain(root)
+        interactive_bin = build_interactive(toolchain)
+        proc = await asyncio.create_subprocess_exec(
+            "lake", "env", str(interactive_bin), "-i", str(path),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=root,
+            limit=STREAM_LIMIT,
+        )
+        return cls(proc)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.proc.stdout.readline()  # type: ignore
+                if not line:
+                    break
+                logger.debug("<-" + repr(line))
+                response = json.loads(line)
+                rid = response.get("id")
+                if rid not in self.pending and "declName" not in response and self.pending:
+                    # 响应中没有id时, 按发送顺序匹配
+                    rid = min(self.pending)
+                future = self.pending.pop(rid, None)
+                if future is None:
+                    self.problems.put_nowait(response)
+                elif not future.done():
+                    future.set_result(response)
+        finally:
+            # 进程退出或读协程被取消时, 在途的请求不会再有响应
+            error = RuntimeError("interactive process exited")
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+            self.problems.put_nowait(None)
+
+    def is_alive(self) -> bool:
+        return self.proc.returncode is None and not self.reader.done()
+
+    async def aclose(self):
+        if self.proc.returncode is None:
+            try:
+                self.proc.kill()
+            except ProcessLookupError:
+                pass
+        # 等待子进程回收, 避免留下僵尸进程
+        await self.proc.wait()
+        self.reader.cancel()
+        await asyncio.gather(self.reader, return_exceptions=True)
+
+    def close(self):
+        """
+        可在任意线程调用. 子进程与读协程属于创建时的事件循环, 关闭也在该循环上进行:
+        在循环线程中调用时只安排关闭, 在其他线程中调用时等待关闭完成
+        """
+        if self.loop.is_closed() or not self.loop.is_running():
+            # 循环已停止(例如解释器退出时), 只能直接结束进程
+            if self.proc.returncode is None:
+                try:
+                    self.proc.kill()
+                except ProcessLookupError:
+                    pass
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            if self.closing is None:
+                self.closing = self.loop.create_task(self.aclose())
+            return
+        future = asyncio.run_coroutine_threadsafe(self.aclose(), self.loop)
+        try:
+            future.result(CLOSE_TIMEOUT)
+        except Exception:
+            logger.warning("Timed out closing interactive process %s", self.proc.pid)
+
+    def write(self, data: dict):
+        data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        logger.debug("->" + data)
+        self.proc.stdin.write((data + "\n").encode("utf-8"))  # type: ignore
+
+    async def open_file(self, path: Path, selectors: list[str | int | None]):
+        assert not self.tactic_mode
+        self.files_opened += 1
+        self.write({"filename": str(path), "selectors": selectors})
+        await self.proc.stdin.drain()  # type: ignore
+
+    async def get_next_problem(self) -> str | None:
+        assert not self.tactic_mode
+        response = await self.problems.get()
+        if response is None:
+            raise RuntimeError("interactive process exited")
+        decl_name = response.get("declName")
+        self.tactic_mode = decl_name is not None
+        return decl_name
+
+    async def request(self, method: str, params: dict, deadline: float | None = None):
+        assert self.tactic_mode
+        self.id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.id] = future
+        self.write({'id': self.id, 'method': method, 'params': params})
+        await self.proc.stdin.drain()  # type: ignore
+        if deadline is None:
+            response = await future
+        else:
+            try:
+                response = await asyncio.wait_for(future, max(deadline - time.monotonic(), 0))
+            except TimeoutError:
+                # 与Interactive相同: 超时后进程不能再使用, 读协程随之结束并让其他在途请求失败
+                if self.proc.returncode is None:
+                    self.proc.kill()
+                raise
+        try:
+            return response['result']
+        except KeyError:
+            raise RuntimeError(response['error'])
+
+    async def request_batch(self, calls: list[tuple[str, dict]], deadline: float | None = None) -> list:
+        """
+        同时发送一批请求; 失败的请求以RuntimeError对象的形式返回, 与Interactive.request_batch一致
+        """
+        results = await asyncio.gather(*(self.request(method, params, deadline) for method, params in calls),
+                                       return_exceptions=True)
+        for res in results:
+            if isinstance(res, BaseException) and not isinstance(res, RuntimeError):
+                raise res
+        return results
+
+    async def run_tactic(self, sid: int, tactic: str, heartbeats: int = 200000000) -> int:
+        return await self.request('runTactic', {'sid': sid, 'tactic': tactic, 'heartbeats': heartbeats}, self.deadline)
+
+    async def run_tactics(self, sid: int, tactics: list[str], heartbeats: int = 200000000) -> list[int | RuntimeError]:
+        return await self.request_batch([('runTactic', {'sid': sid, 'tactic': tactic, 'heartbeats': heartbeats})
+                                         for tactic in tactics], self.deadline)
+
+    async def get_state(self, sid: int) -> list[Goal]:
+        res = await self.request('getState', {'sid': sid}, self.deadline)
+        return from_json(list[Goal], res)
+
+    async def get_states(self, sids: list[int]) -> list[list[Goal] | RuntimeError]:
+        results = await self.request_batch([('getState', {'sid': sid}) for sid in sids], self.deadline)
+        return [res if isinstance(res, RuntimeError) else from_json(list[Goal], res) for res in results]
+
+    async def get_messages(self, sid: int) -> list[str]:
+        res = await self.request('getMessages', {'sid': sid}, self.deadline)
+        return from_json(list[str], res)
+
+    async def new_state(self, state: list[ProofGoal]) -> int:
+        return await self.request('newState', {'state': [dataclasses.asdict(g) for g in state]})
+
+    async def give_up(self, sid: int) -> int:
+        return await self.request('giveUp', {'sid': sid})
+
+    async def commit(self, sid: int):
+        await self.request('commit', {'sid': sid})
+        self.tactic_mode = False
@@ -0,0 +1,129 @@
+import logging
+import time
+from typing import Any
+
+import conf.config
+from util import HttpUtil
+
+logger = logging.getLogger(__name__)
+
+
+def filter_outputs(texts: list[str], logprobs: list[float]) -> tuple[list[str], list[float]]:
+    """
+    去掉包含sorry的样本, tactic与logprob保持对应
+    """
+    kept = [(t.strip(), l) for t, l in zip(texts, logprobs) if not "sorry" in t]
+    return [t for t, _ in kept], [l for _, l in kept]
+
+
+class GenerationBackend:
+    """
+    TacticGenerator使用的生成后端. requests中每一项为 (prompt, n),
+    返回每个prompt的 (tactics, 平均token logprob, 生成的token总数(含被过滤的样本)).
+    timeout为最多等待的秒数, 超时抛出异常; 为None时不限制
+    """
+
+    def generate(self, requests: list[tuple[str, int]], timeout: float | None = None) -> list[tuple[list[str], list[float], int]]:
+        raise NotImplementedError
+
+
+class VllmBackend(GenerationBackend):
+    """
+    进程内的vLLM引擎, 独占当前进程可见的GPU. 生成无法中途打断, 不支持timeout
+    """
+
+    def __init__(self, model_path: str, sampling_params: dict[str, Any], engine_args: dict[str, Any] = None):
+        # 懒加载vllm, 只使用远程后端的进程不需要安装
+        from vllm import LLM
+        self.llm = LLM(model=model_path, **(engine_args or {})) # Lora
+        self.sampling_params = sampling_params
+
+    def generate(self, requests: list[tuple[str, int]], timeout: float | None = None) -> list[tuple[list[str], list[float], int]]:
+        from vllm import SamplingParams
+        params = {}
+        for _, n in requests:
+            if n not in params:
+                params[n] = SamplingParams(n=n, **self.sampling_params)
+        outputs = self.llm.generate([prompt for prompt, _ in requests],
+                                    [params[n] for _, n in requests], use_tqdm=False)
+        # lora = LoRARequest("new_data", self.gpu_id, "/AI4M/users/nhhuang/LLaMA-Factory/ds_stepprover_algebra_together")
+        # outputs = self.llm.generate([prompt], sampling_params, use_tqdm=False, lora_request=lora)
+        return [(*filter_outputs([ot.text for ot in output.outputs],
+                                 [ot.cumulative_logprob / max(len(ot.token_ids), 1) for ot in output.outputs]),  # type: ignore
+                 sum(len(ot.token_ids) for ot in output.outputs))
+                for output in outputs]
+
+
+class OpenAIBackend(GenerationBackend):
+    """
+    OpenAI兼容的 /v1/completions 接口 (例如 vllm serve), 多个搜索进程可共享同一个服务.
+    n相同的prompt合并为一个请求, 每个请求最多max_batch_prompts个prompt
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 model: str,
+                 sampling_params: dict[str, Any],
+                 api_key: str = None,
+                 max_batch_prompts: int = conf.config.BATCH_MAX_PROMPTS,
+                 timeout: float = 600):
+        self.url = base_url.rstrip("/") + "/completions"
+        self.model = model
+        self.sampling_params = dict(sampling_params)
+        self.sampling_params.setdefault("logprobs", 1)
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else None
+        self.max_batch_prompts = max_batch_prompts
+        self.timeout = timeout
+
+    def generate(self, requests: list[tuple[str, int]], timeout: float | None = None) -> list[tuple[list[str], list[float], int]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results: list = [None] * len(requests)
+        groups: dict[int, list[int]] = {}
+        for index, (_, n) in enumerate(requests):
+            groups.setdefault(n, []).append(index)
+        for n, indices in groups.items():
+            for start in range(0, len(indices), self.max_batch_prompts):
+                batch = indices[start:start + self.max_batch_prompts]
+                outputs = self._complete([requests[i][0] for i in batch], n, deadline)
+                for i, output in zip(batch, outputs):
+                    results[i] = output
+        return results
+
+    def _complete(self, prompts: list[str], n: int, deadline: float | None = None) -> list[tuple[list[str], list[float], int]]:
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise TimeoutError("generation deadline exceeded")
+        payload = dict(self.sampling_params, model=self.model, prompt=prompts, n=n)
+        response = HttpUtil.session().post(self.url, json=payload, headers=self.headers, timeout=timeout)
+        response.raise_for_status()
+        choices = response.json()["choices"]
+        texts = [[] for _ in prompts]
+        logprobs = [[] for _ in prompts]
+        tokens = [0] * len(prompts)
+        # 第i个prompt的第j个样本的index为 i * n + j
+        for choice in choices:
+            token_logprobs = [l for l in ((choice.get("logprobs") or {}).get("token_logprobs") or []) if l is not None]
+            texts[choice["index"] // n].append(choice["text"])
+            logprobs[choice["index"] // n].append(sum(token_logprobs) / max(len(token_logprobs), 1))
+            tokens[choice["index"] // n] += len(token_logprobs)
+        return [(*filter_outputs(t, l), k) for t, l, k in zip(texts, logprobs, tokens)]
+
+
+def build_backend(config: dict[str, Any], model_path: str, sampling_params: dict[str, Any],
+                  engine_args: dict[str, Any] = None) -> GenerationBackend:
+    """
+    config: {"type": "vllm"} 或 {"type": "openai", "base_url": ..., "model": ..., "api_key": ...}
+    """
+    backend_type = config.get("type", "vllm")
+    if backend_type == "vllm":
+        return VllmBackend(model_path, sampling_params, engine_args)
+    if backend_type == "openai":
+        return OpenAIBackend(base_url=config["base_url"],
+                             model=config.get("model", model_path),
+                             sampling_params=sampling_params,
+                             api_key=config.get("api_key"),
+                             max_batch_prompts=config.get("max_batch_prompts", conf.config.BATCH_MAX_PROMPTS),
+                             timeout=config.get("timeout", 600))
+    raise NotImplementedError(backend_type)
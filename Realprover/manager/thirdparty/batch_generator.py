@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from manager.thirdparty.generator import TacticGenerator
+import conf.config
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationBatcher:
+    """
+    同一GPU进程内多个并发搜索共享的批处理调度器.
+    各搜索线程提交的生成请求被收集起来, 用一次 backend.generate 统一生成, 再把结果分发回各自的搜索.
+    在GPU执行上一批时到达的请求会自然地进入下一批.
+    """
+
+    def __init__(self,
+                 generator: TacticGenerator,
+                 max_wait: float = conf.config.BATCH_MAX_WAIT,
+                 max_batch_prompts: int = conf.config.BATCH_MAX_PROMPTS):
+        """
+        generator: 持有生成后端的TacticGenerator, 仅由调度线程使用
+        max_wait: 收到第一个请求后等待其他搜索的最长时间(秒)
+        max_batch_prompts: 单次generate的最大prompt数
+        """
+        self.generator = generator
+        self.max_wait = max_wait
+        self.max_batch_prompts = max_batch_prompts
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.batch_sizes = []
+        self.thread = threading.Thread(target=self._loop, name="generation-batcher", daemon=True)
+        self.thread.start()
+
+    def register(self):
+        with self.lock:
+            self.active += 1
+
+    def unregister(self):
+        with self.lock:
+            self.active -= 1
+
+    def submit(self, prompts: list[str], num_samples: int, timeout: float | None = None) -> list[tuple[list[str], list[float], int]]:
+        """
+        timeout: 最多等待的秒数, 超时抛出TimeoutError, 已提交的请求仍会在批次中生成
+        """
+        future = Future()
+        self.requests.put((prompts, num_samples, future))
+        return future.result(timeout)
+
+    def _collect(self) -> list:
+        batch = [self.requests.get()]
+        num_prompts = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        # 所有活跃的搜索都已提交, 或等待超时, 或达到批大小上限时发送
+        while len(batch) < self.active and num_prompts < self.max_batch_prompts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            num_prompts += len(request[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self._run(batch)
+            except Exception as e:
+                logger.exception("batched generation failed")
+                for _, _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+
+    def _run(self, batch: list) -> list:
+        requests = []
+        for request_prompts, num_samples, _ in batch:
+            requests.extend((prompt, num_samples) for prompt in request_prompts)
+        self.generator._init_model()
+        assert self.generator.backend is not None
+        parsed = self.generator.backend.generate(requests)
+        self.batch_sizes.append(len(requests))
+        results = []
+        start = 0
+        for request_prompts, _, _ in batch:
+            results.append(parsed[start:start + len(request_prompts)])
+            start += len(request_prompts)
+        return results
+
+
+class BatchedTacticGenerator(TacticGenerator):
+    """
+    单个搜索使用的generator: prompt构造、检索和calls记录与TacticGenerator相同,
+    本地模型的生成交给共享的GenerationBatcher
+    """
+
+    def __init__(self, batcher: GenerationBatcher, **kwargs):
+        super().__init__(**kwargs)
+        self.batcher = batcher
+
+    @classmethod
+    def from_generator(cls, generator: TacticGenerator, batcher: GenerationBatcher) -> "BatchedTacticGenerator":
+        return cls(batcher,
+                   model_list=generator.model_list,
+                   gpu_id=generator.gpu_id,
+                   local_model_path=generator.model_path,
+                   sampling_params=generator.sampling_params,
+                   max_calls=generator.max_calls,
+                   engine_args=generator.engine_args,
+                   adaptive_sampling=generator.adaptive_sampling,
+                   backend=generator.backend_config)
+
+    def _generate_local(self, prompts: list[str], num_samples: int) -> list[tuple[list[str], list[float], int]]:
+        return self.batcher.submit(prompts, num_samples, self.time_left())
@@ -1,43 +1,132 @@
-from anthropic import AsyncAnthropic
+from anthropic import AsyncAnthropic, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
 
 import conf.config
 from manager.manage import PromptManage
+from util import LoopThread
 
 claude_config = conf.config.CLAUDE_CONFIG
 
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    异步令牌桶限速: 每秒补充rate个令牌, 最多积累burst个
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 
 class Claude:
     """
-    调用claude接口执行generate
+    调用claude接口执行generate.
+    客户端及其连接池常驻在后台事件循环上, 每个进程通过 Claude.shared() 共用一个实例;
+    并发数由信号量限制, 请求速率由令牌桶限制, 连接错误、限流和服务端错误按指数退避重试
     """
-    def __init__(self):
-        self.async_client = AsyncAnthropic(
-            base_url=claude_config['base_url'],
-            api_key=claude_config['api_key'],
-        )
-
-    @staticmethod
-    async def get_single_response(async_client, claude_prompt):
-        response = await async_client.messages.create(
-            model="claude-3-5-sonnet-latest",
-            max_tokens=100,
-            temperature=0.9,
-            messages=[{"role": "user", "content": claude_prompt}]
-        )
-        return response.content[0].text if isinstance(response.content, list) else response.content  # type: ignore
+    _shared = None
+    _shared_pid = None
+    _lock = threading.Lock()
+
+    def __init__(self,
+                 base_url: str = claude_config['base_url'],
+                 api_key: str = claude_config['api_key'],
+                 model: str = conf.config.CLAUDE_MODEL,
+                 max_concurrency: int = conf.config.CLAUDE_MAX_CONCURRENCY,
+                 rate_limit: float = conf.config.CLAUDE_RATE_LIMIT,
+                 max_retries: int = conf.config.CLAUDE_MAX_RETRIES,
+                 backoff: float = conf.config.CLAUDE_BACKOFF):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.loop_thread = LoopThread("claude-client")
+        # 客户端、信号量和令牌桶都需要在后台事件循环中创建
+        self.async_client, self.semaphore, self.bucket = self.loop_thread.run(self._init_client())
+
+    async def _init_client(self):
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency),
+            timeout=httpx.Timeout(60.0, connect=10.0))
+        async_client = AsyncAnthropic(base_url=self.base_url, api_key=self.api_key,
+                                      http_client=http_client, max_retries=0)
+        return async_client, asyncio.Semaphore(self.max_concurrency), TokenBucket(self.rate_limit, self.max_concurrency)
 
+    @classmethod
+    def shared(cls) -> "Claude":
+        """
+        进程内共享的实例, fork出的子进程会重新创建
+        """
+        with cls._lock:
+            if cls._shared is None or cls._shared_pid != os.getpid():
+                cls._shared = cls()
+                cls._shared_pid = os.getpid()
+            return cls._shared
+
+    async def get_single_response(self, claude_prompt: str, max_tokens: int = 100, temperature: float = 0.9) -> str:
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.bucket.acquire()
+                try:
+                    response = await self.async_client.messages.create(
+                        model=self.model,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        messages=[{"role": "user", "content": claude_prompt}]
+                    )
+                    return response.content[0].text if isinstance(response.content, list) else response.content  # type: ignore
+                except (APIConnectionError, APITimeoutError, RateLimitError, APIStatusError) as e:
+                    retryable = not isinstance(e, APIStatusError) or isinstance(e, RateLimitError) or e.status_code >= 500
+                    if not retryable or attempt == self.max_retries:
+                        raise
+                    delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                    logger.warning("claude request failed (%s), retrying in %.1fs", e, delay)
+                    await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
 
     async def get_claude_tactics(self, state, related_theorems, num_samples=16):
         claude_prompt = PromptManage.build_claude_prompt_str(state, related_theorems)
-        tasks = [Claude.get_single_response(self.async_client, claude_prompt)
-                 for _ in range(num_samples)]
+        tasks = [self.get_single_response(claude_prompt) for _ in range(num_samples)]
         responses = await asyncio.gather(*tasks)
         return responses
-    
 
     async def get_claude_critics(self, state_tactic_states: list[tuple[str, str, str]]):
-        tasks = [Claude.get_single_response(self.async_client, PromptManage.build_claude_critic_str(s, t, s))
-                 for (s, t, s) in state_tactic_states]
+        tasks = [self.get_single_response(PromptManage.build_claude_critic_str(s1, t, s2))
+                 for (s1, t, s2) in state_tactic_states]
         responses = await asyncio.gather(*tasks)
         return responses
+
+    def tactics(self, state, related_theorems, num_samples=16) -> list[str]:
+        """
+        供同步代码调用, 在常驻事件循环上执行 get_claude_tactics
+        """
+        return self.loop_thread.run(self.get_claude_tactics(state, related_theorems, num_samples))
+
+    def critics(self, state_tactic_states: list[tuple[str, str, str]]) -> list[str]:
+        return self.loop_thread.run(self.get_claude_critics(state_tactic_states))
@@ -1,15 +1,14 @@
-import asyncio
 from manager.thirdparty import Claude
 
 class Critic:
     def __init__(self, model='claude'):
         if model == 'claude':
-            self.client = Claude()
+            self.client = Claude.shared()
         else:
             raise NotImplementedError
     
     def get_critics(self, sass: list[tuple[str, str, str]]) -> list[bool]:
-        results = asyncio.run(self.client.get_claude_critics(sass))
+        results = self.client.critics(sass)
         return [False if r=="FALSE" else True for r in results]
 
 
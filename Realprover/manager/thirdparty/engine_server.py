@@ -0,0 +1,120 @@
+import logging
+import queue
+import threading
+import time
+
+from manager.thirdparty.backend import GenerationBackend
+from manager.thirdparty.generator import TacticGenerator
+import conf.config
+
+logger = logging.getLogger(__name__)
+
+
+class EngineServer:
+    """
+    每个GPU一个的生成进程: 独占该GPU上的生成后端(vLLM), 通过本机的mp.Queue为多个CPU搜索进程服务.
+    与GenerationBatcher相同, 不同worker在同一时间窗口内提交的请求合并为一次 backend.generate.
+    请求: (worker_id, request_id, [(prompt, n), ...]); 结果放入 responses[worker_id]: (request_id, 结果或异常).
+    收到None时处理完已收集的请求后退出.
+    """
+
+    def __init__(self,
+                 generator: TacticGenerator,
+                 requests,
+                 responses: list,
+                 max_wait: float = conf.config.BATCH_MAX_WAIT,
+                 max_batch_prompts: int = conf.config.BATCH_MAX_PROMPTS):
+        """
+        generator: 持有生成后端配置的TacticGenerator, 在服务进程中加载模型
+        requests: 所有worker共用的请求队列
+        responses: 每个worker一个结果队列, 下标即worker_id
+        """
+        self.generator = generator
+        self.requests = requests
+        self.responses = responses
+        self.max_wait = max_wait
+        self.max_batch_prompts = max_batch_prompts
+        self.batch_sizes = []
+
+    def run(self):
+        self.generator._init_model()
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._run(batch)
+        print(f"engine_{self.generator.gpu_id} generation batches = {len(self.batch_sizes)}, "
+              f"avg_prompts = {sum(self.batch_sizes) / max(len(self.batch_sizes), 1):.2f}")
+
+    def _collect(self) -> tuple[list, bool]:
+        first = self.requests.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        num_prompts = len(first[2])
+        deadline = time.monotonic() + self.max_wait
+        # 每个worker都已提交, 或等待超时, 或达到批大小上限时发送
+        while len(batch) < len(self.responses) and num_prompts < self.max_batch_prompts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+            num_prompts += len(request[2])
+        return batch, False
+
+    def _run(self, batch: list):
+        requests = []
+        for _, _, worker_requests in batch:
+            requests.extend(worker_requests)
+        try:
+            assert self.generator.backend is not None
+            parsed = self.generator.backend.generate(requests)
+        except Exception as e:
+            logger.exception("engine generation failed")
+            # 原异常可能无法pickle, 转为RuntimeError交给各worker抛出
+            for worker_id, request_id, _ in batch:
+                self.responses[worker_id].put((request_id, RuntimeError(repr(e))))
+            return
+        self.batch_sizes.append(len(requests))
+        start = 0
+        for worker_id, request_id, worker_requests in batch:
+            self.responses[worker_id].put((request_id, parsed[start:start + len(worker_requests)]))
+            start += len(worker_requests)
+
+
+class EngineClient(GenerationBackend):
+    """
+    搜索进程中使用的生成后端: 把请求发给同一GPU的EngineServer并等待结果
+    """
+
+    def __init__(self, requests, responses, worker_id: int):
+        self.requests = requests
+        self.responses = responses
+        self.worker_id = worker_id
+        self.lock = threading.Lock()  # 同一进程内的搜索线程逐个提交(并发搜索时由GenerationBatcher先合并)
+        self.next_id = 0
+
+    def generate(self, requests: list[tuple[str, int]], timeout: float | None = None) -> list[tuple[list[str], list[float], int]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            request_id = self.next_id
+            self.next_id += 1
+            self.requests.put((self.worker_id, request_id, requests))
+            # 之前超时的请求的结果稍后到达, 按request_id跳过
+            while True:
+                try:
+                    response_id, result = self.responses.get(
+                        timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    raise TimeoutError("generation deadline exceeded")
+                if response_id == request_id:
+                    break
+        if isinstance(result, Exception):
+            raise result
+        return result
@@ -1,12 +1,12 @@
-import asyncio
 import logging
+import math
+import time
 from typing import Any
-from vllm import LLM, SamplingParams
-from vllm.lora.request import LoRARequest
 
 from manager.manage import ModelManage, PromptManage
 from manager.struct import Goal, state_repr
 from manager.thirdparty import LeanSearch, Claude
+from manager.thirdparty.backend import GenerationBackend, build_backend
 import conf.config
 
 logger = logging.getLogger(__name__)
@@ -18,92 +18,154 @@ class TacticGenerator:
                  gpu_id: int, 
                  local_model_path: str=conf.config.PROVER_MODEL_PATH,
                  sampling_params: dict['str', Any]=conf.config.PROVER_MODEL_PARAMS, # n excluded
-                 max_calls: int=conf.config.MAX_CALLS):
+                 max_calls: int=conf.config.MAX_CALLS,
+                 engine_args: dict['str', Any]=conf.config.VLLM_ENGINE_ARGS,
+                 adaptive_sampling: dict['str', Any]=conf.config.ADAPTIVE_SAMPLING,
+                 backend: dict['str', Any]=conf.config.GENERATION_BACKEND):
         """
         model_list: 支持多个model
+        engine_args: 透传给vllm.LLM的引擎参数, 例如 enable_prefix_caching
+        adaptive_sampling: 分轮采样的参数 (rounds, distinct_target, novelty_threshold), 为None时一次采样num_samples个
+        backend: 本地模型的生成后端配置, 见 backend.build_backend
         """
         self.gpu_id = gpu_id
         self.model_list = model_list
         self.calls = []
-        self.llm = None
+        self.backend_config = backend
+        self.backend: GenerationBackend | None = None  # 懒加载, generator需要在进程间传递
         self.model_path = local_model_path
         self.sampling_params = sampling_params
         self.max_calls = max_calls
+        self.engine_args = engine_args
+        self.adaptive_sampling = adaptive_sampling
+        self.tokens = 0  # 本地模型生成的token数
+        self.gen_seconds = 0.0  # 生成tactic(含检索)所用的墙钟时间
+        # 本地模型生成的截止时间(time.monotonic), 由搜索按剩余预算设置; 超时的调用不返回tactic
+        self.deadline: float | None = None
 
     def from_state_str(self, state_str: str, num_samples: int, incontext: str=None, template: str = 'deepseek', use_retrieval: bool=True) -> tuple[list[str], list[float]]:
+        start = time.monotonic()
         try:
-            tactics, logprobs, prompt = self.get_lean_tactics(state_str, num_samples=num_samples, incontext=incontext, template=template, use_retrieval=use_retrieval)
-            self.calls.append((state_str, tactics, logprobs, prompt))
+            tactics, logprobs, prompt, saved = self.get_lean_tactics(state_str, num_samples=num_samples, incontext=incontext, template=template, use_retrieval=use_retrieval)
+            self.calls.append((state_str, tactics, logprobs, prompt, saved))
         except Exception:
             logger.exception("message")
             
             tactics, logprobs = [], []
+        self.gen_seconds += time.monotonic() - start
         return tactics, logprobs
 
     def from_state(self, state: list[Goal], num_samples: int, incontext: str=None, template: str = 'deepseek', use_retrieval: bool=True) -> tuple[list[str], list[float]]:
         return self.from_state_str(state_repr(state), num_samples, incontext, template, use_retrieval)
 
-    def from_state_batch(self, states: list[list[Goal]], num_samples: int, incontext: list[str]=None) -> list[tuple[list[str], list[float]]]:
+    def from_state_batch(self, states: list[list[Goal]], num_samples: int, incontext: list[str]=None, template: str = 'deepseek', use_retrieval: bool=True) -> list[tuple[list[str], list[float]]]:
+        """
+        一次vLLM调用为多个state生成tactic, 检索也批量进行; 每个state记为一次call
+        """
         state_strs = [state_repr(s) for s in states]
-        related_theorems = LeanSearch.get_related_theorem_batch(state_strs)
+        start = time.monotonic()
+        try:
+            if use_retrieval:
+                related_theorems = LeanSearch.get_related_theorem_batch(state_strs)
+            else:
+                related_theorems = [None] * len(state_strs)
+            if incontext is None:
+                incontext = [None] * len(state_strs)
+            prompts = [self.build_prompt(s, r, c, template)
+                       for s, r, c in zip(state_strs, related_theorems, incontext)]
+            results = self._sample(prompts, num_samples)
+        except Exception:
+            logger.exception("message")
+            return [([], []) for _ in states]
+        finally:
+            self.gen_seconds += time.monotonic() - start
+        for state_str, prompt, (tactics, logprobs, saved) in zip(state_strs, prompts, results):
+            self.calls.append((state_str, tactics, logprobs, prompt, saved))
+        return [(tactics, logprobs) for tactics, logprobs, _ in results]
+
+    @staticmethod
+    def build_prompt(state: str, related_theorems, incontext: str=None, template: str = 'deepseek') -> str:
         if incontext is None:
-            prompts = [PromptManage.build_local_prompt_str(s, r)
-                    for s, r in zip(state_strs, related_theorems)]
-        else:
-            prompts = [PromptManage.build_local_prompt_str(s, r, c)
-                   for s, r, c in zip(state_strs, related_theorems, incontext)] 
+            return PromptManage.build_local_prompt_str(state, related_theorems)
+        return PromptManage.build_local_incontext_prompt_str(incontext, state, related_theorems, template)
+
+    def time_left(self) -> float | None:
+        """
+        距deadline的秒数, 没有deadline时为None; 已过deadline时抛出TimeoutError
+        """
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("generation deadline exceeded")
+        return remaining
+
+    def _generate_local(self, prompts: list[str], num_samples: int) -> list[tuple[list[str], list[float], int]]:
         self._init_model()  # 懒加载，用到时才加载模型
-        assert self.llm is not None
-        sampling_params = SamplingParams(n=num_samples, **self.sampling_params)
-        outputs = self.llm.generate(prompts, sampling_params)
-        results = []
-        
-        for state, prompt, output in zip(states, prompts, outputs):
-            response = [ot.text.strip() for ot in output.outputs]
-            # 为完整记录，在此处不过滤不合法tactic
-            # response = [i for i in response if not "sorry" in i]
-            logprob = [output.cumulative_logprob / max(len(output.token_ids), 1) # type: ignore
-                       for output in output.outputs]
-            results.append((response, logprob))
-            self.calls.append((state, prompt, (response, logprob)))
-        return results
-        
-
-    def get_lean_tactics(self, state: str, num_samples: int, incontext: str=None, template: str = 'deepseek', use_retrieval: bool=True) -> tuple[list[str], list[float], str]:
+        assert self.backend is not None
+        return self.backend.generate([(prompt, num_samples) for prompt in prompts], self.time_left())
+
+    def _sample(self, prompts: list[str], num_samples: int) -> list[tuple[list[str], list[float], int]]:
+        """
+        为每个prompt采样至多num_samples个tactic, 返回 (tactics, logprobs, 节省的采样数).
+        开启adaptive_sampling时分rounds轮采样, 每轮只为仍需采样的prompt生成: 已得到distinct_target个不同tactic,
+        或本轮新出现的tactic占比低于novelty_threshold(高温下简单state的样本大多重复)时停止.
+        """
+        if not self.adaptive_sampling or num_samples <= 1:
+            outputs = self._generate_local(prompts, num_samples)
+            self.tokens += sum(tokens for _, _, tokens in outputs)
+            return [(tactics, logprobs, 0) for tactics, logprobs, _ in outputs]
+        rounds = max(self.adaptive_sampling.get('rounds', 4), 1)
+        distinct_target = self.adaptive_sampling.get('distinct_target', num_samples)
+        novelty_threshold = self.adaptive_sampling.get('novelty_threshold', 0.0)
+        round_size = math.ceil(num_samples / rounds)
+        tactics = [[] for _ in prompts]
+        logprobs = [[] for _ in prompts]
+        distinct = [set() for _ in prompts]
+        drawn = [0] * len(prompts)
+        active = list(range(len(prompts)))
+        while active:
+            # 仍在采样的prompt已采样数相同, 每轮使用同样的n
+            n = min(round_size, num_samples - drawn[active[0]])
+            outputs = self._generate_local([prompts[i] for i in active], n)
+            next_active = []
+            for i, (round_tactics, round_logprobs, round_tokens) in zip(active, outputs):
+                self.tokens += round_tokens
+                drawn[i] += n
+                before = len(distinct[i])
+                tactics[i].extend(round_tactics)
+                logprobs[i].extend(round_logprobs)
+                distinct[i].update(t.strip() for t in round_tactics)
+                novelty = (len(distinct[i]) - before) / n
+                if drawn[i] < num_samples and len(distinct[i]) < distinct_target and novelty >= novelty_threshold:
+                    next_active.append(i)
+            active = next_active
+        return [(tactics[i], logprobs[i], num_samples - drawn[i]) for i in range(len(prompts))]
+
+    def get_lean_tactics(self, state: str, num_samples: int, incontext: str=None, template: str = 'deepseek', use_retrieval: bool=True) -> tuple[list[str], list[float], str, int]:
         # 获取相关定理
         if use_retrieval:
             related_theorems = LeanSearch.get_related_theorem(state)
         else:
             related_theorems = None
-        if incontext is None:
-            prompt = PromptManage.build_local_prompt_str(state, related_theorems)
-        else:
-            prompt = PromptManage.build_local_incontext_prompt_str(incontext, state, related_theorems, template)
+        prompt = self.build_prompt(state, related_theorems, incontext, template)
         responses = []
         logprobs = []
-        sampling_params = SamplingParams(n=num_samples, **self.sampling_params)
 
         # Get tactics from Claude if requested
         if ModelManage.contain_gemini(self.model_list):
-            claude_responses = asyncio.run(Claude().get_claude_tactics(state, related_theorems, num_samples))
+            claude_responses = Claude.shared().tactics(state, related_theorems, num_samples)
             responses.extend(claude_responses)
 
         # Get tactics from local model if requested
         if ModelManage.contain_local(self.model_list):
-            self._init_model()  # 懒加载，用到时才加载模型
-            assert self.llm is not None
-            sampling_params = SamplingParams(n=num_samples, **self.sampling_params)
-            outputs = self.llm.generate([prompt], sampling_params, use_tqdm=False)
-            # lora = LoRARequest("new_data", self.gpu_id, "/AI4M/users/nhhuang/LLaMA-Factory/ds_stepprover_algebra_together")
-            # outputs = self.llm.generate([prompt], sampling_params, use_tqdm=False, lora_request=lora)
-            local_responses = [output.text.strip() for output in outputs[0].outputs]
-            local_responses = [i for i in local_responses if not "sorry" in i]
-            local_logprobs = [output.cumulative_logprob / max(len(output.token_ids), 1) # type: ignore
-                              for output in outputs[0].outputs]
+            local_responses, local_logprobs, saved = self._sample([prompt], num_samples)[0]
             responses.extend(local_responses)
             logprobs.extend(local_logprobs)
+        else:
+            saved = 0
 
-        return responses, logprobs, prompt
+        return responses, logprobs, prompt, saved
 
     def has_quota(self) -> bool:
         return len(self.calls) < self.max_calls
@@ -113,15 +175,20 @@ class TacticGenerator:
         单进程只实例化一次generator, 每次执行时需重置calls
         """
         self.calls = []
+        self.tokens = 0
+        self.gen_seconds = 0.0
         self.formal_statement = formal_statement
 
     def _init_model(self):
-        if self.llm is None:
-            self.llm = LLM(model=self.model_path) # Lora
+        if self.backend is None:
+            self.backend = build_backend(self.backend_config, self.model_path, self.sampling_params, self.engine_args)
     
     @property
     def info(self):
         return dict(
             model_path=self.model_path,
             max_calls=self.max_calls,
-            sampling_params=self.sampling_params)
\ No newline at end of file
+            sampling_params=self.sampling_params,
+            engine_args=self.engine_args,
+            adaptive_sampling=self.adaptive_sampling,
+            backend=self.backend_config)
\ No newline at end of file
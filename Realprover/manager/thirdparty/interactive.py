@@ -1,7 +1,9 @@
 import dataclasses
 import json
 import logging
+import select
 import subprocess
+import time
 from io import TextIOWrapper
 from pathlib import Path
 
@@ -49,11 +51,50 @@ class Interactive:
         )
         self.read_from = self.proc.stdout
         self.write_to = TextIOWrapper(self.proc.stdin, line_buffering=True)
+        self.buffer = bytearray()  # 已从stdout读到、尚未组成完整一行的数据
         self.id = 0
         self.tactic_mode = False
-
-    def read(self) -> dict:
-        line = self.read_from.readline().strip()
+        self.files_opened = 0
+        # 扩展用的请求(runTactic/getState等)读取响应的截止时间(time.monotonic), 由搜索按剩余预算设置
+        self.deadline: float | None = None
+
+    def is_alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def close(self):
+        if self.is_alive():
+            self.proc.kill()
+        self.proc.wait()
+
+    def read_line(self, deadline: float | None = None) -> bytes:
+        """
+        直接从管道读取一行, 以便在读之前用select等待; 到deadline仍没有完整的一行时抛出TimeoutError
+        """
+        fd = self.read_from.fileno()  # type: ignore
+        start = 0
+        while (newline := self.buffer.find(b"\n", start)) < 0:
+            start = len(self.buffer)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                    raise TimeoutError("interactive response deadline exceeded")
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                line = bytes(self.buffer)
+                self.buffer.clear()
+                return line
+            self.buffer += chunk
+        line = bytes(self.buffer[:newline])
+        del self.buffer[:newline + 1]
+        return line
+
+    def read(self, deadline: float | None = None) -> dict:
+        try:
+            line = self.read_line(deadline).strip()
+        except TimeoutError:
+            # 超时的请求仍在Lean中执行, 之后的响应无法与请求对应, 进程不能再使用
+            self.close()
+            raise
         logger.debug("<-" + repr(line))
         return json.loads(line)
 
@@ -64,6 +105,7 @@ class Interactive:
 
     def open_file(self, path: Path, selectors: list[str | int | None]):
         assert not self.tactic_mode
+        self.files_opened += 1
         self.write({"filename": str(path), "selectors": selectors})
 
     def get_next_problem(self) -> str | None:
@@ -74,25 +116,64 @@ class Interactive:
         self.tactic_mode = decl_name is not None
         return decl_name
 
-    def request(self, method: str, params: dict):
+    def request(self, method: str, params: dict, deadline: float | None = None):
         assert self.tactic_mode
         self.id += 1
         self.write({'id': self.id, 'method': method, 'params': params})
-        response = self.read()
+        response = self.read(deadline)
         try:
             return response['result']
         except KeyError:
             raise RuntimeError(response['error'])
 
+    def request_batch(self, calls: list[tuple[str, dict]],
+                      window: int = config.INTERACTIVE_PIPELINE_WINDOW,
+                      deadline: float | None = None) -> list:
+        """
+        流水线方式发送请求: 最多window个请求同时在途, 按id匹配返回结果.
+        失败的请求以RuntimeError对象的形式放在对应位置返回, 而不是直接抛出.
+        window限制在途请求的数量, 避免stdin/stdout管道写满导致双方互相阻塞.
+        """
+        assert self.tactic_mode
+        results: list = [None] * len(calls)
+        pending: dict[int, int] = {}  # request id -> index in calls
+        next_call = 0
+        while next_call < len(calls) or pending:
+            while next_call < len(calls) and len(pending) < max(window, 1):
+                method, params = calls[next_call]
+                self.id += 1
+                pending[self.id] = next_call
+                self.write({'id': self.id, 'method': method, 'params': params})
+                next_call += 1
+            response = self.read(deadline)
+            rid = response.get('id')
+            if rid not in pending:
+                # 响应中没有id时, 按发送顺序匹配
+                rid = min(pending)
+            index = pending.pop(rid)
+            try:
+                results[index] = response['result']
+            except KeyError:
+                results[index] = RuntimeError(response['error'])
+        return results
+
     def run_tactic(self, sid: int, tactic: str, heartbeats: int = 200000000) -> int:
-        return self.request('runTactic', {'sid': sid, 'tactic': tactic, 'heartbeats': heartbeats})
+        return self.request('runTactic', {'sid': sid, 'tactic': tactic, 'heartbeats': heartbeats}, self.deadline)
+
+    def run_tactics(self, sid: int, tactics: list[str], heartbeats: int = 200000000) -> list[int | RuntimeError]:
+        return self.request_batch([('runTactic', {'sid': sid, 'tactic': tactic, 'heartbeats': heartbeats})
+                                   for tactic in tactics], deadline=self.deadline)
+
+    def get_states(self, sids: list[int]) -> list[list[Goal] | RuntimeError]:
+        results = self.request_batch([('getState', {'sid': sid}) for sid in sids], deadline=self.deadline)
+        return [res if isinstance(res, RuntimeError) else from_json(list[Goal], res) for res in results]
 
     def get_state(self, sid: int) -> list[Goal]:
-        res = self.request('getState', {'sid': sid})
+        res = self.request('getState', {'sid': sid}, self.deadline)
         return from_json(list[Goal], res)
 
     def get_messages(self, sid: int) -> list[str]:
-        res = self.request('getMessages', {'sid': sid})
+        res = self.request('getMessages', {'sid': sid}, self.deadline)
         return from_json(list[str], res)
 
     def resolve_name(self, sid: int, name: str) -> list[tuple[str, list[str]]]:
@@ -0,0 +1,106 @@
+import atexit
+import logging
+import os
+import queue
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+import conf.config
+from manager.thirdparty.interactive import Interactive
+
+logger = logging.getLogger(__name__)
+
+
+class InteractivePool:
+    """
+    常驻的Interactive进程池: 每个进程只加载一次Header (Mathlib),
+    之后通过 open_file/get_next_problem 复用, 进程异常退出时自动替换
+    """
+
+    def __init__(self,
+                 root: Path,
+                 header: Path = Path("Header.lean"),
+                 size: int = conf.config.INTERACTIVE_POOL_SIZE,
+                 max_uses: int = conf.config.INTERACTIVE_MAX_USES,
+                 lean_env: str = conf.config.LEAN_ENV_PATH,
+                 factory: Callable[[Path, Path], Interactive] = Interactive):
+        """
+        factory: 创建worker的函数, 默认为Interactive; 也可以返回接口相同的AsyncInteractive
+        """
+        self.root = root
+        self.factory = factory
+        self.header = header
+        self.size = size
+        self.max_uses = max_uses
+        self.idle = queue.LifoQueue()
+        for _ in range(size):
+            self.idle.put(None)
+        self.closed = False
+        if str(lean_env) not in os.environ["PATH"].split(":"):
+            os.environ["PATH"] += ":" + str(lean_env)
+        atexit.register(self.close)
+
+    def _spawn(self) -> Interactive:
+        logger.info("Starting interactive worker: %s", self.header)
+        return self.factory(self.root, self.header)
+
+    def _healthy(self, interactive: Interactive) -> bool:
+        """
+        只有空闲(不在tactic_mode)、进程存活且未超过复用次数的worker才能继续使用
+        """
+        return (interactive.is_alive()
+                and not interactive.tactic_mode
+                and interactive.files_opened < self.max_uses)
+
+    def warm_up(self):
+        """
+        预先启动全部worker, 把Mathlib的加载时间移出第一条数据的处理过程
+        """
+        workers = [self.acquire() for _ in range(self.size)]
+        for interactive in workers:
+            self.release(interactive)
+
+    def acquire(self) -> Interactive:
+        # idle中的None表示一个尚未启动(或已被回收)的空位
+        interactive = self.idle.get()
+        if interactive is not None and self._healthy(interactive):
+            return interactive
+        if interactive is not None:
+            logger.warning("Replacing interactive worker (alive=%s, files_opened=%d)",
+                           interactive.is_alive(), interactive.files_opened)
+            interactive.close()
+        try:
+            return self._spawn()
+        except Exception:
+            self.idle.put(None)
+            raise
+
+    def release(self, interactive: Interactive, broken: bool = False):
+        if broken or self.closed:
+            # 出错的worker状态未知(可能仍处于tactic_mode), 直接替换
+            interactive.close()
+            self.idle.put(None)
+            return
+        self.idle.put(interactive)
+
+    @contextmanager
+    def session(self):
+        interactive = self.acquire()
+        try:
+            yield interactive
+        except BaseException:
+            self.release(interactive, broken=True)
+            raise
+        else:
+            self.release(interactive)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                interactive = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if interactive is not None:
+                interactive.close()
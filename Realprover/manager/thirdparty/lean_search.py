@@ -1,17 +1,105 @@
+import hashlib
+import logging
+import os
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import conf.config
-from util import StringUtil, HttpUtil
+from util import StringUtil, HttpUtil, LruCache
 
 REQUEST_URL = conf.config.API_CONFIG['lean_search']
 
+logger = logging.getLogger(__name__)
+
 
 class LeanSearch:
+    _cache = None
+    _cache_pid = None
+    _lock = threading.Lock()
+    _executor = None
+    _inflight: dict[bytes, Future] = {}
+
+    @staticmethod
+    def get_cache() -> LruCache:
+        """
+        检索结果缓存, 每个进程懒加载一份 (sqlite连接不能跨fork使用)
+        """
+        with LeanSearch._lock:
+            if LeanSearch._cache is None or LeanSearch._cache_pid != os.getpid():
+                LeanSearch._cache = LruCache(conf.config.RETRIEVAL_CACHE_CAPACITY,
+                                             conf.config.RETRIEVAL_CACHE_PATH,
+                                             table="retrieval")
+                LeanSearch._executor = None
+                LeanSearch._inflight = {}
+                LeanSearch._cache_pid = os.getpid()
+            return LeanSearch._cache
+
+    @staticmethod
+    def cache_key(query: str, num: int) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(query.encode("utf-8"))
+        h.update(b"\0" + str(num).encode("utf-8"))
+        return h.digest()
+
+    @staticmethod
+    def get_related_theorem(query: str, num: int=conf.config.NUM_QUERYS):
+        cache = LeanSearch.get_cache()
+        key = LeanSearch.cache_key(query, num)
+        LeanSearch._wait_prefetch(key)
+        related = cache.get(key)
+        if related is None:
+            related = LeanSearch._fetch(query, num, key)
+        return related
 
     @staticmethod
-    def get_related_theorem(query: str):
-        data = LeanSearch.get_param(query)
+    def _fetch(query: str, num: int, key: bytes):
+        data = LeanSearch.get_param(query, num)
         result = HttpUtil.post(url=REQUEST_URL, json=data)
-        return result['data'][0] # type: ignore
+        related = result['data'][0] # type: ignore
+        LeanSearch.get_cache().put(key, related)
+        return related
+
+    @staticmethod
+    def prefetch(query: str, num: int=conf.config.NUM_QUERYS):
+        """
+        在后台线程中检索并写入缓存, 不等待结果. 已缓存、已在途或在途请求过多时直接返回
+        """
+        cache = LeanSearch.get_cache()
+        key = LeanSearch.cache_key(query, num)
+        if key in cache:
+            return
+        with LeanSearch._lock:
+            if key in LeanSearch._inflight or len(LeanSearch._inflight) >= conf.config.PREFETCH_MAX_INFLIGHT:
+                return
+            if LeanSearch._executor is None:
+                LeanSearch._executor = ThreadPoolExecutor(max_workers=conf.config.PREFETCH_WORKERS,
+                                                          thread_name_prefix="retrieval-prefetch")
+            future = LeanSearch._executor.submit(LeanSearch._fetch, query, num, key)
+            LeanSearch._inflight[key] = future
+        # 已完成的future会在当前线程中立即调用回调, 因此在锁外注册
+        future.add_done_callback(lambda done: LeanSearch._prefetch_done(key, done))
+
+    @staticmethod
+    def _prefetch_done(key: bytes, future: Future):
+        with LeanSearch._lock:
+            # fork后_inflight已重置, 只移除本次登记的future
+            if LeanSearch._inflight.get(key) is future:
+                del LeanSearch._inflight[key]
+
+    @staticmethod
+    def _wait_prefetch(key: bytes):
+        """
+        该query的预取仍在进行时等待其完成, 避免重复请求. 预取的结果写入缓存, 之后的查询按缓存命中统计;
+        预取失败时缓存中没有结果, 由调用方重新请求
+        """
+        with LeanSearch._lock:
+            future = LeanSearch._inflight.get(key)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception:
+            logger.exception("retrieval prefetch failed")
 
     @staticmethod
     def get_param(query: str, num: int=conf.config.NUM_QUERYS):
@@ -24,10 +112,26 @@ class LeanSearch:
         return params
 
     @staticmethod
-    def get_related_theorem_batch(queries: list[str]):
-        data = [LeanSearch.get_param(q) for q in queries]
-        result = HttpUtil.post(url=REQUEST_URL, json=data)
-        return result['data'] # type: ignore
+    def get_related_theorem_batch(queries: list[str], num: int=conf.config.NUM_QUERYS):
+        cache = LeanSearch.get_cache()
+        keys = [LeanSearch.cache_key(q, num) for q in queries]
+        for key in keys:
+            LeanSearch._wait_prefetch(key)
+        results = [cache.get(key) for key in keys]
+        # 只请求未命中的query
+        misses = [i for i, related in enumerate(results) if related is None]
+        if misses:
+            data = [LeanSearch.get_param(queries[i], num) for i in misses]
+            result = HttpUtil.post(url=REQUEST_URL, json=data)
+            for i, related in zip(misses, result['data']): # type: ignore
+                cache.put(keys[i], related)
+                results[i] = related
+        return results
+
+    @staticmethod
+    def info() -> dict:
+        cache = LeanSearch.get_cache()
+        return dict(retrieval_cache_hits=cache.hits, retrieval_cache_misses=cache.misses)
 
 if __name__ == '__main__':
     # TODO: write tests here!
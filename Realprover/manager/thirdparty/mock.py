@@ -0,0 +1,169 @@
+import hashlib
+import math
+import random
+import time
+from pathlib import Path
+
+from manager.struct import Goal, Variable, state_repr
+from manager.thirdparty.generator import TacticGenerator
+
+
+class MockStateSpace:
+    """
+    合成的证明状态空间, 用于在没有GPU和Lean的情况下测试搜索算法.
+    每个state由一个整数key表示; 同一 (key, tactic) 的结果是确定的:
+    以failure_rate的概率失败, 以duplicate_rate的概率落入一个较小的共享state池(产生重复state), 其余为新state.
+    state永远不会被证明完成, 搜索总是跑满预算.
+    """
+
+    def __init__(self,
+                 branching: int = 8,
+                 duplicate_rate: float = 0.2,
+                 failure_rate: float = 0.3,
+                 pool_size: int = 64,
+                 seed: int = 0):
+        self.branching = branching
+        self.duplicate_rate = duplicate_rate
+        self.failure_rate = failure_rate
+        self.pool_size = pool_size
+        self.seed = seed
+
+    def _uniform(self, key: int, tactic: str) -> tuple[float, int]:
+        digest = hashlib.blake2b(f"{self.seed}:{key}:{tactic}".encode(), digest_size=16).digest()
+        value = int.from_bytes(digest, "big")
+        return (value >> 64) / 2 ** 64, value & (2 ** 63 - 1)
+
+    def apply(self, key: int, tactic: str) -> int | None:
+        r, h = self._uniform(key, tactic)
+        if r < self.failure_rate:
+            return None
+        if r < self.failure_rate + self.duplicate_rate:
+            return h % self.pool_size
+        return self.pool_size + h
+
+    def tactics(self) -> list[str]:
+        return [f"tac_{i}" for i in range(self.branching)]
+
+    @staticmethod
+    def state(key: int) -> list[Goal]:
+        return [Goal(context=[Variable(name=["h"], type=f"P {key % 97}", is_prop=True)],
+                     type=f"Q {key}", is_prop=True)]
+
+    @staticmethod
+    def key_of(state: list[Goal]) -> int:
+        return int(state[0].type.split()[1])
+
+
+class MockInteractive:
+    """
+    与Interactive接口一致的假Lean进程, 每次执行tactic等待lean_latency秒
+    """
+
+    def __init__(self, space: MockStateSpace, lean_latency: float = 0.0, problems: int = 1):
+        self.space = space
+        self.lean_latency = lean_latency
+        self.problems = problems
+        self.keys: list[int] = []
+        self.tactic_mode = False
+        self.files_opened = 0
+        self.remaining = 0
+        self.tactic_calls = 0  # 执行过的tactic数, 包括重放路径
+
+    def is_alive(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def open_file(self, path: Path, selectors: list[str | int | None]):
+        assert not self.tactic_mode
+        self.files_opened += 1
+        self.remaining = self.problems
+
+    def get_next_problem(self) -> str | None:
+        assert not self.tactic_mode
+        if self.remaining == 0:
+            return None
+        self.remaining -= 1
+        self.keys = [0]
+        self.tactic_mode = True
+        return f"mock_theorem_{self.problems - self.remaining}"
+
+    def run_tactic(self, sid: int, tactic: str, heartbeats: int = 200000000) -> int:
+        assert self.tactic_mode
+        self.tactic_calls += 1
+        if self.lean_latency:
+            time.sleep(self.lean_latency)
+        key = self.space.apply(self.keys[sid], tactic.strip())
+        if key is None:
+            raise RuntimeError({"message": f"mock tactic failed: {tactic}"})
+        self.keys.append(key)
+        return len(self.keys) - 1
+
+    def run_tactics(self, sid: int, tactics: list[str], heartbeats: int = 200000000) -> list[int | RuntimeError]:
+        results = []
+        for tactic in tactics:
+            try:
+                results.append(self.run_tactic(sid, tactic, heartbeats))
+            except RuntimeError as e:
+                results.append(e)
+        return results
+
+    def get_state(self, sid: int) -> list[Goal]:
+        return MockStateSpace.state(self.keys[sid])
+
+    def get_states(self, sids: list[int]) -> list[list[Goal] | RuntimeError]:
+        return [self.get_state(sid) for sid in sids]
+
+    def get_messages(self, sid: int) -> list[str]:
+        return []
+
+    def give_up(self, sid: int) -> int:
+        self.keys.append(-1)
+        return len(self.keys) - 1
+
+    def commit(self, sid: int):
+        self.tactic_mode = False
+
+
+class MockTacticGenerator(TacticGenerator):
+    """
+    与TacticGenerator接口一致的假生成器: 按Zipf分布从state的可用tactic中采样, 每次调用等待gen_latency秒.
+    不使用检索和外部模型, calls的记录格式与TacticGenerator相同
+    """
+
+    def __init__(self, space: MockStateSpace, gen_latency: float = 0.0, max_calls: int = 512, seed: int = 0):
+        super().__init__(model_list=["local"], gpu_id=0, max_calls=max_calls)
+        self.space = space
+        self.gen_latency = gen_latency
+        self.rng = random.Random(seed)
+        tactics = space.tactics()
+        self.weights = [1 / (i + 1) for i in range(len(tactics))]
+        total = sum(self.weights)
+        self.logprob = {t: math.log(w / total) for t, w in zip(tactics, self.weights)}
+
+    def _sample_tactics(self, num_samples: int) -> tuple[list[str], list[float]]:
+        tactics = self.rng.choices(self.space.tactics(), weights=self.weights, k=num_samples)
+        self.tokens += sum(len(t.split("_")) for t in tactics)
+        return tactics, [self.logprob[t] for t in tactics]
+
+    def from_state_str(self, state_str: str, num_samples: int, incontext: str=None, template: str = 'deepseek', use_retrieval: bool=True) -> tuple[list[str], list[float]]:
+        start = time.monotonic()
+        if self.gen_latency:
+            time.sleep(self.gen_latency)
+        tactics, logprobs = self._sample_tactics(num_samples)
+        self.calls.append((state_str, tactics, logprobs, "", 0))
+        self.gen_seconds += time.monotonic() - start
+        return tactics, logprobs
+
+    def from_state_batch(self, states: list[list[Goal]], num_samples: int, incontext: list[str]=None, template: str = 'deepseek', use_retrieval: bool=True) -> list[tuple[list[str], list[float]]]:
+        start = time.monotonic()
+        if self.gen_latency:
+            time.sleep(self.gen_latency)
+        results = []
+        for state in states:
+            tactics, logprobs = self._sample_tactics(num_samples)
+            self.calls.append((state_repr(state), tactics, logprobs, "", 0))
+            results.append((tactics, logprobs))
+        self.gen_seconds += time.monotonic() - start
+        return results
@@ -0,0 +1,53 @@
+"""
+本地的Anthropic Messages API替身, 用于在没有外部服务时测试和压测Claude客户端.
+
+用法: python -m manager.thirdparty.tests.claude_stub --port 8765 [--latency 0.2] [--error-rate 0.1]
+然后把 CLAUDE_CONFIG['base_url'] 指向 http://127.0.0.1:8765
+返回的tactic从固定列表中随机选取; error-rate比例的请求返回529/500, 用于检查重试逻辑.
+"""
+import argparse
+import json
+import random
+import uuid
+
+from manager.thirdparty.tests import stub_server
+
+TACTICS = ["simp", "norm_num", "linarith", "nlinarith [sq_nonneg (a - b)]", "ring_nf", "omega", "TRUE"]
+
+
+class StubHandler(stub_server.StubHandler):
+    server: "StubServer"
+
+    def respond(self, body: dict) -> tuple[int, dict]:
+        if random.random() < self.server.error_rate:
+            return random.choice([500, 529]), {"type": "error", "error": {"type": "overloaded_error", "message": "stub overloaded"}}
+        text = random.choice(TACTICS)
+        return 200, {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": len(json.dumps(body.get("messages", []))) // 4, "output_tokens": len(text) // 4 + 1},
+        }
+
+
+class StubServer(stub_server.StubServer):
+    handler_class = StubHandler
+
+    def __init__(self, port: int = 0, latency: float = 0.0, error_rate: float = 0.0):
+        super().__init__(port, latency)
+        self.error_rate = error_rate
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic Messages API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency, args.error_rate)
+    print(f"claude stub listening on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,70 @@
+"""
+本地的OpenAI兼容 /v1/completions 替身, 用于在没有GPU时测试和压测OpenAIBackend.
+
+用法: python -m manager.thirdparty.tests.openai_stub --port 8000 [--latency 0.05]
+然后在实验配置中使用 [model.backend] type = "openai", base_url = "http://127.0.0.1:8000/v1"
+每个样本从固定列表中随机选取tactic, 并返回随机的token logprob.
+"""
+import argparse
+import random
+import time
+import uuid
+
+from manager.thirdparty.tests import stub_server
+
+TACTICS = ["simp", "norm_num", "linarith", "nlinarith [sq_nonneg (a - b)]", "ring_nf", "omega", "intro h", "field_simp"]
+
+
+def prompts_of(body: dict) -> list[str]:
+    prompts = body.get("prompt", [])
+    return [prompts] if isinstance(prompts, str) else prompts
+
+
+class StubHandler(stub_server.StubHandler):
+    server: "StubServer"
+
+    def respond(self, body: dict) -> tuple[int, dict]:
+        prompts = prompts_of(body)
+        n = body.get("n", 1)
+        choices = []
+        for i in range(len(prompts)):
+            for j in range(n):
+                text = random.choice(TACTICS)
+                tokens = text.split()
+                choices.append({
+                    "index": i * n + j,
+                    "text": text,
+                    "logprobs": {"tokens": tokens, "token_logprobs": [-random.random() for _ in tokens]},
+                    "finish_reason": "stop",
+                })
+        return 200, {
+            "id": f"cmpl-{uuid.uuid4().hex}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": choices,
+        }
+
+
+class StubServer(stub_server.StubServer):
+    handler_class = StubHandler
+    path = "/v1"
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        super().__init__(port, latency)
+        self.prompts = 0
+
+    def count_request(self, body: dict):
+        with self.lock:
+            self.requests += 1
+            self.prompts += len(prompts_of(body))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for an OpenAI-compatible completions server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency)
+    print(f"completions stub listening on {server.base_url}")
+    server.serve_forever()
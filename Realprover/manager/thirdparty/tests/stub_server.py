@@ -0,0 +1,68 @@
+"""
+本地HTTP接口替身的公共部分: 解析JSON请求、返回JSON响应、统计请求数、在后台线程中运行.
+具体接口(claude_stub, openai_stub)只需实现 StubHandler.respond.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: "StubServer"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.server.count_request(body)
+        time.sleep(self.server.latency)
+        status, payload = self.respond(body)
+        self._reply(status, payload)
+
+    def respond(self, body: dict) -> tuple[int, dict]:
+        """
+        返回 (HTTP状态码, JSON响应)
+        """
+        raise NotImplementedError
+
+    def _reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    handler_class = StubHandler
+    path = ""  # base_url 的路径部分
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        super().__init__(("127.0.0.1", port), self.handler_class)
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count_request(self, body: dict):
+        with self.lock:
+            self.requests += 1
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{self.path}"
+
+    def start(self) -> "StubServer":
+        """
+        在后台线程中运行, 供测试代码使用; port=0时自动选择空闲端口
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
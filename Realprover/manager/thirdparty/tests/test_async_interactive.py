@@ -0,0 +1,73 @@
+import asyncio
+import sys
+import time
+import unittest
+
+from manager.thirdparty.async_interactive import AsyncInteractive
+from util.loop_util import LoopThread
+
+# 只读取输入、从不回复的假Lean进程
+SILENT_LEAN = "import sys\nfor _ in sys.stdin: pass\n"
+
+
+async def spawn() -> AsyncInteractive:
+    proc = await asyncio.create_subprocess_exec(sys.executable, "-c", SILENT_LEAN,
+                                                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    interactive = AsyncInteractive(proc)
+    interactive.tactic_mode = True
+    return interactive
+
+
+class TestAsyncInteractiveClose(unittest.TestCase):
+
+    def setUp(self):
+        self.loop_thread = LoopThread(name="test-loop")
+        self.interactive = self.loop_thread.run(spawn())
+
+    def tearDown(self):
+        self.loop_thread.loop.call_soon_threadsafe(self.loop_thread.loop.stop)
+        self.loop_thread.thread.join()
+
+    def test_close_from_other_thread(self):
+        request = self.loop_thread.submit(self.interactive.run_tactic(0, "simp"))
+        self.interactive.close()
+        # 进程已被回收, 读协程已结束, 在途的请求得到错误而不是一直等待
+        self.assertIsNotNone(self.interactive.proc.returncode)
+        self.assertTrue(self.interactive.reader.done())
+        self.assertFalse(self.interactive.is_alive())
+        with self.assertRaises(RuntimeError):
+            request.result(5)
+
+    def test_close_on_loop(self):
+        async def close():
+            self.interactive.close()
+            await self.interactive.closing
+
+        self.loop_thread.run(close())
+        self.assertIsNotNone(self.interactive.proc.returncode)
+        self.assertTrue(self.interactive.reader.done())
+
+    def test_close_twice(self):
+        self.interactive.close()
+        self.interactive.close()
+        self.assertIsNotNone(self.interactive.proc.returncode)
+
+
+class TestAsyncInteractiveDeadline(unittest.TestCase):
+
+    def test_deadline(self):
+        async def run():
+            interactive = await spawn()
+            interactive.deadline = time.monotonic() + 0.05
+            with self.assertRaises(TimeoutError):
+                await interactive.run_tactic(0, "simp")
+            await interactive.reader
+            # 超时后进程被结束, 读协程让其他在途请求失败
+            self.assertFalse(interactive.is_alive())
+            await interactive.aclose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
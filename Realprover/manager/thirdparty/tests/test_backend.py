@@ -0,0 +1,57 @@
+import unittest
+
+from manager.thirdparty.backend import OpenAIBackend, build_backend, filter_outputs
+from manager.thirdparty.generator import TacticGenerator
+from manager.thirdparty.tests.openai_stub import StubServer, TACTICS
+
+
+class TestOpenAIBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_generate(self):
+        backend = OpenAIBackend(self.server.base_url, "stub", {"temperature": 1.0, "max_tokens": 32}, max_batch_prompts=2)
+        requests = [("p0", 2), ("p1", 3), ("p2", 2), ("p3", 2)]
+        outputs = backend.generate(requests)
+        # n=2的三个prompt分为两个请求, n=3的一个请求
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.server.prompts, 4)
+        self.assertEqual(len(outputs), len(requests))
+        for (_, n), (tactics, logprobs, tokens) in zip(requests, outputs):
+            self.assertEqual(len(tactics), n)
+            self.assertEqual(len(logprobs), n)
+            self.assertTrue(set(tactics) <= set(TACTICS))
+            self.assertTrue(all(l <= 0 for l in logprobs))
+            self.assertEqual(tokens, sum(len(t.split()) for t in tactics))
+
+    def test_generator(self):
+        generator = TacticGenerator(model_list=["local"], gpu_id=0, local_model_path="stub",
+                                    sampling_params={"temperature": 1.0}, adaptive_sampling=None,
+                                    backend={"type": "openai", "base_url": self.server.base_url})
+        generator.reset_calls("theorem t : True")
+        tactics, logprobs = generator.from_state_str("⊢ True", 4, incontext="theorem t : True := by\n", use_retrieval=False)
+        self.assertEqual(len(tactics), 4)
+        self.assertEqual(len(logprobs), 4)
+        self.assertEqual(len(generator.calls), 1)
+        self.assertGreater(generator.tokens, 0)
+        self.assertIsInstance(generator.backend, OpenAIBackend)
+
+    def test_build_backend(self):
+        with self.assertRaises(NotImplementedError):
+            build_backend({"type": "unknown"}, "stub", {})
+
+
+class TestFilterOutputs(unittest.TestCase):
+
+    def test_filter_sorry(self):
+        tactics, logprobs = filter_outputs([" simp ", "sorry", "exact sorry", "ring"], [-0.1, -0.2, -0.3, -0.4])
+        self.assertEqual(tactics, ["simp", "ring"])
+        self.assertEqual(logprobs, [-0.1, -0.4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import asyncio
+import unittest
+
+from manager.search import BestFirstSearch, TranspositionTable, TacticOutcome
+from manager.struct import Goal, Node, Variable
+from manager.thirdparty.mock import MockStateSpace, MockInteractive, MockTacticGenerator
+
+
+def goal(*names: str) -> Goal:
+    return Goal(context=[Variable(name=[name], type="a = b", is_prop=True) for name in names],
+                type="b = a", is_prop=True)
+
+
+class TestTranspositionKey(unittest.TestCase):
+
+    def test_hypothesis_names(self):
+        # 去重后相同, 但Lean中不同: 第二个state没有h2
+        with_h2 = Node(0, 0, "", [goal("h1", "h2")])
+        without_h2 = Node(0, 0, "", [goal("h1")])
+        self.assertEqual(with_h2.fingerprint, without_h2.fingerprint)
+        self.assertNotEqual(with_h2.exact_fingerprint, without_h2.exact_fingerprint)
+
+        search = BestFirstSearch(use_retrieval=False, transposition_table=TranspositionTable(capacity=16, path=None))
+        candidates = [("exact h2.symm", -0.1)]
+        search.merge_results(without_h2, candidates, {}, [0], [(RuntimeError("unknown identifier 'h2'"), None)])
+        # 缓存的错误不能用于有h2的state
+        cached, misses = search.lookup_cached(with_h2, candidates)
+        self.assertEqual((cached, misses), ({}, [0]))
+        cached, misses = search.lookup_cached(without_h2, candidates)
+        self.assertEqual((cached, misses), ({}, []))
+        self.assertIsInstance(search.transposition_table.get("", without_h2.exact_fingerprint, "exact h2.symm"),
+                              TacticOutcome)
+
+
+class ReplayFailingInteractive:
+    """
+    只有根状态的Lean会话: 任何tactic都执行失败, 用于构造置换表命中的证明无法重放的情形
+    """
+
+    def __init__(self):
+        self.tactic_mode = True
+        self.committed = None
+
+    def run_tactic(self, sid: int, tactic: str) -> int:
+        raise RuntimeError({"message": f"replay failed: {tactic}"})
+
+    def run_tactics(self, sid: int, tactics: list[str]) -> list:
+        return [RuntimeError({"message": f"replay failed: {tactic}"}) for tactic in tactics]
+
+    def get_states(self, sids: list[int]) -> list:
+        return []
+
+    def give_up(self, sid: int) -> int:
+        return 1
+
+    def commit(self, sid: int):
+        self.committed = sid
+        self.tactic_mode = False
+
+
+class AsyncReplayFailingInteractive(ReplayFailingInteractive):
+
+    async def run_tactic(self, sid: int, tactic: str) -> int:
+        return super().run_tactic(sid, tactic)
+
+    async def run_tactics(self, sid: int, tactics: list[str]) -> list:
+        return super().run_tactics(sid, tactics)
+
+    async def get_states(self, sids: list[int]) -> list:
+        return []
+
+    async def give_up(self, sid: int) -> int:
+        return super().give_up(sid)
+
+    async def commit(self, sid: int):
+        super().commit(sid)
+
+
+class OneShotGenerator:
+    formal_statement = "theorem t (h1 : a = b) : b = a := by sorry"
+
+    def __init__(self):
+        self.calls = []
+        self.max_calls = 4
+
+    def has_quota(self) -> bool:
+        return len(self.calls) < self.max_calls
+
+    def from_state(self, state, num_samples, incontext=None, template="deepseek", use_retrieval=True):
+        self.calls.append((state, ["exact h1.symm"], [-0.1]))
+        return ["exact h1.symm"], [-0.1]
+
+
+class TestProofReplayFailure(unittest.TestCase):
+
+    def setUp(self):
+        root = Node(0, 0, "", [goal("h1")])
+        self.search = BestFirstSearch(use_retrieval=False,
+                                      transposition_table=TranspositionTable(capacity=16, path=None))
+        self.search.verify = lambda node, formal_statement=None: True
+        # 置换表中记录了这条tactic会证明目标, 但当前会话中重放失败
+        self.search.transposition_table.put("", root.exact_fingerprint, "exact h1.symm", TacticOutcome(state=[]))
+        self.search.insert(root)
+
+    def check(self, interactive: ReplayFailingInteractive):
+        self.assertFalse(self.search.found)
+        self.assertEqual(interactive.committed, 1)
+        self.assertFalse(interactive.tactic_mode)
+        self.assertTrue(all(node.state for node in self.search.nodes.values()))
+
+    def test_sync(self):
+        interactive = ReplayFailingInteractive()
+        self.search.search_proof(OneShotGenerator(), interactive)  # type: ignore
+        self.check(interactive)
+
+    def test_async(self):
+        interactive = AsyncReplayFailingInteractive()
+        asyncio.run(self.search.search_proof_async(OneShotGenerator(), interactive))  # type: ignore
+        self.check(interactive)
+
+
+class ReplayCountingInteractive(MockInteractive):
+    """
+    记录不在run_tactics中单独执行的tactic数, 即沿路径重放的次数
+    """
+
+    def __init__(self, space: MockStateSpace):
+        super().__init__(space)
+        self.replays = 0
+        self.batched = False
+
+    def run_tactics(self, sid: int, tactics: list[str], heartbeats: int = 200000000) -> list:
+        self.batched = True
+        try:
+            return super().run_tactics(sid, tactics, heartbeats)
+        finally:
+            self.batched = False
+
+    def run_tactic(self, sid: int, tactic: str, heartbeats: int = 200000000) -> int:
+        if not self.batched:
+            self.replays += 1
+        return super().run_tactic(sid, tactic, heartbeats)
+
+
+class TestHelpers(unittest.TestCase):
+
+    def setUp(self):
+        self.space = MockStateSpace(branching=8, seed=1)
+        self.interactive = ReplayCountingInteractive(self.space)
+        self.helpers = [ReplayCountingInteractive(self.space) for _ in range(2)]
+        for process in [self.interactive, *self.helpers]:
+            process.open_file(None, [None])  # type: ignore
+            process.get_next_problem()
+        generator = MockTacticGenerator(self.space, max_calls=24, seed=1)
+        generator.reset_calls("mock_theorem_1")
+        self.search = BestFirstSearch(num_samples=8, max_nodes=1000, use_retrieval=False)
+        self.search.insert(Node(0, 0, "", self.interactive.get_state(0)))
+        self.search.attach_helpers(self.helpers)  # type: ignore
+        try:
+            self.search.search_proof(generator, self.interactive)  # type: ignore
+        finally:
+            self.search.detach_helpers()
+
+    def test_no_replay(self):
+        # helper中得到的节点在该helper中扩展, 任何进程都不重放路径
+        self.assertEqual([p.replays for p in [self.interactive, *self.helpers]], [0, 0, 0])
+        self.assertTrue(all(helper.tactic_calls > 8 for helper in self.helpers))
+        self.assertTrue(any(node.sid < 0 and node.depth > 1 for node in self.search.nodes.values()))
+
+    def test_states_follow_path(self):
+        for node in self.search.nodes.values():
+            key = 0
+            for step in node.current_path[1:]:
+                key = self.space.apply(key, step.tactic)
+            self.assertEqual(node.state, MockStateSpace.state(key))  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from util import LruCache
+
+
+class TestLruCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = LruCache(capacity=2)
+        cache.put(b"a", 1)
+        cache.put(b"b", 2)
+        self.assertEqual(cache.get(b"a"), 1)  # a变为最近使用
+        cache.put(b"c", 3)
+        self.assertIsNone(cache.get(b"b"))
+        self.assertEqual(cache.get(b"a"), 1)
+        self.assertEqual(cache.get(b"c"), 3)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertIn(b"a", cache)
+        self.assertNotIn(b"b", cache)
+
+    def test_sqlite_tier(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache", "retrieval.sqlite")
+            cache = LruCache(capacity=1, path=path)
+            cache.put(b"a", {"theorems": ["t1"]})
+            cache.put(b"b", [1, 2])
+            # a已被内存层淘汰, 从磁盘层读回并重新放入内存层
+            self.assertNotIn(b"a", cache)
+            self.assertEqual(cache.get(b"a"), {"theorems": ["t1"]})
+            self.assertIn(b"a", cache)
+            self.assertEqual(cache.hits, 1)
+            # 磁盘中的条目在新的实例(另一个进程或下一次运行)中仍然可用
+            reopened = LruCache(capacity=4, path=path)
+            self.assertEqual(reopened.get(b"b"), [1, 2])
+            self.assertEqual(reopened.get(b"a"), {"theorems": ["t1"]})
+            self.assertIsNone(reopened.get(b"c"))
+            self.assertEqual((reopened.hits, reopened.misses), (2, 1))
+
+    def test_tables(self):
+        # 同一个数据库文件中的不同表互不影响
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            first = LruCache(capacity=4, path=path, table="first")
+            second = LruCache(capacity=4, path=path, table="second")
+            first.put(b"k", 1)
+            second.put(b"k", 2)
+            self.assertEqual(LruCache(capacity=4, path=path, table="first").get(b"k"), 1)
+            self.assertEqual(LruCache(capacity=4, path=path, table="second").get(b"k"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from manager.thirdparty.claude import Claude
+from manager.thirdparty.tests.claude_stub import StubServer, TACTICS
+
+
+class TestClaude(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_tactics(self):
+        client = Claude(base_url=self.server.base_url, api_key="test", model="stub",
+                        max_concurrency=4, rate_limit=1000.0, max_retries=0, backoff=0.01)
+        tactics = client.tactics("x : ℕ\n⊢ x + 0 = x", [], num_samples=8)
+        self.assertEqual(len(tactics), 8)
+        self.assertTrue(set(tactics) <= set(TACTICS))
+        self.assertEqual(self.server.requests, 8)
+        critics = client.critics([("⊢ a", "simp", "⊢ b"), ("⊢ b", "ring_nf", "")])
+        self.assertEqual(len(critics), 2)
+
+    def test_retry(self):
+        # 一半的请求返回500/529, 按退避重试后全部成功
+        self.server.error_rate = 0.5
+        client = Claude(base_url=self.server.base_url, api_key="test", model="stub",
+                        max_concurrency=4, rate_limit=1000.0, max_retries=20, backoff=0.001)
+        tactics = client.tactics("⊢ True", [], num_samples=16)
+        self.assertEqual(len(tactics), 16)
+        self.assertGreater(self.server.requests, 16)
+
+    def test_give_up(self):
+        self.server.error_rate = 1.0
+        client = Claude(base_url=self.server.base_url, api_key="test", model="stub",
+                        max_concurrency=1, rate_limit=1000.0, max_retries=2, backoff=0.001)
+        with self.assertRaises(Exception):
+            client.tactics("⊢ True", [], num_samples=1)
+        self.assertEqual(self.server.requests, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
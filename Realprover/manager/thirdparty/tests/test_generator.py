@@ -0,0 +1,97 @@
+import itertools
+import time
+import unittest
+
+from manager.thirdparty.backend import GenerationBackend
+from manager.thirdparty.generator import TacticGenerator
+
+
+class ScriptedBackend(GenerationBackend):
+    """
+    prompt为"repeat"时总是返回同一个tactic, 其他prompt每个样本都是新的tactic; 每个样本计1个token
+    """
+
+    def __init__(self):
+        self.counter = itertools.count()
+        self.requests = []
+        self.timeouts = []
+
+    def generate(self, requests: list[tuple[str, int]], timeout: float | None = None) -> list[tuple[list[str], list[float], int]]:
+        self.requests.append(list(requests))
+        self.timeouts.append(timeout)
+        outputs = []
+        for prompt, n in requests:
+            if prompt == "repeat":
+                tactics = ["simp"] * n
+            else:
+                tactics = [f"tac_{next(self.counter)}" for _ in range(n)]
+            outputs.append((tactics, [-1.0] * n, n))
+        return outputs
+
+
+def make_generator(adaptive_sampling: dict | None) -> TacticGenerator:
+    generator = TacticGenerator(model_list=["local"], gpu_id=0, local_model_path="stub",
+                                sampling_params={}, adaptive_sampling=adaptive_sampling)
+    generator.backend = ScriptedBackend()
+    return generator
+
+
+class TestAdaptiveSampling(unittest.TestCase):
+
+    def test_disabled(self):
+        generator = make_generator(None)
+        outputs = generator._sample(["repeat", "diverse"], 8)
+        self.assertEqual(generator.backend.requests, [[("repeat", 8), ("diverse", 8)]])
+        self.assertEqual([len(tactics) for tactics, _, _ in outputs], [8, 8])
+        self.assertEqual([saved for _, _, saved in outputs], [0, 0])
+        self.assertEqual(generator.tokens, 16)
+
+    def test_stop_rule(self):
+        generator = make_generator({"rounds": 4, "distinct_target": 6, "novelty_threshold": 0.3})
+        outputs = generator._sample(["repeat", "diverse", "diverse"], 8)
+        # 每轮采样2个: repeat第二轮没有新tactic(novelty=0)后停止; diverse得到6个不同tactic后停止
+        self.assertEqual(generator.backend.requests, [
+            [("repeat", 2), ("diverse", 2), ("diverse", 2)],
+            [("repeat", 2), ("diverse", 2), ("diverse", 2)],
+            [("diverse", 2), ("diverse", 2)],
+        ])
+        (repeat, _, repeat_saved), (diverse, _, diverse_saved), _ = outputs
+        self.assertEqual(repeat, ["simp"] * 4)
+        self.assertEqual(repeat_saved, 4)
+        self.assertEqual(len(set(diverse)), 6)
+        self.assertEqual(diverse_saved, 2)
+        self.assertEqual(generator.tokens, 16)
+
+    def test_budget_cap(self):
+        # 没有其他停止条件时最多采样num_samples个, 最后一轮不超出
+        generator = make_generator({"rounds": 3, "novelty_threshold": 0.0})
+        outputs = generator._sample(["diverse"], 7)
+        self.assertEqual([request[0][1] for request in generator.backend.requests], [3, 3, 1])
+        self.assertEqual(len(outputs[0][0]), 7)
+        self.assertEqual(outputs[0][2], 0)
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_remaining_budget(self):
+        generator = make_generator(None)
+        generator._sample(["diverse"], 2)
+        generator.deadline = time.monotonic() + 30
+        generator._sample(["diverse"], 2)
+        no_limit, limited = generator.backend.timeouts
+        self.assertIsNone(no_limit)
+        self.assertTrue(0 < limited <= 30)
+
+    def test_expired(self):
+        generator = make_generator(None)
+        generator.deadline = time.monotonic() - 1
+        with self.assertRaises(TimeoutError):
+            generator._sample(["diverse"], 2)
+        self.assertEqual(generator.backend.requests, [])
+        # 超时的调用不返回tactic, 也不计入calls
+        self.assertEqual(generator.from_state_str("diverse", 2, use_retrieval=False), ([], []))
+        self.assertEqual(generator.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1 +1,105 @@
+import subprocess
+import sys
+import time
 import unittest
+from io import TextIOWrapper
+
+from manager.thirdparty.interactive import Interactive
+
+# 假的Lean交互进程: 收集到达的请求, 输入暂停50ms后按相反顺序回复(乱序);
+# 包含"fail"的tactic返回error, sid为负数的getState回复中不带id
+FAKE_LEAN = r'''
+import json, os, select
+buffer = b""
+pending = []
+while True:
+    ready, _, _ = select.select([0], [], [], 0.05)
+    if ready:
+        data = os.read(0, 65536)
+        if not data:
+            break
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        pending.extend(json.loads(line) for line in lines if line)
+        continue
+    for request in reversed(pending):
+        params = request["params"]
+        if request["method"] == "runTactic":
+            if "fail" in params["tactic"]:
+                response = {"id": request["id"], "error": "unknown tactic " + params["tactic"]}
+            else:
+                response = {"id": request["id"], "result": params["sid"] * 100 + len(params["tactic"])}
+        elif params["sid"] < 0:
+            response = {"result": []}
+        else:
+            # 返回同时在途的请求数
+            response = {"id": request["id"], "result": len(pending)}
+        print(json.dumps(response), flush=True)
+    pending = []
+'''
+
+
+class TestInteractivePipeline(unittest.TestCase):
+
+    def setUp(self):
+        # 不启动Lean, 直接把Interactive接到假的进程上
+        self.interactive = Interactive.__new__(Interactive)
+        self.interactive.proc = subprocess.Popen([sys.executable, "-c", FAKE_LEAN],
+                                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.interactive.read_from = self.interactive.proc.stdout
+        self.interactive.write_to = TextIOWrapper(self.interactive.proc.stdin, line_buffering=True)
+        self.interactive.buffer = bytearray()
+        self.interactive.id = 0
+        self.interactive.tactic_mode = True
+        self.interactive.files_opened = 0
+        self.interactive.deadline = None
+
+    def tearDown(self):
+        self.interactive.close()
+
+    def test_out_of_order(self):
+        tactics = ["simp", "fail_1", "ring_nf", "linarith", "fail_2", "omega", "nlinarith"]
+        for window in (1, 3, 16):
+            results = self.interactive.request_batch(
+                [('runTactic', {'sid': 2, 'tactic': t, 'heartbeats': 0}) for t in tactics], window=window)
+            self.assertEqual(len(results), len(tactics))
+            for tactic, result in zip(tactics, results):
+                if tactic.startswith("fail"):
+                    self.assertIsInstance(result, RuntimeError)
+                    self.assertIn(tactic, str(result))
+                else:
+                    self.assertEqual(result, 200 + len(tactic))
+
+    def test_run_tactics(self):
+        results = self.interactive.run_tactics(1, ["simp", "fail", "ring"])
+        self.assertEqual(results[0], 104)
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(results[2], 104)
+        # 失败的请求不影响之后的普通请求
+        self.assertEqual(self.interactive.run_tactic(3, "omega"), 305)
+
+    def test_missing_id(self):
+        # 没有id的回复按发送顺序匹配
+        results = self.interactive.request_batch([('getState', {'sid': -1})], window=4)
+        self.assertEqual(results, [[]])
+
+    def test_window(self):
+        # 在途请求数不超过window
+        results = self.interactive.request_batch([('getState', {'sid': sid}) for sid in range(10)], window=4)
+        self.assertEqual(len(results), 10)
+        self.assertLessEqual(max(results), 4)
+        self.assertGreater(max(results), 1)
+        self.assertEqual(self.interactive.id, 10)
+
+    def test_deadline(self):
+        self.interactive.deadline = time.monotonic() + 5
+        self.assertEqual(self.interactive.run_tactics(1, ["simp", "ring"]), [104, 104])
+        # 假进程在输入暂停50ms后才回复, 截止时间先到
+        self.interactive.deadline = time.monotonic() + 0.01
+        with self.assertRaises(TimeoutError):
+            self.interactive.run_tactic(1, "simp")
+        self.assertFalse(self.interactive.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+
+from manager.thirdparty import lean_search
+from manager.thirdparty.lean_search import LeanSearch
+from manager.thirdparty.tests import stub_server
+
+
+class RetrievalHandler(stub_server.StubHandler):
+    """
+    检索服务替身: 单个query返回 {"data": [定理列表]}, 批量请求按顺序返回每个query的定理列表
+    """
+
+    def respond(self, body) -> tuple[int, dict]:
+        queries = body if isinstance(body, list) else [body]
+        return 200, {"data": [[{"name": f"thm_{q['query']}_{i}"} for i in range(q["num"])] for q in queries]}
+
+
+class RetrievalServer(stub_server.StubServer):
+    handler_class = RetrievalHandler
+
+
+class TestLeanSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = RetrievalServer(latency=0.2).start()
+        self.patch = mock.patch.object(lean_search, "REQUEST_URL", self.server.base_url)
+        self.patch.start()
+        LeanSearch._cache = None  # 每个测试使用新的缓存
+
+    def tearDown(self):
+        self.patch.stop()
+        self.server.stop()
+        LeanSearch._cache = None
+
+    def test_cache(self):
+        first = LeanSearch.get_related_theorem("⊢ a", 2)
+        self.assertEqual(first, [{"name": "thm_⊢ a_0"}, {"name": "thm_⊢ a_1"}])
+        self.assertEqual(LeanSearch.get_related_theorem("⊢ a", 2), first)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(LeanSearch.info(), dict(retrieval_cache_hits=1, retrieval_cache_misses=1))
+
+    def test_prefetch_hit(self):
+        # 预取仍在进行时查询: 等待预取完成, 不重复请求, 计为缓存命中
+        LeanSearch.prefetch("⊢ b", 1)
+        LeanSearch.prefetch("⊢ b", 1)
+        self.assertEqual(LeanSearch.get_related_theorem("⊢ b", 1), [{"name": "thm_⊢ b_0"}])
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(LeanSearch.info(), dict(retrieval_cache_hits=1, retrieval_cache_misses=0))
+
+    def test_batch(self):
+        LeanSearch.prefetch("⊢ c", 1)
+        results = LeanSearch.get_related_theorem_batch(["⊢ c", "⊢ d", "⊢ e"], 1)
+        self.assertEqual(results, [[{"name": f"thm_⊢ {q}_0"}] for q in "cde"])
+        # 一次预取 + 一次只包含未命中query的批量请求
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(LeanSearch.info(), dict(retrieval_cache_hits=1, retrieval_cache_misses=2))
+        self.assertEqual(LeanSearch._inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import tempfile
+import unittest
+
+from manager.manage.result_store import ResultStore
+
+
+def make_result(attempt: int) -> dict:
+    # 不同尝试之间部分字符串重复(所有尝试共有的, 奇偶尝试各自共有的), 部分是新的
+    goals = [f"⊢ goal_{attempt}", "⊢ shared_goal", f"⊢ parity_{attempt % 2}"]
+    nodes = [dict(id=0, parent=None, depth=0, tactic="", state=goals),
+             dict(id=1, parent=0, depth=1, tactic=f"simp [lemma_{attempt}]", state=["⊢ shared_goal"])]
+    calls = [[goals[0], [f"simp [lemma_{attempt}]", "norm_num"], [-0.1, -0.2],
+              f"Retrieved: thm_{attempt}\n\nshared premise\n\n{goals[0]}", True]]
+    return dict(formal_statement="theorem t : True", success=attempt % 2 == 1,
+                collect_results=[dict(success=attempt % 2 == 1, nodes=nodes, calls=calls)])
+
+
+class TestResultStore(unittest.TestCase):
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as result_dir:
+            store = ResultStore(result_dir, num_shards=2)
+            for attempt in range(3):
+                store.write("p1", attempt, make_result(attempt))
+                store.write(2, attempt, make_result(attempt + 10))
+            reader = ResultStore(result_dir, num_shards=2)
+            self.assertEqual(sorted(reader.problems()), ["2", "p1"])
+            self.assertEqual(reader.attempts("p1"), [0, 1, 2])
+            for attempt in range(3):
+                self.assertEqual(reader.load("p1", attempt), make_result(attempt))
+                self.assertEqual(reader.load(2, attempt), make_result(attempt + 10))
+            self.assertIsNone(reader.load("p1", 3))
+
+    def test_two_writers(self):
+        # 两个进程交替写同一题目的尝试, 各自缓存的字符串表都会过期
+        with tempfile.TemporaryDirectory() as result_dir:
+            writers = [ResultStore(result_dir, num_shards=2), ResultStore(result_dir, num_shards=2)]
+            for attempt in range(4):
+                writers[attempt % 2].write("p1", attempt, make_result(attempt))
+            reader = ResultStore(result_dir, num_shards=2)
+            self.assertEqual([attempt for attempt, _ in reader.iter_problem("p1")], [0, 1, 2, 3])
+            for attempt, data in reader.iter_problem("p1"):
+                self.assertEqual(data, make_result(attempt))
+
+    def test_resume(self):
+        # 续跑时新的写入端从已有的帧恢复字符串表
+        with tempfile.TemporaryDirectory() as result_dir:
+            ResultStore(result_dir).write("p1", 0, make_result(0))
+            ResultStore(result_dir).write("p1", 1, make_result(1))
+            reader = ResultStore(result_dir)
+            self.assertEqual(reader.load("p1", 0), make_result(0))
+            self.assertEqual(reader.load("p1", 1), make_result(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+
+from manager.manage.run_manifest import RunManifest
+
+
+def write_result(result_dir: str, problem_id: str, attempt: int, success: bool, calls: int = 2):
+    problem_dir = os.path.join(result_dir, "generated", problem_id)
+    os.makedirs(problem_dir, exist_ok=True)
+    nodes = [dict(id=0, parent=0, depth=0, tactic="", state=["⊢ True"])]
+    if success:
+        nodes.append(dict(id=1, parent=0, depth=1, tactic="trivial", state=[]))
+    data = dict(formal_statement="theorem t : True",
+                collect_results=[dict(success=success, nodes=nodes, calls=[["⊢ True", [], [], "", 0]] * calls)])
+    with open(os.path.join(problem_dir, f"{problem_id}_{attempt}.json"), "w") as fp:
+        json.dump(data, fp)
+
+
+class TestRunManifest(unittest.TestCase):
+
+    def test_backfill(self):
+        # 旧版本的运行目录只有 generated/ 下的结果文件
+        with tempfile.TemporaryDirectory() as result_dir:
+            write_result(result_dir, "p1", 0, False)
+            write_result(result_dir, "p1", 1, True)
+            write_result(result_dir, "p2", 0, False)
+            write_result(result_dir, "p2", 1, False, calls=0)
+            with open(os.path.join(result_dir, "generated", "p2", "broken_x.json"), "w") as fp:
+                fp.write("{")
+            manifest = RunManifest(result_dir)
+            self.assertTrue(os.path.exists(manifest.path))
+            self.assertTrue(manifest.should_skip("p1", max_retries=8))
+            self.assertFalse(manifest.should_skip("p2", max_retries=8))
+            self.assertEqual(manifest.next_attempt("p2"), 2)
+            # 没有生成过tactic的尝试不计入重试次数
+            self.assertEqual(manifest.remaining_retries("p2", max_retries=8), 7)
+            self.assertEqual(manifest.stats(), dict(total=2, success=1, accuracy=0.5))
+            with open(manifest.path) as fp:
+                records = [json.loads(line) for line in fp]
+            self.assertEqual(len(records), 4)
+            self.assertEqual([r["proof_length"] for r in records if r["success"]], [1])
+            # 已有清单时不再扫描结果文件
+            write_result(result_dir, "p3", 0, True)
+            self.assertEqual(RunManifest(result_dir).stats()["total"], 2)
+
+    def test_record_and_usage(self):
+        with tempfile.TemporaryDirectory() as result_dir:
+            first = RunManifest(result_dir)
+            second = RunManifest(result_dir)
+            first.record("p1", 0, "ok", calls=3, seconds=1.5, tokens=100, lean_seconds=0.5)
+            second.record("p1", 1, "cancelled", calls=1, seconds=0.5, tokens=20)
+            # record只读入清单中新增的记录, 其他进程追加的记录通过refresh读入
+            self.assertEqual(second.usage("p1"), dict(seconds=2.0, tokens=120, lean_seconds=0.5))
+            self.assertEqual(first.next_attempt("p1"), 1)
+            first.refresh()
+            self.assertEqual(first.next_attempt("p1"), 2)
+            self.assertEqual(first.usage("p1"), second.usage("p1"))
+            self.assertEqual(first.remaining_retries("p1", max_retries=4), 3)
+            self.assertEqual(first.usage("p2"), dict(seconds=0.0, tokens=0, lean_seconds=0.0))
+
+    def test_partial_line(self):
+        # 进程被中断时最后一行可能不完整
+        with tempfile.TemporaryDirectory() as result_dir:
+            manifest = RunManifest(result_dir)
+            manifest.record("p1", 0, "ok", calls=1, success=True)
+            with open(manifest.path, "a") as fp:
+                fp.write('{"id": "p2", "attempt"')
+            reloaded = RunManifest(result_dir)
+            self.assertEqual(reloaded.stats(), dict(total=1, success=1, accuracy=1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from manager.thirdparty.verifier import parse_repl_result, split_header
+
+
+class TestParseReplResult(unittest.TestCase):
+
+    def test_success(self):
+        self.assertTrue(parse_repl_result({"env": 1}))
+        self.assertTrue(parse_repl_result({"env": 1, "messages": [
+            {"severity": "warning", "data": "unused variable `h`"}]}))
+
+    def test_errors_and_sorries(self):
+        self.assertFalse(parse_repl_result({"env": 1, "messages": [
+            {"severity": "error", "data": "unsolved goals"}]}))
+        self.assertFalse(parse_repl_result({"env": 1, "messages": [
+            {"severity": "warning", "data": "declaration uses 'sorry'"}]}))
+        self.assertFalse(parse_repl_result({"env": 1, "sorries": [{"goal": "⊢ True"}]}))
+
+    def test_repl_failure(self):
+        # REPL自身出错时只有message, 没有env和messages
+        self.assertFalse(parse_repl_result({"message": "unknown environment."}))
+        self.assertFalse(parse_repl_result({"message": "Could not parse JSON", "env": 0}))
+        self.assertFalse(parse_repl_result({}))
+
+
+class TestSplitHeader(unittest.TestCase):
+
+    def test_split(self):
+        header, body = split_header("import Mathlib\nimport Aesop\n\ntheorem t : True := by\n  trivial")
+        self.assertEqual(header, "import Mathlib\nimport Aesop")
+        self.assertEqual(body, "theorem t : True := by\n  trivial")
+
+
+if __name__ == "__main__":
+    unittest.main()
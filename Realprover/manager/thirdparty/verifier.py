@@ -1,6 +1,11 @@
+import atexit
+import hashlib
 import json
 import logging
+import queue
 import tempfile
+import threading
+import time
 import subprocess
 import random
 import datetime
@@ -8,13 +13,202 @@ import os
 import pathlib
 import shutil
 
+import conf.config
+
 DEFAULT_LAKE_PATH = "~/.elan/bin/lake"
 DEFAULT_LEAN_WORKSPACE = "../lean_test_4160"
 
+def split_header(full_code: str) -> tuple[str, str]:
+    """Split the leading `import` block off a Lean file.
+
+    The header is what the REPL has to elaborate once per worker, the body is
+    checked against the resulting environment.
+    """
+    lines = full_code.splitlines()
+    idx = 0
+    while idx < len(lines) and (not lines[idx].strip() or lines[idx].startswith("import ")):
+        idx += 1
+    return "\n".join(lines[:idx]).strip(), "\n".join(lines[idx:])
+
+
+def parse_repl_result(result: dict) -> bool:
+    # REPL自身出错(如环境不存在、命令无法解析)时只返回 {"message": ...}, 没有env, 不能视为通过
+    if "message" in result or "env" not in result:
+        return False
+    result = {
+        "sorries": result.get("sorries", []),
+        "errors": [m for m in result.get("messages", [])
+                  if m["severity"] == "error" or "sorry" in m["data"]]
+    }
+    return not result["errors"] and not result["sorries"]
+
+
+class ReplWorker:
+    """A resident `lake exe repl` process.
+
+    Imported headers are kept as REPL environments (and optionally pickled to
+    `snapshot_dir`) so that every proof after the first one only pays for
+    elaborating its own body.
+    """
+
+    def __init__(self, lake_path: str, lean_workspace: str, snapshot_dir: str | None = None):
+        self.proc = subprocess.Popen(
+            [os.path.expanduser(lake_path), "exe", "repl"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            cwd=lean_workspace,
+        )
+        self.snapshot_dir = snapshot_dir
+        self.envs: dict[str, int] = {}
+        self.uses = 0
+        # 单独的线程读取stdout, 使得每条命令都可以设置超时
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    def _read_loop(self):
+        for line in self.proc.stdout:  # type: ignore
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def is_alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def close(self):
+        if self.is_alive():
+            self.proc.kill()
+        self.proc.wait()
+
+    def send(self, command: dict, timeout: float) -> dict:
+        self.uses += 1
+        self.proc.stdin.write(json.dumps(command, ensure_ascii=False) + "\n\n")  # type: ignore
+        self.proc.stdin.flush()  # type: ignore
+        deadline = time.monotonic() + timeout
+        chunks = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"repl command timed out after {timeout}s")
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"repl command timed out after {timeout}s")
+            if line is None:
+                raise RuntimeError("repl process exited")
+            if not line.strip():
+                if chunks:
+                    break
+                continue
+            chunks.append(line)
+        return json.loads("".join(chunks))
+
+    def get_env(self, header: str, timeout: float) -> int:
+        if header in self.envs:
+            return self.envs[header]
+        snapshot = None
+        if self.snapshot_dir is not None:
+            name = hashlib.md5(header.encode("utf-8")).hexdigest()
+            snapshot = os.path.join(self.snapshot_dir, f"{name}.olean")
+        if snapshot is not None and os.path.exists(snapshot):
+            response = self.send({"unpickleEnvFrom": snapshot}, timeout)
+        else:
+            response = self.send({"cmd": header}, timeout)
+            if snapshot is not None and "env" in response:
+                os.makedirs(self.snapshot_dir, exist_ok=True)  # type: ignore
+                self.send({"pickleTo": snapshot, "env": response["env"]}, timeout)
+        if "env" not in response:
+            raise RuntimeError(f"failed to load header: {response}")
+        self.envs[header] = response["env"]
+        return response["env"]
+
+    def check(self, full_code: str, timeout: float, import_timeout: float) -> dict:
+        header, body = split_header(full_code)
+        command = {"cmd": body, "allTactics": False, "ast": False,
+                   "tactics": False, "premises": False}
+        if header:
+            command["env"] = self.get_env(header, import_timeout)
+        return self.send(command, timeout)
+
+
+class ReplPool:
+    """Pool of resident REPL workers; a worker is recycled after `max_uses`
+    commands or as soon as a command fails or times out."""
+
+    def __init__(self,
+                 lake_path: str,
+                 lean_workspace: str,
+                 size: int = conf.config.REPL_POOL_SIZE,
+                 max_uses: int = conf.config.REPL_MAX_USES,
+                 snapshot_dir: str | None = conf.config.REPL_SNAPSHOT_DIR):
+        self.lake_path = lake_path
+        self.lean_workspace = lean_workspace
+        self.max_uses = max_uses
+        self.snapshot_dir = snapshot_dir
+        self.idle = queue.LifoQueue()
+        for _ in range(size):
+            self.idle.put(None)
+        atexit.register(self.close)
+
+    def acquire(self) -> ReplWorker:
+        worker = self.idle.get()
+        if worker is not None and worker.is_alive() and worker.uses < self.max_uses:
+            return worker
+        if worker is not None:
+            worker.close()
+        try:
+            return ReplWorker(self.lake_path, self.lean_workspace, self.snapshot_dir)
+        except Exception:
+            self.idle.put(None)
+            raise
+
+    def release(self, worker: ReplWorker, broken: bool = False):
+        if broken:
+            worker.close()
+            self.idle.put(None)
+        else:
+            self.idle.put(worker)
+
+    def verify(self, full_code: str, timeout: float, import_timeout: float) -> bool:
+        worker = self.acquire()
+        try:
+            result = worker.check(full_code, timeout, import_timeout)
+        except BaseException:
+            self.release(worker, broken=True)
+            raise
+        self.release(worker)
+        return parse_repl_result(result)
+
+    def close(self):
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.close()
+
+
+_repl_pools: dict[tuple[str, str], ReplPool] = {}
+_repl_pools_lock = threading.Lock()
+
+
+def get_repl_pool(lake_path: str, lean_workspace: str) -> ReplPool:
+    # 每个进程按 (lake, workspace) 维护一个池, 子进程中首次调用时才启动repl
+    key = (lake_path, lean_workspace)
+    with _repl_pools_lock:
+        if key not in _repl_pools:
+            _repl_pools[key] = ReplPool(lake_path, lean_workspace)
+        return _repl_pools[key]
+
+
 def verify_proof(full_code: str, 
                 lake_path: str = DEFAULT_LAKE_PATH,
                 lean_workspace: str = DEFAULT_LEAN_WORKSPACE,
-                timeout: int = 300) -> bool:
+                timeout: int = 300,
+                use_pool: bool = conf.config.USE_REPL_POOL) -> bool:
     """Verify if the proof code compiles successfully in Lean.
     
     Args:
@@ -23,10 +217,18 @@ def verify_proof(full_code: str,
         lake_path: Path to lake executable
         lean_workspace: Path to Lean workspace
         timeout: Maximum verification time in seconds
+        use_pool: Check against a resident REPL worker instead of a new process
         
     Returns:
         True if verification succeeds, False otherwise
     """
+    if use_pool:
+        try:
+            return get_repl_pool(lake_path, lean_workspace).verify(
+                full_code, timeout, conf.config.REPL_IMPORT_TIMEOUT)
+        except Exception as e:
+            logging.error(f"Verification failed: {str(e)}")
+            return False
     
     # full_code = formal_statement.strip() + code
     
@@ -47,16 +249,7 @@ def verify_proof(full_code: str,
                 timeout=timeout,
             )
         result = json.loads(outputs.stdout)
-        result = {
-            "sorries": result.get("sorries", []),
-            "errors": [m for m in result.get("messages", []) 
-                      if m["severity"] == "error" or "sorry" in m["data"]]
-        }
-        if not result["errors"] and not result["sorries"]:
-            str = "Pass"
-        else:
-            str = "False"
-        return not result["errors"] and not result["sorries"]
+        return parse_repl_result(result)
     except Exception as e:
         logging.error(f"Verification failed: {str(e)}")
         return False
@@ -38,4 +38,6 @@ CORS(app)
 # 启动Web服务
 if __name__ == '__main__':
     print('start server on 8080')
+    base_service._init_interactive_pool()
+    base_service.interactive_pool.warm_up()  # type: ignore
     app.run(host='0.0.0.0', port=8080, debug=False, use_reloader=False)
@@ -14,3 +14,6 @@ from .profiler import profiler
 from .log_util import LogUtil
 from .string_util import StringUtil
 from .http_util import HttpUtil
+from .loop_util import LoopThread
+from .cache_util import LruCache
+from .process_util import ProcessUtil
@@ -0,0 +1,61 @@
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LruCache(object):
+    """
+    内存中按LRU淘汰的缓存, 可选sqlite磁盘层使条目在进程/运行之间保留.
+    内存未命中时查询磁盘, 磁盘中的条目不会被淘汰. 可被多个线程共享.
+    """
+
+    def __init__(self, capacity: int, path: Optional[str] = None, table: str = "cache"):
+        self.capacity = capacity
+        self.cache: OrderedDict[bytes, Any] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.table = table
+        self.db = None
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key BLOB PRIMARY KEY, value BLOB)")
+
+    def __contains__(self, key: bytes) -> bool:
+        # 只检查内存层且不计入命中统计, 用于判断是否需要预取
+        with self.lock:
+            return key in self.cache
+
+    def get(self, key: bytes) -> Any:
+        with self.lock:
+            value = self.cache.get(key)
+            if value is not None:
+                self.cache.move_to_end(key)
+            elif self.db is not None:
+                row = self.db.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = pickle.loads(row[0])
+                    self._remember(key, value)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: Any):
+        with self.lock:
+            self._remember(key, value)
+            if self.db is not None:
+                self.db.execute(f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                                (key, pickle.dumps(value)))
+
+    def _remember(self, key: bytes, value: Any):
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
@@ -2,10 +2,35 @@
 ################################################################################
 
 ################################################################################
+import os
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
+
+# 每个连接池保持的keep-alive连接数, 应不小于同时发请求的线程数
+POOL_MAXSIZE = 32
 
 
 class HttpUtil(object):
+    _session = None
+    _session_pid = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def session() -> requests.Session:
+        """
+        进程内共享的keep-alive会话, 复用TCP连接; fork出的子进程会重新创建自己的会话
+        """
+        with HttpUtil._lock:
+            if HttpUtil._session is None or HttpUtil._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                HttpUtil._session = session
+                HttpUtil._session_pid = os.getpid()
+            return HttpUtil._session
 
     @staticmethod
     def get(url, params=None, headers=None):
@@ -18,7 +43,7 @@ class HttpUtil(object):
         :return: 响应的 JSON 数据（如果响应内容为 JSON），否则返回响应对象
         """
         try:
-            response = requests.get(url, params=params, headers=headers)
+            response = HttpUtil.session().get(url, params=params, headers=headers)
             response.raise_for_status()  # 检查请求是否成功
             return response.json() if response.headers.get('Content-Type') == 'application/json' else response
         except requests.exceptions.HTTPError as err:
@@ -38,7 +63,7 @@ class HttpUtil(object):
         :return: 响应的 JSON 数据（如果响应内容为 JSON），否则返回响应对象
         """
         try:
-            response = requests.post(url, data=data, json=json, headers=headers, timeout=30)
+            response = HttpUtil.session().post(url, data=data, json=json, headers=headers, timeout=30)
             response.raise_for_status()  # 检查请求是否成功
             return response.json() if response.headers.get('Content-Type') == 'application/json' else response
         except requests.exceptions.HTTPError as err:
@@ -0,0 +1,25 @@
+import asyncio
+import threading
+
+
+class LoopThread(object):
+    """
+    在后台线程中常驻运行的事件循环, 供同步代码提交协程并等待结果
+    """
+
+    def __init__(self, name: str = "loop-thread"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """
+        提交协程, 返回 concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """
+        提交协程并阻塞等待结果
+        """
+        return self.submit(coro).result()
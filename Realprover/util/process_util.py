@@ -0,0 +1,47 @@
+import os
+
+
+class ProcessUtil(object):
+    """
+    进程资源统计有关
+    """
+
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+    # 需要 /proc/<pid>/task/<tid>/children (Linux, CONFIG_PROC_CHILDREN) 来遍历子进程
+    HAS_PROC = os.path.exists(f"/proc/{os.getpid()}/task/{os.getpid()}/children")
+
+    @staticmethod
+    def _children(pid: int) -> list[int]:
+        children = []
+        task_dir = f"/proc/{pid}/task"
+        for tid in os.listdir(task_dir):
+            with open(f"{task_dir}/{tid}/children") as fp:
+                children.extend(int(child) for child in fp.read().split())
+        return children
+
+    @staticmethod
+    def cpu_seconds(pid: int) -> float | None:
+        """
+        pid及其全部子孙进程已使用的CPU时间(user+system, 秒), 读取 /proc/<pid>/stat.
+        例如 `lake env interactive` 实际执行证明的是lake的子进程.
+        系统不提供 /proc (或没有 task/*/children) 时返回None
+        """
+        if not ProcessUtil.HAS_PROC:
+            return None
+        total = 0
+        stack = [pid]
+        try:
+            while stack:
+                current = stack.pop()
+                try:
+                    with open(f"/proc/{current}/stat") as fp:
+                        # comm字段可能包含空格, 从最后一个')'之后开始切分; utime/stime为第14/15个字段
+                        fields = fp.read().rsplit(")", 1)[1].split()
+                    stack.extend(ProcessUtil._children(current))
+                except (FileNotFoundError, ProcessLookupError):
+                    # 统计过程中退出的进程
+                    continue
+                total += int(fields[11]) + int(fields[12])
+        except OSError:
+            return None
+        return total / ProcessUtil.CLOCK_TICKS